@@ -1,16 +1,78 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import formatdate, parsedate_to_datetime
+import csv
+import errno
+import hashlib
+import io
+import itertools
+import os
+import queue
 import sqlite3
+import threading
+import time
 import json
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
+import archive
+import metrics
+from cache import ResponseCache
+
+
+# 接口查询用到的rankings表列，缺少时说明数据库尚未升级到当前版本的结构
+REQUIRED_RANKING_COLUMNS = {"book_ref", "indicator_num"} | {
+    column[0] for column in archive.EXTRA_COLUMNS
+}
+
+
+def check_schema(db_path):
+    """
+    检查数据库是否为当前版本的结构，不是时抛出RuntimeError，API服务不会启动
+    API的连接是只读的，不修改表结构；旧版本数据库的迁移和结构升级由
+    python booklist_db.py migrate 完成
+    """
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(rankings)")}
+    finally:
+        conn.close()
+    if not columns:
+        return
+    if "title" in columns:
+        raise RuntimeError(
+            f"数据库 {db_path} 仍为旧版本结构，请先运行 python booklist_db.py migrate 迁移"
+        )
+    missing = REQUIRED_RANKING_COLUMNS - columns
+    if missing:
+        raise RuntimeError(
+            f"数据库 {db_path} 的rankings表缺少 {', '.join(sorted(missing))} 列，"
+            "请先运行 python booklist_db.py migrate 升级表结构"
+        )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    check_schema(DB_PATH)
+    yield
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="小说榜单API",
     description="提供获取多平台小说榜单数据的API接口",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # 添加CORS中间件
@@ -23,6 +85,42 @@ app.add_middleware(
 )
 
 
+class MetricsMiddleware:
+    """记录每个请求的处理耗时，按路由模板、方法和状态码分组"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # 使用路由模板而不是实际路径，避免标签数量无限增长
+            route = scope.get("route")
+            metrics.HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+app.add_middleware(MetricsMiddleware)
+
+
 # 数据模型
 class BookItem(BaseModel):
     rank: int
@@ -32,6 +130,7 @@ class BookItem(BaseModel):
     book_url: Optional[str] = None
     category: Optional[str] = None
     indicator_value: Optional[str] = None
+    indicator_num: Optional[float] = None
     indicator_unit: Optional[str] = None
     cover_url: Optional[str] = None
     latest_chapter: Optional[str] = None
@@ -45,11 +144,372 @@ class RankingData(BaseModel):
     books: List[BookItem]
 
 
+# 数据库文件路径和连接池大小，可通过环境变量配置
+DB_PATH = os.environ.get("BOOKLIST_DB", "booklist.db")
+DB_POOL_SIZE = int(os.environ.get("BOOKLIST_DB_POOL_SIZE", "8"))
+
+
+class ConnectionPool:
+    """
+    只读SQLite连接池
+    连接在请求之间复用，数据库使用WAL模式，抓取程序写入时不会阻塞读取
+    """
+
+    def __init__(self, db_path, size=8, timeout=30):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """创建一个只读连接"""
+        # 接口处理函数在线程池中执行，连接会在不同线程间传递
+        # 使用记录语句耗时的连接，耗时通过/metrics接口输出
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            factory=metrics.InstrumentedConnection,
+        )
+        conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+        try:
+            # WAL模式保存在数据库文件中，由第一个连接设置即可
+            conn.execute("PRAGMA journal_mode = WAL")
+        except sqlite3.Error:
+            pass
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA mmap_size = 268435456")  # 256MB
+        conn.execute("PRAGMA cache_size = -16384")  # 16MB
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # 连接数已达上限，等待其他请求归还
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise HTTPException(status_code=503, detail="数据库连接繁忙，请稍后重试")
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """从连接池借出一个连接，使用完毕后自动归还"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+db_pool = ConnectionPool(DB_PATH, size=DB_POOL_SIZE)
+
+
 # 获取数据库连接
 def get_db_connection():
-    conn = sqlite3.connect("booklist.db")
-    conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
-    return conn
+    return db_pool.connection()
+
+
+# 榜单接口的响应缓存，缓存键包含数据版本号，抓取程序写入新数据后自动失效
+response_cache = ResponseCache(
+    maxsize=int(os.environ.get("BOOKLIST_CACHE_SIZE", "256")),
+    ttl=int(os.environ.get("BOOKLIST_CACHE_TTL", "300")),
+)
+
+# 请求的日期对应的实际数据日期，缓存键同样包含数据版本号
+fetch_date_cache = ResponseCache(maxsize=1024, ttl=300)
+
+# 数据版本号的检查间隔(秒)，避免每个请求都查询数据库
+GENERATION_CHECK_INTERVAL = 1.0
+_generation_state = {"value": 0, "updated_at": None, "checked_at": 0.0}
+_generation_lock = threading.Lock()
+
+
+def get_data_version():
+    """获取当前数据版本号和最近一次写入的时间(Unix时间戳)"""
+    now = time.monotonic()
+    with _generation_lock:
+        if now - _generation_state["checked_at"] < GENERATION_CHECK_INTERVAL:
+            return _generation_state["value"], _generation_state["updated_at"]
+
+    try:
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM meta WHERE key IN ('generation', 'generation_time')"
+            ).fetchall()
+        meta = {row["key"]: row["value"] for row in rows}
+    except sqlite3.OperationalError:
+        # 旧版本数据库没有meta表
+        meta = {}
+
+    with _generation_lock:
+        _generation_state["value"] = meta.get("generation", 0)
+        _generation_state["updated_at"] = meta.get("generation_time")
+        _generation_state["checked_at"] = now
+        return _generation_state["value"], _generation_state["updated_at"]
+
+
+def get_data_generation():
+    """获取当前数据版本号"""
+    return get_data_version()[0]
+
+
+def is_not_modified(request, etag, last_modified):
+    """根据If-None-Match / If-Modified-Since判断客户端缓存是否仍然有效"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match优先于If-Modified-Since，按弱比较处理
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(
+            tag.removeprefix("W/") == etag for tag in candidates
+        )
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return last_modified <= since
+    return False
+
+
+def cached_json_response(
+    request, endpoint, site_code, ranking_type, date, build, options=None
+):
+    """
+    返回缓存的JSON响应，未命中时调用build生成响应数据并缓存序列化结果
+    响应带有ETag和Last-Modified，客户端缓存有效时直接返回304，不查询也不序列化
+    date应为resolve_fetch_date解析后的数据日期，不带日期的请求与指定该日期的请求共用缓存和ETag；
+    options为影响响应内容的其他查询参数，包含在缓存键中
+    """
+    generation, updated_at = get_data_version()
+    key = (endpoint, site_code, ranking_type, date, options, generation)
+
+    etag = '"%s"' % hashlib.md5(repr(key).encode("utf-8")).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if updated_at:
+        headers["Last-Modified"] = formatdate(updated_at, usegmt=True)
+
+    if is_not_modified(request, etag, updated_at):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key)
+    if body is None:
+        body = JSONResponse(build()).body
+        response_cache.set(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# 书籍属性保存在books和authors表中，rankings表通过book_ref引用
+BOOK_JOIN = """
+JOIN books b ON b.book_ref = r.book_ref
+LEFT JOIN authors a ON a.author_id = b.author_id
+"""
+
+
+def archive_unavailable(error):
+    """已登记的归档文件被移走或删除时返回503，而不是笼统的服务器错误"""
+    return HTTPException(
+        status_code=503,
+        detail=f"归档文件 {os.path.basename(error.filename or '')} 缺失，暂时无法查询该时间段的数据",
+    )
+
+
+def rankings_table(conn, date, keep=()):
+    """archive.rankings_table，归档文件缺失时抛出503"""
+    try:
+        return archive.rankings_table(conn, date, keep)
+    except FileNotFoundError as e:
+        raise archive_unavailable(e)
+
+
+def iter_rankings_tables(conn, start_date=None, end_date=None):
+    """archive.iter_rankings_tables，归档文件缺失时抛出503"""
+    try:
+        yield from archive.iter_rankings_tables(conn, start_date, end_date)
+    except FileNotFoundError as e:
+        raise archive_unavailable(e)
+
+
+def fetch_snapshot(conn, query, date, params):
+    """
+    在保存该日期快照的rankings表上执行查询，query中的{rankings}替换为表名
+    日期已归档时附加对应的归档文件，否则查询热数据库
+    """
+    table = rankings_table(conn, date)
+    return conn.execute(query.format(rankings=table), params).fetchall()
+
+
+# extra_data字段的筛选参数及其条件，使用rankings表的生成列和部分索引，不解析JSON
+EXTRA_FILTERS = {
+    "special_mark": "r.special_mark = ?",
+    "update_rate": "r.update_rate = ?",
+    "min_rank_score": "r.rank_score >= ?",
+}
+
+
+def extra_filter_conditions(filters):
+    """返回extra_data字段筛选的SQL条件列表和参数，忽略没有提供的参数"""
+    conditions = []
+    params = []
+    for name, condition in EXTRA_FILTERS.items():
+        value = (filters or {}).get(name)
+        if value is not None and value != "":
+            conditions.append(condition)
+            params.append(value)
+    return conditions, params
+
+
+def extra_data_column(include_extra):
+    """不需要extra_data时不读取该列，也就不需要逐行解析JSON"""
+    return "r.extra_data" if include_extra else "NULL AS extra_data"
+
+
+def get_latest_fetch_date(cursor, site_id=None, ranking_type_id=None):
+    """
+    获取最近有数据的日期，可按站点和榜单类型限定范围
+    优先查询latest_snapshot表，旧版本数据库没有该表时退回扫描rankings表
+    """
+    conditions = []
+    params = []
+    if site_id is not None:
+        conditions.append("site_id = ?")
+        params.append(site_id)
+    if ranking_type_id is not None:
+        conditions.append("ranking_type_id = ?")
+        params.append(ranking_type_id)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    try:
+        cursor.execute(f"SELECT MAX(fetch_date) FROM latest_snapshot{where}", params)
+    except sqlite3.OperationalError:
+        cursor.execute(f"SELECT MAX(fetch_date) FROM rankings{where}", params)
+    return cursor.fetchone()[0]
+
+
+def get_site_and_ranking_type(cursor, site_code, ranking_type):
+    """
+    查询站点和榜单类型，任一不存在时返回404
+    返回 (site_id, site_name, ranking_type_id, type_name)
+    """
+    cursor.execute(
+        "SELECT site_id, site_name FROM sites WHERE site_code = ?", (site_code,)
+    )
+    site = cursor.fetchone()
+    if not site:
+        raise HTTPException(status_code=404, detail=f"站点 {site_code} 不存在")
+
+    cursor.execute(
+        "SELECT ranking_type_id, type_name FROM ranking_types WHERE site_id = ? AND type_code = ?",
+        (site["site_id"], ranking_type),
+    )
+    ranking_type_info = cursor.fetchone()
+    if not ranking_type_info:
+        raise HTTPException(
+            status_code=404,
+            detail=f"榜单类型 {ranking_type} 不存在于站点 {site_code}",
+        )
+
+    return (
+        site["site_id"],
+        site["site_name"],
+        ranking_type_info["ranking_type_id"],
+        ranking_type_info["type_name"],
+    )
+
+
+def has_snapshot(conn, date, site_id=None, ranking_type_id=None):
+    """指定日期是否有榜单数据，可按站点和榜单类型限定范围"""
+    table = rankings_table(conn, date)
+    if ranking_type_id is not None:
+        query = f"SELECT 1 FROM {table} WHERE ranking_type_id = ? AND fetch_date = ? LIMIT 1"
+        params = (ranking_type_id, date)
+    elif site_id is not None:
+        query = f"SELECT 1 FROM {table} WHERE site_id = ? AND fetch_date = ? LIMIT 1"
+        params = (site_id, date)
+    else:
+        # 逐个站点使用(site_id, fetch_date)索引
+        query = f"""
+        SELECT 1 FROM sites s
+        WHERE EXISTS (SELECT 1 FROM {table} r WHERE r.site_id = s.site_id AND r.fetch_date = ?)
+        LIMIT 1
+        """
+        params = (date,)
+    return conn.execute(query, params).fetchone() is not None
+
+
+def resolve_fetch_date(site_code, ranking_type, date):
+    """
+    将请求的日期解析为实际返回数据的日期：
+    晚于最近的数据日期或当天没有数据时使用最近的数据日期
+    结果按数据版本号缓存，站点或榜单类型不存在时返回404
+    """
+    key = (site_code, ranking_type, date, get_data_generation())
+    resolved = fetch_date_cache.get(key)
+    if resolved is not None:
+        return resolved
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        site_id = ranking_type_id = None
+        if ranking_type:
+            site_id, _, ranking_type_id, _ = get_site_and_ranking_type(
+                cursor, site_code, ranking_type
+            )
+        elif site_code:
+            cursor.execute(
+                "SELECT site_id FROM sites WHERE site_code = ?", (site_code,)
+            )
+            site = cursor.fetchone()
+            if not site:
+                raise HTTPException(status_code=404, detail=f"站点 {site_code} 不存在")
+            site_id = site["site_id"]
+
+        resolved = date
+        latest_date = get_latest_fetch_date(cursor, site_id, ranking_type_id)
+        if latest_date and (
+            date > latest_date or not has_snapshot(conn, date, site_id, ranking_type_id)
+        ):
+            resolved = latest_date
+
+    fetch_date_cache.set(key, resolved)
+    return resolved
 
 
 @app.get("/")
@@ -61,63 +521,67 @@ async def root():
             "/api/rankings",
             "/api/rankings/{site_code}",
             "/api/rankings/{site_code}/{ranking_type}",
+            "/api/rankings/{site_code}/{ranking_type}/movers",
+            "/api/export",
+            "/api/books/{book_id}/history",
+            "/api/indicators/top",
+            "/api/cache/stats",
+            "/api/fetch-logs",
+            "/metrics",
         ],
     }
 
 
 @app.get("/api/sites", summary="获取所有站点信息")
-async def get_sites():
+def get_sites():
     """
     获取所有已配置的站点信息
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM sites WHERE active = 1")
-        sites = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM sites WHERE active = 1")
+            sites = [dict(row) for row in cursor.fetchall()]
         return {"sites": sites}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取站点信息失败: {str(e)}")
 
 
 @app.get("/api/rankings", summary="获取当日所有榜单数据")
-async def get_all_rankings(date: str = None):
+def get_all_rankings(request: Request, date: str = None):
     """
     获取当日所有平台的所有榜单数据
 
     - **date**: 可选参数，指定获取哪一天的榜单数据，格式为YYYY-MM-DD，默认为今天
     """
-    try:
-        # 如果没有提供日期，使用今天的日期
-        if not date:
-            date = datetime.now().strftime("%Y-%m-%d")
+    # 如果没有提供日期，使用今天的日期
+    if not date:
+        date = datetime.now().strftime("%Y-%m-%d")
+    date = resolve_fetch_date(None, None, date)
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    return cached_json_response(
+        request, "all_rankings", None, None, date, lambda: build_all_rankings(date)
+    )
 
-        # 查询当日所有榜单数据，只返回rank和book_id
-        query = """
-        SELECT s.site_name, s.site_code, rt.type_name, rt.type_code, 
-               r.rank, r.book_id, r.fetch_date
-        FROM rankings r
-        JOIN sites s ON r.site_id = s.site_id
-        JOIN ranking_types rt ON r.ranking_type_id = rt.ranking_type_id
-        WHERE r.fetch_date = ?
-        ORDER BY s.site_name, rt.type_name, r.rank
-        """
-        cursor.execute(query, (date,))
-        results = cursor.fetchall()
 
-        # 如果没有数据，尝试获取最近的数据
-        if not results:
-            # 查询最近的数据日期
-            cursor.execute("SELECT MAX(fetch_date) FROM rankings")
-            latest_date = cursor.fetchone()[0]
-            if latest_date:
-                cursor.execute(query, (latest_date,))
-                results = cursor.fetchall()
-                date = latest_date  # 更新日期为最近的数据日期
+def build_all_rankings(date):
+    """查询并组织所有平台的榜单数据，date为resolve_fetch_date解析后的数据日期"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+
+            # 查询当日所有榜单数据，只返回rank和book_id
+            query = """
+            SELECT s.site_name, s.site_code, rt.type_name, rt.type_code,
+                   r.rank, b.book_id, r.fetch_date
+            FROM {rankings} r
+            JOIN books b ON b.book_ref = r.book_ref
+            JOIN sites s ON r.site_id = s.site_id
+            JOIN ranking_types rt ON r.ranking_type_id = rt.ranking_type_id
+            WHERE r.fetch_date = ?
+            ORDER BY s.site_name, rt.type_name, r.rank
+            """
+            results = fetch_snapshot(conn, query, date, (date,))
 
         # 组织数据结构
         rankings_by_site = {}
@@ -148,65 +612,90 @@ async def get_all_rankings(date: str = None):
 
             rankings_by_site[site_code]["rankings"][type_code]["books"].append(book)
 
-        conn.close()
-
         return {"fetch_date": date, "sites": list(rankings_by_site.values())}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取榜单数据失败: {str(e)}")
 
 
 @app.get("/api/rankings/{site_code}", summary="获取指定站点的榜单数据")
-async def get_site_rankings(site_code: str, date: str = None):
+def get_site_rankings(
+    request: Request,
+    site_code: str,
+    date: str = None,
+    include_extra: bool = True,
+    special_mark: Optional[str] = None,
+    update_rate: Optional[str] = None,
+    min_rank_score: Optional[float] = None,
+):
     """
     获取指定站点的所有榜单数据
 
     - **site_code**: 站点代码，如ciweimao, qidian, fanqie
     - **date**: 可选参数，指定获取哪一天的榜单数据，格式为YYYY-MM-DD，默认为今天
+    - **include_extra**: 是否返回extra_data，默认为true
+    - **special_mark**: 可选参数，只返回带有该特殊标记的书籍(起点中文网)，如"销量冠军"
+    - **update_rate**: 可选参数，只返回该更新频率的书籍(刺猬猫)
+    - **min_rank_score**: 可选参数，只返回排名分数不低于该值的书籍(番茄小说)
     """
-    try:
-        # 如果没有提供日期，使用今天的日期
-        if not date:
-            date = datetime.now().strftime("%Y-%m-%d")
+    # 如果没有提供日期，使用今天的日期
+    if not date:
+        date = datetime.now().strftime("%Y-%m-%d")
+    date = resolve_fetch_date(site_code, None, date)
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    filters = {
+        "special_mark": special_mark,
+        "update_rate": update_rate,
+        "min_rank_score": min_rank_score,
+    }
+    return cached_json_response(
+        request,
+        "site_rankings",
+        site_code,
+        None,
+        date,
+        lambda: build_site_rankings(site_code, date, include_extra, filters),
+        options=(include_extra, tuple(filters.values())),
+    )
 
-        # 首先检查站点是否存在
-        cursor.execute(
-            "SELECT site_id, site_name FROM sites WHERE site_code = ?", (site_code,)
-        )
-        site = cursor.fetchone()
-        if not site:
-            raise HTTPException(status_code=404, detail=f"站点 {site_code} 不存在")
 
-        site_id = site["site_id"]
-        site_name = site["site_name"]
-
-        # 查询指定站点当日所有榜单数据
-        query = """
-        SELECT rt.type_name, rt.type_code, 
-               r.rank, r.title, r.author, r.book_id, r.book_url, r.category,
-               r.indicator_value, r.indicator_unit, r.cover_url, r.latest_chapter,
-               r.extra_data, r.fetch_date
-        FROM rankings r
-        JOIN ranking_types rt ON r.ranking_type_id = rt.ranking_type_id
-        WHERE r.site_id = ? AND r.fetch_date = ?
-        ORDER BY rt.type_name, r.rank
-        """
-        cursor.execute(query, (site_id, date))
-        results = cursor.fetchall()
+def build_site_rankings(site_code, date, include_extra=True, filters=None):
+    """
+    查询并组织指定站点的榜单数据，date为resolve_fetch_date解析后的数据日期，
+    filters为extra_data字段的筛选参数
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
 
-        # 如果没有数据，尝试获取最近的数据
-        if not results:
+            # 首先检查站点是否存在
             cursor.execute(
-                "SELECT MAX(fetch_date) FROM rankings WHERE site_id = ?", (site_id,)
+                "SELECT site_id, site_name FROM sites WHERE site_code = ?", (site_code,)
             )
-            latest_date = cursor.fetchone()[0]
-            if latest_date:
-                cursor.execute(query, (site_id, latest_date))
-                results = cursor.fetchall()
-                date = latest_date  # 更新日期为最近的数据日期
+            site = cursor.fetchone()
+            if not site:
+                raise HTTPException(status_code=404, detail=f"站点 {site_code} 不存在")
+
+            site_id = site["site_id"]
+            site_name = site["site_name"]
+
+            # 查询指定站点当日所有榜单数据
+            extra_conditions, extra_params = extra_filter_conditions(filters)
+            extra_where = "".join(f" AND {c}" for c in extra_conditions)
+            query = f"""
+            SELECT rt.type_name, rt.type_code,
+                   r.rank, b.title, COALESCE(a.author_name, '') AS author, b.book_id, b.book_url,
+                   b.category, r.indicator_value, r.indicator_num, r.indicator_unit, b.cover_url,
+                   b.latest_chapter, {extra_data_column(include_extra)}, r.fetch_date
+            FROM {{rankings}} r
+            JOIN ranking_types rt ON r.ranking_type_id = rt.ranking_type_id
+            {BOOK_JOIN}
+            WHERE r.site_id = ? AND r.fetch_date = ?{extra_where}
+            ORDER BY rt.type_name, r.rank
+            """
+            results = fetch_snapshot(conn, query, date, (site_id, date, *extra_params))
 
         # 组织数据结构
         rankings_by_type = {}
@@ -237,6 +726,7 @@ async def get_site_rankings(site_code: str, date: str = None):
                 "book_url": row["book_url"],
                 "category": row["category"],
                 "indicator_value": row["indicator_value"],
+                "indicator_num": row["indicator_num"],
                 "indicator_unit": row["indicator_unit"],
                 "cover_url": row["cover_url"],
                 "latest_chapter": row["latest_chapter"],
@@ -245,8 +735,6 @@ async def get_site_rankings(site_code: str, date: str = None):
 
             rankings_by_type[type_code]["books"].append(book)
 
-        conn.close()
-
         return {
             "site_name": site_name,
             "site_code": site_code,
@@ -263,71 +751,81 @@ async def get_site_rankings(site_code: str, date: str = None):
 @app.get(
     "/api/rankings/{site_code}/{ranking_type}", summary="获取指定站点的指定榜单数据"
 )
-async def get_specific_ranking(site_code: str, ranking_type: str, date: str = None):
+def get_specific_ranking(
+    request: Request,
+    site_code: str,
+    ranking_type: str,
+    date: str = None,
+    include_extra: bool = True,
+    special_mark: Optional[str] = None,
+    update_rate: Optional[str] = None,
+    min_rank_score: Optional[float] = None,
+):
     """
     获取指定站点的指定榜单数据
 
     - **site_code**: 站点代码，如ciweimao, qidian, fanqie
     - **ranking_type**: 榜单类型代码，如weekly_clicks, monthly_votes, hot_list
     - **date**: 可选参数，指定获取哪一天的榜单数据，格式为YYYY-MM-DD，默认为今天
+    - **include_extra**: 是否返回extra_data，默认为true
+    - **special_mark**: 可选参数，只返回带有该特殊标记的书籍(起点中文网)，如"销量冠军"
+    - **update_rate**: 可选参数，只返回该更新频率的书籍(刺猬猫)
+    - **min_rank_score**: 可选参数，只返回排名分数不低于该值的书籍(番茄小说)
     """
-    try:
-        # 如果没有提供日期，使用今天的日期
-        if not date:
-            date = datetime.now().strftime("%Y-%m-%d")
+    # 如果没有提供日期，使用今天的日期
+    if not date:
+        date = datetime.now().strftime("%Y-%m-%d")
+    date = resolve_fetch_date(site_code, ranking_type, date)
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    filters = {
+        "special_mark": special_mark,
+        "update_rate": update_rate,
+        "min_rank_score": min_rank_score,
+    }
+    return cached_json_response(
+        request,
+        "specific_ranking",
+        site_code,
+        ranking_type,
+        date,
+        lambda: build_specific_ranking(
+            site_code, ranking_type, date, include_extra, filters
+        ),
+        options=(include_extra, tuple(filters.values())),
+    )
 
-        # 首先检查站点是否存在
-        cursor.execute(
-            "SELECT site_id, site_name FROM sites WHERE site_code = ?", (site_code,)
-        )
-        site = cursor.fetchone()
-        if not site:
-            raise HTTPException(status_code=404, detail=f"站点 {site_code} 不存在")
 
-        site_id = site["site_id"]
-        site_name = site["site_name"]
+def build_specific_ranking(
+    site_code, ranking_type, date, include_extra=True, filters=None
+):
+    """
+    查询并组织指定站点指定榜单的数据，date为resolve_fetch_date解析后的数据日期，
+    filters为extra_data字段的筛选参数
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
 
-        # 检查榜单类型是否存在
-        cursor.execute(
-            "SELECT ranking_type_id, type_name FROM ranking_types WHERE site_id = ? AND type_code = ?",
-            (site_id, ranking_type),
-        )
-        ranking_type_info = cursor.fetchone()
-        if not ranking_type_info:
-            raise HTTPException(
-                status_code=404,
-                detail=f"榜单类型 {ranking_type} 不存在于站点 {site_code}",
+            # 检查站点和榜单类型是否存在
+            site_id, site_name, ranking_type_id, type_name = get_site_and_ranking_type(
+                cursor, site_code, ranking_type
             )
 
-        ranking_type_id = ranking_type_info["ranking_type_id"]
-        type_name = ranking_type_info["type_name"]
-
-        # 查询指定站点指定榜单类型当日数据
-        query = """
-        SELECT r.rank, r.title, r.author, r.book_id, r.book_url, r.category,
-               r.indicator_value, r.indicator_unit, r.cover_url, r.latest_chapter,
-               r.extra_data, r.fetch_date
-        FROM rankings r
-        WHERE r.site_id = ? AND r.ranking_type_id = ? AND r.fetch_date = ?
-        ORDER BY r.rank
-        """
-        cursor.execute(query, (site_id, ranking_type_id, date))
-        results = cursor.fetchall()
-
-        # 如果没有数据，尝试获取最近的数据
-        if not results:
-            cursor.execute(
-                "SELECT MAX(fetch_date) FROM rankings WHERE site_id = ? AND ranking_type_id = ?",
-                (site_id, ranking_type_id),
+            # 查询指定站点指定榜单类型当日数据
+            extra_conditions, extra_params = extra_filter_conditions(filters)
+            extra_where = "".join(f" AND {c}" for c in extra_conditions)
+            query = f"""
+            SELECT r.rank, b.title, COALESCE(a.author_name, '') AS author, b.book_id, b.book_url,
+                   b.category, r.indicator_value, r.indicator_num, r.indicator_unit, b.cover_url,
+                   b.latest_chapter, {extra_data_column(include_extra)}, r.fetch_date
+            FROM {{rankings}} r
+            {BOOK_JOIN}
+            WHERE r.site_id = ? AND r.ranking_type_id = ? AND r.fetch_date = ?{extra_where}
+            ORDER BY r.rank
+            """
+            results = fetch_snapshot(
+                conn, query, date, (site_id, ranking_type_id, date, *extra_params)
             )
-            latest_date = cursor.fetchone()[0]
-            if latest_date:
-                cursor.execute(query, (site_id, ranking_type_id, latest_date))
-                results = cursor.fetchall()
-                date = latest_date  # 更新日期为最近的数据日期
 
         # 组织数据结构
         books = []
@@ -348,6 +846,7 @@ async def get_specific_ranking(site_code: str, ranking_type: str, date: str = No
                 "book_url": row["book_url"],
                 "category": row["category"],
                 "indicator_value": row["indicator_value"],
+                "indicator_num": row["indicator_num"],
                 "indicator_unit": row["indicator_unit"],
                 "cover_url": row["cover_url"],
                 "latest_chapter": row["latest_chapter"],
@@ -356,8 +855,6 @@ async def get_specific_ranking(site_code: str, ranking_type: str, date: str = No
 
             books.append(book)
 
-        conn.close()
-
         return {
             "site_name": site_name,
             "site_code": site_code,
@@ -373,6 +870,773 @@ async def get_specific_ranking(site_code: str, ranking_type: str, date: str = No
         raise HTTPException(status_code=500, detail=f"获取榜单数据失败: {str(e)}")
 
 
+# 榜单变化的计算结果缓存，快照写入后不再变化，缓存键包含两个快照的版本
+movers_cache = ResponseCache(maxsize=512, ttl=24 * 3600)
+
+# 一次查询对比两个快照：当前快照左连接上一快照，再补上已跌出榜单的书籍
+# 两个快照中的同一本书引用同一个book_ref，最后再连接books表取书籍属性
+# {current}和{previous}替换为保存两个快照的rankings表名，快照可能位于不同的归档文件中
+MOVERS_QUERY = f"""
+WITH cur AS (
+    SELECT book_ref, rank
+    FROM {{current}} WHERE ranking_type_id = ? AND fetch_date = ?
+),
+prev AS (
+    SELECT book_ref, rank
+    FROM {{previous}} WHERE ranking_type_id = ? AND fetch_date = ?
+),
+moves AS (
+    SELECT c.book_ref, c.rank, p.rank AS previous_rank
+    FROM cur c LEFT JOIN prev p ON p.book_ref = c.book_ref
+    UNION ALL
+    SELECT p.book_ref, NULL, p.rank
+    FROM prev p
+    WHERE NOT EXISTS (SELECT 1 FROM cur c WHERE c.book_ref = p.book_ref)
+)
+SELECT b.book_id, b.title, COALESCE(a.author_name, '') AS author, r.rank, r.previous_rank
+FROM moves r
+{BOOK_JOIN}
+"""
+
+
+def get_snapshot_version(cursor, table, ranking_type_id, fetch_date):
+    """
+    获取榜单快照的版本，重新抓取会删除并重新插入快照，最大ranking_id随之变化
+    归档时ranking_id保持不变，快照移动到归档文件后版本不变
+    """
+    cursor.execute(
+        f"SELECT MAX(ranking_id), COUNT(*) FROM {table} WHERE ranking_type_id = ? AND fetch_date = ?",
+        (ranking_type_id, fetch_date),
+    )
+    return tuple(cursor.fetchone())
+
+
+def get_previous_fetch_date(conn, ranking_type_id, date):
+    """获取榜单在date之前最近一次有数据的日期，热数据库中没有时从最近的归档文件往前查找"""
+    query = "SELECT MAX(fetch_date) FROM {rankings} WHERE ranking_type_id = ? AND fetch_date < ?"
+    tables = itertools.chain(
+        ["rankings"],
+        (
+            archive.attach_partition(conn, month, file_name)
+            for month, file_name in reversed(
+                archive.list_partitions(conn, end_date=date)
+            )
+        ),
+    )
+    try:
+        for table in tables:
+            previous_date = conn.execute(
+                query.format(rankings=table), (ranking_type_id, date)
+            ).fetchone()[0]
+            if previous_date:
+                return previous_date
+    except FileNotFoundError as e:
+        raise archive_unavailable(e)
+    return None
+
+
+def compute_movers(cursor, ranking_type_id, date, previous_date, tables):
+    """
+    对比两个快照，返回新上榜、跌出榜单、排名上升和下降的书籍
+    tables为保存两个快照的rankings表名 (current, previous)
+    """
+    current, previous = tables
+    cursor.execute(
+        MOVERS_QUERY.format(current=current, previous=previous),
+        (ranking_type_id, date, ranking_type_id, previous_date),
+    )
+
+    new_entries = []
+    dropouts = []
+    risers = []
+    fallers = []
+    unchanged = 0
+    for row in cursor.fetchall():
+        book = {
+            "book_id": row["book_id"],
+            "title": row["title"],
+            "author": row["author"],
+            "rank": row["rank"],
+            "previous_rank": row["previous_rank"],
+        }
+        if row["previous_rank"] is None:
+            new_entries.append(book)
+        elif row["rank"] is None:
+            dropouts.append(book)
+        else:
+            book["change"] = row["previous_rank"] - row["rank"]
+            if book["change"] > 0:
+                risers.append(book)
+            elif book["change"] < 0:
+                fallers.append(book)
+            else:
+                unchanged += 1
+
+    new_entries.sort(key=lambda book: book["rank"])
+    dropouts.sort(key=lambda book: book["previous_rank"])
+    risers.sort(key=lambda book: (-book["change"], book["rank"]))
+    fallers.sort(key=lambda book: (book["change"], book["rank"]))
+    return {
+        "new_entries": new_entries,
+        "dropouts": dropouts,
+        "risers": risers,
+        "fallers": fallers,
+        "unchanged": unchanged,
+    }
+
+
+@app.get(
+    "/api/rankings/{site_code}/{ranking_type}/movers",
+    summary="获取指定榜单两个日期之间的排名变化",
+)
+def get_ranking_movers(
+    site_code: str,
+    ranking_type: str,
+    date: Optional[str] = None,
+    previous_date: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=200),
+):
+    """
+    对比指定榜单两个日期的快照，返回新上榜、跌出榜单以及排名上升和下降最多的书籍
+
+    - **site_code**: 站点代码，如ciweimao, qidian, fanqie
+    - **ranking_type**: 榜单类型代码，如weekly_clicks, monthly_votes, hot_list
+    - **date**: 可选参数，对比的日期，格式为YYYY-MM-DD，默认为今天(没有数据时使用最近的数据日期)
+    - **previous_date**: 可选参数，作为基准的日期，默认为date之前最近一次有数据的日期
+    - **limit**: 上升和下降榜各返回的书籍数量
+    """
+    try:
+        if not date:
+            date = datetime.now().strftime("%Y-%m-%d")
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            site_id, site_name, ranking_type_id, type_name = get_site_and_ranking_type(
+                cursor, site_code, ranking_type
+            )
+
+            latest_date = get_latest_fetch_date(cursor, site_id, ranking_type_id)
+            if latest_date and date > latest_date:
+                date = latest_date
+
+            if not previous_date:
+                previous_date = get_previous_fetch_date(conn, ranking_type_id, date)
+                if not previous_date:
+                    raise HTTPException(
+                        status_code=404, detail=f"{date} 之前没有可对比的榜单数据"
+                    )
+
+            current_table = rankings_table(conn, date)
+            tables = (
+                current_table,
+                rankings_table(conn, previous_date, keep=(current_table,)),
+            )
+            versions = (
+                get_snapshot_version(cursor, tables[0], ranking_type_id, date),
+                get_snapshot_version(cursor, tables[1], ranking_type_id, previous_date),
+            )
+            # 任一日期没有快照时无法对比，否则所有书籍都会被当作新上榜或跌出榜单
+            for fetch_date, (_, row_count) in zip((date, previous_date), versions):
+                if not row_count:
+                    raise HTTPException(
+                        status_code=404, detail=f"{fetch_date} 没有该榜单的数据"
+                    )
+            key = (ranking_type_id, date, previous_date) + versions
+            movers = movers_cache.get(key)
+            if movers is None:
+                movers = compute_movers(
+                    cursor, ranking_type_id, date, previous_date, tables
+                )
+                movers_cache.set(key, movers)
+
+        return {
+            "site_name": site_name,
+            "site_code": site_code,
+            "type_name": type_name,
+            "type_code": ranking_type,
+            "fetch_date": date,
+            "previous_date": previous_date,
+            "new_entries": movers["new_entries"],
+            "dropouts": movers["dropouts"],
+            "risers": movers["risers"][:limit],
+            "fallers": movers["fallers"][:limit],
+            "unchanged": movers["unchanged"],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取榜单变化失败: {str(e)}")
+
+
+# 导出接口的字段和每批读取的行数
+EXPORT_COLUMNS = [
+    "fetch_date",
+    "site_code",
+    "type_code",
+    "rank",
+    "book_id",
+    "title",
+    "author",
+    "book_url",
+    "category",
+    "indicator_value",
+    "indicator_num",
+    "indicator_unit",
+    "cover_url",
+    "latest_chapter",
+    "creation_status",
+    "extra_data",
+]
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_page_query(query, key_columns, after):
+    """
+    在导出查询中加入键集分页条件，after为上一页最后一行的排序键，第一页为None
+    返回 (query, params)，query中的{rankings}仍需替换为表名
+    """
+    if after is None:
+        return query.replace("{keyset}", "1"), []
+    columns = ", ".join(key_columns)
+    placeholders = ", ".join("?" * len(key_columns))
+    return query.replace("{keyset}", f"({columns}) > ({placeholders})"), list(after)
+
+
+def iter_export_batches(query, params, key_columns, start_date=None, end_date=None):
+    """
+    逐页读取查询结果，query中的{rankings}依次替换为日期范围内的归档表和热数据库的rankings表
+    每页按排序键从上一页的最后一行之后继续读取(键集分页)，读取每页时才从连接池取出连接，
+    读完立即归还，导出期间不长时间占用连接，也不持有跨越整个响应的WAL读事务
+    各页分别读取，导出期间重新抓取的快照可能在前后页之间发生变化
+    """
+    with get_db_connection() as conn:
+        partitions = archive.list_partitions(conn, start_date, end_date)
+    for partition in itertools.chain(partitions, [None]):
+        after = None
+        while True:
+            page_query, page_params = export_page_query(query, key_columns, after)
+            with get_db_connection() as conn:
+                table = (
+                    "rankings"
+                    if partition is None
+                    else archive.attach_partition(conn, *partition)
+                )
+                rows = conn.execute(
+                    page_query.format(rankings=table), params + page_params
+                ).fetchall()
+            if rows:
+                yield [row[: len(EXPORT_COLUMNS)] for row in rows]
+            if len(rows) < EXPORT_BATCH_SIZE:
+                break
+            after = rows[-1][len(EXPORT_COLUMNS) :]
+
+
+def iter_export_ndjson(query, params, key_columns, start_date=None, end_date=None):
+    """逐批读取查询结果并编码为NDJSON"""
+    for rows in iter_export_batches(query, params, key_columns, start_date, end_date):
+        lines = []
+        for row in rows:
+            item = dict(zip(EXPORT_COLUMNS, row))
+            if item["extra_data"]:
+                try:
+                    item["extra_data"] = json.loads(item["extra_data"])
+                except ValueError:
+                    pass
+            lines.append(json.dumps(item, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_export_csv(query, params, key_columns, start_date=None, end_date=None):
+    """逐批读取查询结果并编码为CSV，extra_data保留为JSON字符串"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    # 带BOM，便于Excel正确识别中文
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+
+    for rows in iter_export_batches(query, params, key_columns, start_date, end_date):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def build_export_query(
+    conn,
+    site_code=None,
+    ranking_type=None,
+    start_date=None,
+    end_date=None,
+    include_extra=True,
+    filters=None,
+):
+    """
+    构造导出查询，返回 (query, params, key_columns)，query中的{rankings}替换为表名，
+    {keyset}替换为export_page_query生成的分页条件；key_columns为排序键，
+    每行在EXPORT_COLUMNS之后附带这些列，用于读取下一页
+    结果按 (fetch_date, ranking_type_id, rank) 排序，每种筛选条件都有直接给出该顺序的索引：
+    按榜单类型筛选时使用唯一索引，按站点筛选时使用idx_rankings_site_date，
+    按special_mark或update_rate筛选时使用对应的部分索引，否则使用idx_rankings_date。
+    查询不需要临时B树排序，结果边读边输出，内存占用与导出总量无关
+    """
+    conditions = []
+    params = []
+    key_columns = ["r.fetch_date", "r.ranking_type_id", "r.rank"]
+    site_id = None
+    if site_code:
+        site = conn.execute(
+            "SELECT site_id FROM sites WHERE site_code = ?", (site_code,)
+        ).fetchone()
+        if not site:
+            raise HTTPException(status_code=404, detail=f"站点 {site_code} 不存在")
+        site_id = site["site_id"]
+        conditions.append("r.site_id = ?")
+        params.append(site_id)
+    if ranking_type:
+        # 先取出榜单类型ID，避免查询从ranking_types表开始连接而打乱输出顺序
+        type_query = "SELECT ranking_type_id FROM ranking_types WHERE type_code = ?"
+        type_params = [ranking_type]
+        if site_id is not None:
+            type_query += " AND site_id = ?"
+            type_params.append(site_id)
+        type_ids = [row[0] for row in conn.execute(type_query, type_params)]
+        if not type_ids:
+            raise HTTPException(
+                status_code=404, detail=f"榜单类型 {ranking_type} 不存在"
+            )
+        if len(type_ids) == 1:
+            conditions.append("r.ranking_type_id = ?")
+            # 只有一个榜单类型时排序键不需要包含类型，分页条件可以直接用唯一索引定位
+            key_columns = ["r.fetch_date", "r.rank"]
+        else:
+            # 多个站点有同名榜单时，唯一索引按类型分段，不能给出按日期的顺序，改用日期索引
+            conditions.append(
+                f"+r.ranking_type_id IN ({', '.join('?' * len(type_ids))})"
+            )
+        params += type_ids
+    if start_date:
+        conditions.append("r.fetch_date >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("r.fetch_date <= ?")
+        params.append(end_date)
+    extra_conditions, extra_params = extra_filter_conditions(filters)
+    # rank_score按范围筛选，其索引不能给出输出顺序，用+禁止使用该索引
+    conditions += [
+        "+" + condition if condition.startswith("r.rank_score") else condition
+        for condition in extra_conditions
+    ]
+    params += extra_params
+    conditions.append("{keyset}")
+    where = f"WHERE {' AND '.join(conditions)}"
+
+    # CROSS JOIN固定以rankings表为外层循环(SQLite不会调整CROSS JOIN的连接顺序)，
+    # 否则查询可能从sites表开始连接，输出顺序被打乱而需要排序。
+    # 已归档的月份先于热数据库输出，各文件的日期范围不重叠，整体仍按日期排序
+    query = f"""
+    SELECT r.fetch_date, s.site_code, rt.type_code, r.rank, b.book_id,
+           b.title, COALESCE(a.author_name, '') AS author, b.book_url, b.category, r.indicator_value,
+           r.indicator_num, r.indicator_unit, b.cover_url, b.latest_chapter, b.creation_status,
+           {extra_data_column(include_extra)}, {', '.join(key_columns)}
+    FROM {{rankings}} r
+    CROSS JOIN sites s ON s.site_id = r.site_id
+    CROSS JOIN ranking_types rt ON rt.ranking_type_id = r.ranking_type_id
+    CROSS JOIN books b ON b.book_ref = r.book_ref
+    LEFT JOIN authors a ON a.author_id = b.author_id
+    {where}
+    ORDER BY r.fetch_date, r.ranking_type_id, r.rank
+    LIMIT {EXPORT_BATCH_SIZE}
+    """
+    return query, params, key_columns
+
+
+@app.get("/api/export", summary="流式导出榜单历史数据")
+def export_rankings(
+    site_code: Optional[str] = None,
+    ranking_type: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    include_extra: bool = True,
+    special_mark: Optional[str] = None,
+    update_rate: Optional[str] = None,
+    min_rank_score: Optional[float] = None,
+):
+    """
+    按条件流式导出榜单数据，每批从数据库读取固定行数，内存占用与导出总量无关
+
+    - **site_code**: 可选参数，站点代码
+    - **ranking_type**: 可选参数，榜单类型代码
+    - **start_date**: 可选参数，起始日期(包含)，格式为YYYY-MM-DD
+    - **end_date**: 可选参数，结束日期(包含)，格式为YYYY-MM-DD
+    - **format**: 导出格式，ndjson(默认)或csv
+    - **include_extra**: 是否导出extra_data，默认为true
+    - **special_mark** / **update_rate** / **min_rank_score**: 可选参数，按extra_data中的字段筛选
+    """
+    with get_db_connection() as conn:
+        query, params, key_columns = build_export_query(
+            conn,
+            site_code,
+            ranking_type,
+            start_date,
+            end_date,
+            include_extra,
+            {
+                "special_mark": special_mark,
+                "update_rate": update_rate,
+                "min_rank_score": min_rank_score,
+            },
+        )
+        # 响应开始后无法再修改状态码，流式读取之前检查归档文件
+        missing = archive.missing_partitions(conn, start_date, end_date)
+        if missing:
+            raise archive_unavailable(
+                FileNotFoundError(errno.ENOENT, "归档文件不存在", missing[0])
+            )
+
+    if format == "csv":
+        return StreamingResponse(
+            iter_export_csv(query, params, key_columns, start_date, end_date),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="rankings.csv"'},
+        )
+    return StreamingResponse(
+        iter_export_ndjson(query, params, key_columns, start_date, end_date),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.get("/api/books/{book_id}/history", summary="获取书籍的历史排名")
+def get_book_history(
+    book_id: str,
+    site_code: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+):
+    """
+    获取书籍在各站点各榜单中的排名和指标变化
+
+    - **book_id**: 书籍ID
+    - **site_code**: 可选参数，只返回指定站点的数据
+    - **start_date**: 可选参数，起始日期(包含)，格式为YYYY-MM-DD
+    - **end_date**: 可选参数，结束日期(包含)，格式为YYYY-MM-DD
+    """
+    try:
+        conditions = ["b.book_id = ?"]
+        params = [book_id]
+        if site_code:
+            conditions.append("s.site_code = ?")
+            params.append(site_code)
+        if start_date:
+            conditions.append("r.fetch_date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("r.fetch_date <= ?")
+            params.append(end_date)
+
+        # 先按book_id定位books表中的书籍，rankings表的列全部来自idx_rankings_book_history覆盖索引
+        query = f"""
+        SELECT s.site_code, s.site_name, rt.type_code, rt.type_name,
+               r.fetch_date, r.rank, r.indicator_value, r.indicator_num
+        FROM books b
+        JOIN {{rankings}} r ON r.book_ref = b.book_ref
+        JOIN sites s ON b.site_id = s.site_id
+        JOIN ranking_types rt ON r.ranking_type_id = rt.ranking_type_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY r.fetch_date
+        """
+        # 依次查询日期范围内的归档文件和热数据库，归档月份早于热数据库，结果仍按日期排序
+        results = []
+        with get_db_connection() as conn:
+            for table in iter_rankings_tables(conn, start_date, end_date):
+                results.extend(
+                    conn.execute(query.format(rankings=table), params).fetchall()
+                )
+
+        if not results:
+            raise HTTPException(status_code=404, detail=f"书籍 {book_id} 没有榜单记录")
+
+        # 按站点和榜单分组
+        series = {}
+        for row in results:
+            key = (row["site_code"], row["type_code"])
+            if key not in series:
+                series[key] = {
+                    "site_code": row["site_code"],
+                    "site_name": row["site_name"],
+                    "type_code": row["type_code"],
+                    "type_name": row["type_name"],
+                    "history": [],
+                }
+            series[key]["history"].append(
+                {
+                    "fetch_date": row["fetch_date"],
+                    "rank": row["rank"],
+                    "indicator_value": row["indicator_value"],
+                    "indicator_num": row["indicator_num"],
+                }
+            )
+
+        return {"book_id": book_id, "rankings": list(series.values())}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取书籍历史数据失败: {str(e)}")
+
+
+@app.get("/api/indicators/top", summary="获取跨站点指标最高的书籍")
+def get_top_indicators(
+    unit: str = "月票",
+    date: Optional[str] = None,
+    site_code: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=500),
+):
+    """
+    按规范单位比较各站点各榜单的指标数值，返回指标最高的书籍
+
+    - **unit**: 指标单位，如月票、点击，默认为月票
+    - **date**: 可选参数，格式为YYYY-MM-DD，默认为该单位最近有数据的日期
+    - **site_code**: 可选参数，只返回指定站点的数据
+    - **limit**: 返回的书籍数量，默认为20
+    """
+    try:
+        with get_db_connection() as conn:
+            if not date:
+                date = conn.execute(
+                    "SELECT MAX(fetch_date) FROM rankings WHERE indicator_unit = ?",
+                    (unit,),
+                ).fetchone()[0]
+                if not date:
+                    raise HTTPException(
+                        status_code=404, detail=f"没有单位为 {unit} 的指标数据"
+                    )
+
+            conditions = [
+                "r.indicator_unit = ?",
+                "r.fetch_date = ?",
+                "r.indicator_num IS NOT NULL",
+            ]
+            params = [unit, date]
+            if site_code:
+                conditions.append("s.site_code = ?")
+                params.append(site_code)
+
+            # 沿idx_rankings_indicator按数值从高到低读取，同一本书出现在多个榜单时只保留数值最高的一条
+            table = rankings_table(conn, date)
+            query = f"""
+            SELECT s.site_code, s.site_name, rt.type_code, rt.type_name, r.rank,
+                   r.book_ref, b.book_id, b.title, COALESCE(a.author_name, '') AS author,
+                   b.book_url, r.indicator_value, r.indicator_num, r.indicator_unit
+            FROM {table} r
+            JOIN sites s ON r.site_id = s.site_id
+            JOIN ranking_types rt ON r.ranking_type_id = rt.ranking_type_id
+            {BOOK_JOIN}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY r.indicator_num DESC
+            """
+            books = []
+            seen = set()
+            cursor = conn.execute(query, params)
+            for row in cursor:
+                if row["book_ref"] in seen:
+                    continue
+                seen.add(row["book_ref"])
+                item = dict(row)
+                del item["book_ref"]
+                books.append(item)
+                if len(books) >= limit:
+                    break
+            # 提前结束时关闭游标，避免连接归还连接池后仍持有读事务
+            cursor.close()
+
+        return {"unit": unit, "fetch_date": date, "books": books}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取指标排行失败: {str(e)}")
+
+
+@app.get("/api/cache/stats", summary="获取响应缓存统计")
+def get_cache_stats():
+    """
+    获取榜单接口响应缓存的命中情况
+    """
+    stats = response_cache.stats()
+    stats["generation"] = get_data_generation()
+    stats["movers"] = movers_cache.stats()
+    stats["fetch_dates"] = fetch_date_cache.stats()
+    return stats
+
+
+# 抓取日志中按分位数统计的结构化字段
+FETCH_LOG_STAT_FIELDS = (
+    "fetch_seconds",
+    "parse_seconds",
+    "save_seconds",
+    "bytes_downloaded",
+    "items_fetched",
+    "retry_count",
+    "rows_rejected",
+)
+
+
+def percentile(sorted_values, p):
+    """已排序列表的p分位数(0-100)，取最接近的元素"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize_values(values):
+    """返回一组数值的p50、p95、最大值和平均值"""
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": values[-1],
+        "mean": round(sum(values) / len(values), 6),
+    }
+
+
+def summarize_fetch_runs(runs):
+    """
+    汇总一个站点最近的抓取记录，runs按时间从旧到新排列
+    耗时、字节数和条数只统计成功的抓取；trend为较新一半与较旧一半成功记录的p50之比，
+    大于1表示变慢或变多
+    """
+    status_counts = {}
+    for run in runs:
+        status_counts[run["status"]] = status_counts.get(run["status"], 0) + 1
+
+    successful = [run for run in runs if run["status"] == "成功"]
+    stats = {}
+    trend = {}
+    for field in FETCH_LOG_STAT_FIELDS:
+        values = [run[field] for run in successful if run.get(field) is not None]
+        stats[field] = summarize_values(values)
+        half = len(values) // 2
+        if half:
+            older = percentile(sorted(values[:half]), 50)
+            newer = percentile(sorted(values[-half:]), 50)
+            trend[field] = round(newer / older, 3) if older else None
+
+    # 各榜单类型写入条数的分位数
+    row_counts = {}
+    for run in successful:
+        for ranking_type, count in (run.get("row_counts") or {}).items():
+            row_counts.setdefault(ranking_type, []).append(count)
+
+    return {
+        "runs": len(runs),
+        "status_counts": status_counts,
+        "success_rate": round(len(successful) / len(runs), 4) if runs else None,
+        "stats": stats,
+        "trend": trend,
+        "row_counts": {
+            ranking_type: summarize_values(counts)
+            for ranking_type, counts in row_counts.items()
+        },
+        "latest": runs[-1] if runs else None,
+    }
+
+
+@app.get("/api/fetch-logs", summary="获取各站点最近抓取的耗时统计")
+def get_fetch_logs(
+    site_code: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """
+    按站点汇总最近limit次抓取的结构化日志，返回抓取、解析、写入耗时，下载字节数，
+    写入和拒绝条数，重试次数的p50/p95，以及较新与较旧记录相比的变化趋势
+
+    - **site_code**: 可选参数，只返回指定站点的统计
+    - **limit**: 每个站点统计的最近抓取次数
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            where = ""
+            params = []
+            if site_code:
+                cursor.execute(
+                    "SELECT site_id FROM sites WHERE site_code = ?", (site_code,)
+                )
+                site = cursor.fetchone()
+                if not site:
+                    raise HTTPException(
+                        status_code=404, detail=f"站点 {site_code} 不存在"
+                    )
+                where = "WHERE site_id = ?"
+                params.append(site["site_id"])
+
+            # 旧版本数据库的fetch_logs表没有统计列，使用SELECT *按实际存在的列读取
+            cursor.execute(
+                f"""
+            SELECT s.site_code, s.site_name, l.*
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY site_id ORDER BY log_id DESC
+                ) AS run_index
+                FROM fetch_logs {where}
+            ) l
+            JOIN sites s ON l.site_id = s.site_id
+            WHERE l.run_index <= ?
+            ORDER BY s.site_id, l.log_id
+            """,
+                params + [limit],
+            )
+            rows = cursor.fetchall()
+
+        sites = {}
+        for row in rows:
+            run = dict(row)
+            del run["run_index"]
+            if run.get("row_counts"):
+                run["row_counts"] = json.loads(run["row_counts"])
+            site_runs = sites.setdefault(
+                run["site_code"], {"site_name": run["site_name"], "runs": []}
+            )
+            site_runs["runs"].append(run)
+
+        return {
+            "limit": limit,
+            "sites": [
+                {
+                    "site_code": code,
+                    "site_name": info["site_name"],
+                    **summarize_fetch_runs(info["runs"]),
+                }
+                for code, info in sites.items()
+            ],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取抓取日志统计失败: {str(e)}")
+
+
+@app.get("/metrics", summary="Prometheus格式的监控指标")
+def get_metrics():
+    """
+    输出API的请求耗时和SQLite语句耗时，以及抓取程序写入指标文件的各站点抓取指标
+    """
+    # 抓取指标只从抓取程序写入的文件中读取
+    content = metrics.REGISTRY.render(exclude_prefix=metrics.CRAWL_METRICS_PREFIX)
+    try:
+        with open(metrics.crawl_metrics_path(), "r", encoding="utf-8") as f:
+            content += f.read()
+    except OSError:
+        pass  # 抓取程序尚未运行过
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
 
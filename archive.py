@@ -0,0 +1,340 @@
+import errno
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+# 热数据库保留的天数，更早的快照按月归档到单独的数据库文件
+ARCHIVE_KEEP_DAYS = int(os.environ.get("BOOKLIST_ARCHIVE_KEEP_DAYS", "90"))
+# 一个连接同时附加的归档文件数，SQLite默认最多附加10个数据库
+ARCHIVE_MAX_ATTACHED = 8
+
+# 归档文件中rankings表的列，与热数据库一致，ranking_id保持不变
+ARCHIVE_COLUMNS = (
+    "ranking_id",
+    "site_id",
+    "ranking_type_id",
+    "fetch_date",
+    "rank",
+    "book_ref",
+    "indicator_value",
+    "indicator_num",
+    "indicator_unit",
+    "extra_data",
+    "created_at",
+)
+
+# extra_data中常用于筛选的字段，以虚拟生成列的形式加到rankings表中(热数据库和归档文件相同)，
+# 只在有值的行上建立部分索引；空字符串视为没有值。按值相等筛选的索引以
+# (fetch_date, ranking_type_id, rank) 结尾，导出时按索引顺序输出，不需要排序
+# (列名, 类型, 生成表达式, 索引列)
+EXTRA_COLUMNS = (
+    (
+        "special_mark",
+        "TEXT",
+        "NULLIF(json_extract(extra_data, '$.special_mark'), '')",
+        "special_mark, fetch_date, ranking_type_id, rank",
+    ),
+    (
+        "update_rate",
+        "TEXT",
+        "NULLIF(json_extract(extra_data, '$.update_rate'), '')",
+        "update_rate, fetch_date, ranking_type_id, rank",
+    ),
+    (
+        "rank_score",
+        "REAL",
+        "CAST(NULLIF(json_extract(extra_data, '$.rank_score'), '') AS REAL)",
+        "rank_score",
+    ),
+)
+
+# 归档文件的表结构版本，热数据库的meta表中记录已升级到的版本
+ARCHIVE_SCHEMA_VERSION = 3
+
+
+def archive_dir(db_path):
+    """归档文件所在目录，默认为数据库文件旁的archive目录"""
+    return os.environ.get("BOOKLIST_ARCHIVE_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), "archive"
+    )
+
+
+def archive_file_name(month):
+    return f"rankings-{month}.db"
+
+
+def schema_name(month):
+    """归档文件附加到连接时使用的数据库名，如archive_2024_01"""
+    return "archive_" + month.replace("-", "_")
+
+
+def month_range(month):
+    """返回月份的第一天和下个月的第一天，如 "2024-01" -> ("2024-01-01", "2024-02-01")"""
+    first = datetime.strptime(month, "%Y-%m").date()
+    following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first.isoformat(), following.isoformat()
+
+
+def create_partitions_table(conn):
+    """创建记录已归档月份的archive_partitions表，可重复执行"""
+    conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS archive_partitions (
+        month TEXT PRIMARY KEY,
+        file_name TEXT NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        row_count INTEGER NOT NULL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+    )
+
+
+def ensure_index(conn, schema, name, columns, where=""):
+    """创建rankings表上的索引，同名索引的列与columns不同时(旧版本的定义)先删除再创建"""
+    existing = [row[2] for row in conn.execute(f"PRAGMA {schema}.index_info({name})")]
+    if existing and existing != [column.strip() for column in columns.split(",")]:
+        conn.execute(f"DROP INDEX {schema}.{name}")
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {schema}.{name} ON rankings ({columns}) {where}"
+    )
+
+
+def create_snapshot_indexes(conn, schema="main"):
+    """
+    导出接口按 (fetch_date, ranking_type_id, rank) 顺序输出，
+    按站点筛选和不按站点筛选时分别由这两个索引直接给出该顺序，按榜单类型筛选时使用唯一索引
+    """
+    ensure_index(
+        conn,
+        schema,
+        "idx_rankings_site_date",
+        "site_id, fetch_date, ranking_type_id, rank",
+    )
+    ensure_index(conn, schema, "idx_rankings_date", "fetch_date, ranking_type_id, rank")
+
+
+def create_extra_columns(conn, schema="main"):
+    """为rankings表添加EXTRA_COLUMNS中的生成列和部分索引，可重复执行"""
+    existing = {
+        row[1] for row in conn.execute(f"PRAGMA {schema}.table_xinfo(rankings)")
+    }
+    for column, column_type, expression, index_columns in EXTRA_COLUMNS:
+        if column not in existing:
+            conn.execute(
+                f"ALTER TABLE {schema}.rankings ADD COLUMN {column} {column_type} "
+                f"GENERATED ALWAYS AS ({expression}) VIRTUAL"
+            )
+        ensure_index(
+            conn,
+            schema,
+            f"idx_rankings_{column}",
+            index_columns,
+            f"WHERE {column} IS NOT NULL",
+        )
+
+
+def create_archive_tables(conn, schema):
+    """
+    在附加的归档文件中创建rankings表和查询所需的索引
+    归档文件不包含books等表，book_ref引用热数据库的books表，因此不声明外键
+    """
+    conn.execute(
+        f"""
+    CREATE TABLE IF NOT EXISTS {schema}.rankings (
+        ranking_id INTEGER PRIMARY KEY,
+        site_id INTEGER NOT NULL,
+        ranking_type_id INTEGER NOT NULL,
+        fetch_date DATE NOT NULL,
+        rank INTEGER NOT NULL,
+        book_ref INTEGER NOT NULL,
+        indicator_value TEXT,
+        indicator_num NUMERIC,
+        indicator_unit TEXT,
+        extra_data TEXT,
+        created_at TIMESTAMP
+    )
+    """
+    )
+    conn.execute(
+        f"""
+    CREATE UNIQUE INDEX IF NOT EXISTS {schema}.uq_rankings_type_date_rank
+    ON rankings (ranking_type_id, fetch_date, rank)
+    """
+    )
+    create_snapshot_indexes(conn, schema)
+    conn.execute(
+        f"""
+    CREATE INDEX IF NOT EXISTS {schema}.idx_rankings_book_history
+    ON rankings (book_ref, fetch_date, ranking_type_id, rank, indicator_value, indicator_num)
+    """
+    )
+    conn.execute(
+        f"""
+    CREATE INDEX IF NOT EXISTS {schema}.idx_rankings_indicator
+    ON rankings (indicator_unit, fetch_date, indicator_num)
+    """
+    )
+    create_extra_columns(conn, schema)
+
+
+def months_to_archive(conn, keep_days, today=None):
+    """
+    返回需要归档的月份：整月都早于保留窗口的月份
+    窗口起点所在的月份仍有部分数据在窗口内，整月保留在热数据库中
+    """
+    cutoff = (today or date.today()) - timedelta(days=keep_days)
+    rows = conn.execute(
+        "SELECT DISTINCT substr(fetch_date, 1, 7) FROM rankings WHERE fetch_date < ? ORDER BY 1",
+        (cutoff.replace(day=1).isoformat(),),
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def archive_month(conn, db_path, month):
+    """
+    将一个月的快照从热数据库移动到归档文件，返回移动的条数
+    先提交归档文件的写入，再在热数据库中删除并登记分区；两步之间中断时数据同时存在于两处，
+    分区尚未登记，查询仍读取热数据库，重新执行会覆盖归档文件中的同一批数据
+    """
+    directory = archive_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    file_name = archive_file_name(month)
+    schema = schema_name(month)
+    start, end = month_range(month)
+    columns = ", ".join(ARCHIVE_COLUMNS)
+
+    conn.commit()
+    conn.execute(
+        "ATTACH DATABASE ? AS " + schema, (os.path.join(directory, file_name),)
+    )
+    try:
+        with conn:
+            create_archive_tables(conn, schema)
+            # 旧数据库没有唯一索引时可能有重复数据，按写入顺序覆盖，保留最后一条
+            conn.execute(
+                f"""
+            INSERT OR REPLACE INTO {schema}.rankings ({columns})
+            SELECT {columns} FROM main.rankings
+            WHERE fetch_date >= ? AND fetch_date < ?
+            ORDER BY ranking_id
+            """,
+                (start, end),
+            )
+
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM main.rankings WHERE fetch_date >= ? AND fetch_date < ?",
+                (start, end),
+            )
+            moved = cursor.rowcount
+            conn.execute(
+                f"""
+            INSERT OR REPLACE INTO main.archive_partitions
+            (month, file_name, start_date, end_date, row_count, archived_at)
+            SELECT ?, ?, MIN(fetch_date), MAX(fetch_date), COUNT(*), CURRENT_TIMESTAMP
+            FROM {schema}.rankings
+            """,
+                (month, file_name),
+            )
+    finally:
+        conn.execute("DETACH DATABASE " + schema)
+    return moved
+
+
+def upgrade_partitions(conn, db_path):
+    """为旧版本创建的归档文件补充新的列和索引，API以只读方式附加归档文件，由抓取程序完成升级"""
+    directory = archive_dir(db_path)
+    for month, file_name in list_partitions(conn):
+        path = os.path.join(directory, file_name)
+        if not os.path.exists(path):
+            continue
+        schema = schema_name(month)
+        conn.commit()
+        conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+        try:
+            with conn:
+                create_archive_tables(conn, schema)
+        finally:
+            conn.execute("DETACH DATABASE " + schema)
+
+
+def find_partition(conn, fetch_date):
+    """查询日期所在的归档分区，没有归档或旧版本数据库没有分区表时返回None"""
+    if not fetch_date:
+        return None
+    try:
+        return conn.execute(
+            "SELECT month, file_name FROM archive_partitions WHERE month = ?",
+            (fetch_date[:7],),
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+
+def attach_partition(conn, month, file_name, keep=()):
+    """
+    将归档文件附加到连接上并返回其rankings表名，已附加时直接返回
+    附加的文件达到ARCHIVE_MAX_ATTACHED个时先分离较早附加的归档文件，keep中的表不分离
+    """
+    schema = schema_name(month)
+    databases = {row[1]: row[2] for row in conn.execute("PRAGMA database_list")}
+    if schema not in databases:
+        kept = {table.split(".")[0] for table in keep if "." in table}
+        attached = [
+            name
+            for name in databases
+            if name.startswith("archive_") and name not in kept
+        ]
+        excess = len(attached) + len(kept) - ARCHIVE_MAX_ATTACHED + 1
+        for name in attached[: max(0, excess)]:
+            conn.execute("DETACH DATABASE " + name)
+        path = os.path.join(archive_dir(databases["main"]), file_name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(errno.ENOENT, "归档文件不存在", path)
+        conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+    return f"{schema}.rankings"
+
+
+def rankings_table(conn, fetch_date, keep=()):
+    """返回保存指定日期快照的rankings表名，日期已归档时附加对应的归档文件"""
+    partition = find_partition(conn, fetch_date)
+    if partition is None:
+        return "rankings"
+    return attach_partition(conn, partition[0], partition[1], keep)
+
+
+def list_partitions(conn, start_date=None, end_date=None):
+    """按月份顺序返回与日期范围有交集的归档分区 (month, file_name)"""
+    try:
+        return conn.execute(
+            """
+        SELECT month, file_name FROM archive_partitions
+        WHERE end_date >= COALESCE(?, end_date) AND start_date <= COALESCE(?, start_date)
+        ORDER BY month
+        """,
+            (start_date, end_date),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+
+
+def missing_partitions(conn, start_date=None, end_date=None):
+    """返回日期范围内已登记但文件不存在的归档文件名，用于在流式读取之前发现缺失的归档"""
+    directory = archive_dir(conn.execute("PRAGMA database_list").fetchone()[2])
+    return [
+        file_name
+        for _, file_name in list_partitions(conn, start_date, end_date)
+        if not os.path.exists(os.path.join(directory, file_name))
+    ]
+
+
+def iter_rankings_tables(conn, start_date=None, end_date=None):
+    """
+    按时间顺序依次返回与日期范围有交集的归档rankings表，最后返回热数据库的rankings表
+    归档文件在迭代到时才附加，调用方应读取完一张表的数据后再继续迭代
+    """
+    for month, file_name in list_partitions(conn, start_date, end_date):
+        yield attach_partition(conn, month, file_name)
+    yield "rankings"
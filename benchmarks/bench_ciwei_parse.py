@@ -0,0 +1,94 @@
+"""
+刺猬猫首页榜单解析基准测试
+对比重构前(每个榜单各自扫描文档)和重构后(预编译XPath、一次遍历)的单页解析耗时
+
+用法: python benchmarks/bench_ciwei_parse.py [--rounds 200] [--filler 300]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ciwei  # noqa: E402
+import ciwei_legacy  # noqa: E402
+from fixtures import build_ciweimao_page  # noqa: E402
+
+
+def extract_legacy(html_tree):
+    return {
+        "weekly_clicks": ciwei_legacy.parse_weekly_clicks(html_tree),
+        "monthly_votes": ciwei_legacy.parse_monthly_votes(html_tree),
+        "new_books": ciwei_legacy.parse_new_books(html_tree),
+    }
+
+
+def extract_current(html_tree):
+    return ciwei.parse_rankings(html_tree)
+
+
+def parse_legacy(html_content):
+    return extract_legacy(etree.HTML(html_content))
+
+
+def parse_current(html_content):
+    return extract_current(etree.HTML(html_content))
+
+
+def measure(func, arg, rounds):
+    """返回单次调用的平均耗时(毫秒)"""
+    func(arg)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(arg)
+    return (time.perf_counter() - start) * 1000 / rounds
+
+
+def report(label, legacy_ms, current_ms):
+    print(
+        f"{label}: 重构前 {legacy_ms:.3f} ms/页, 重构后 {current_ms:.3f} ms/页, "
+        f"加速比 {legacy_ms / current_ms:.2f}x"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="刺猬猫榜单解析基准测试")
+    parser.add_argument("--rounds", type=int, default=200, help="每种实现的解析次数")
+    parser.add_argument("--filler", type=int, default=300, help="页面中无关区块的数量")
+    args = parser.parse_args(argv)
+
+    html_content = build_ciweimao_page(args.filler)
+
+    # 两种实现的解析结果必须一致
+    legacy_result = parse_legacy(html_content)
+    current_result = parse_current(html_content)
+    if legacy_result != current_result:
+        print("解析结果不一致")
+        return 1
+
+    print(f"页面大小: {len(html_content.encode('utf-8')) / 1024:.1f} KB")
+    print(f"条目数: {sum(len(items) for items in current_result.values())}")
+
+    # 含etree.HTML构建文档树的完整耗时
+    report(
+        "完整解析",
+        measure(parse_legacy, html_content, args.rounds),
+        measure(parse_current, html_content, args.rounds),
+    )
+
+    # 只比较在已构建的文档树上提取榜单的耗时
+    html_tree = etree.HTML(html_content)
+    report(
+        "提取榜单",
+        measure(extract_legacy, html_tree, args.rounds),
+        measure(extract_current, html_tree, args.rounds),
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+重构前的刺猬猫榜单解析实现，仅供基准测试对比解析耗时和结果
+每个榜单各自扫描整个文档，每个条目执行多次XPath字符串求值
+"""
+
+
+def parse_weekly_clicks(html_tree):
+    """
+    解析周点击榜数据
+    """
+    weekly_clicks_list = []
+
+    # 获取周点击榜的容器
+    try:
+        # 找到包含"周点击榜"的标题框
+        title_box = html_tree.xpath(
+            '//div[@class="title-box icon-book"]/h3[contains(text(), "周点击榜")]/parent::div'
+        )[0]
+        # 从title_box的父元素获取ul列表
+        weekly_clicks_ul = title_box.xpath("../ul")[0]
+
+        # 解析排名第一的数据
+        top1_item = weekly_clicks_ul.xpath('./li[@class="top1"]')[0]
+        top1_data = {
+            "rank": 1,
+            "title": top1_item.xpath(".//h3/a/text()")[0].strip(),
+            "url": top1_item.xpath(".//h3/a/@href")[0],
+            "author": top1_item.xpath('.//p[@class="author"]/a/text()')[0],
+            "author_url": top1_item.xpath('.//p[@class="author"]/a/@href')[0],
+            "clicks": top1_item.xpath('.//p[@class="num"]/span/text()')[0],
+            "cover_img": top1_item.xpath('.//a[@class="img"]/img/@data-original')[0],
+        }
+        weekly_clicks_list.append(top1_data)
+
+        # 解析排名2-10的数据
+        other_items = weekly_clicks_ul.xpath('./li[not(@class="top1")]')
+        for item in other_items:
+            rank_text = item.xpath('./a/i[@class="icon-top"]/text()')[0]
+            rank = int(rank_text)
+
+            # 提取分类，位于 [分类] 中
+            category_match = item.xpath("./a/b/text()")
+            category = category_match[0].strip("[]") if category_match else ""
+
+            # 提取标题
+            full_text = item.xpath("./a/text()")
+            title_parts = [t.strip() for t in full_text if t.strip()]
+            title = title_parts[-1] if title_parts else ""
+
+            # 提取点击数
+            clicks = item.xpath('./a/span[@class="num"]/text()')[0]
+
+            item_data = {
+                "rank": rank,
+                "title": title,
+                "url": item.xpath("./a/@href")[0],
+                "category": category,
+                "clicks": clicks,
+            }
+            weekly_clicks_list.append(item_data)
+    except Exception as e:
+        print(f"解析周点击榜数据异常: {e}")
+        import traceback
+
+        print(traceback.format_exc())
+
+    return weekly_clicks_list
+
+
+def parse_monthly_votes(html_tree):
+    """
+    解析月票榜数据
+    """
+    monthly_votes_list = []
+
+    # 获取月票榜的容器
+    try:
+        # 找到包含"月票榜"的标题框
+        title_box = html_tree.xpath(
+            '//div[@class="title-box icon-book"]/h3[contains(text(), "月票榜")]/parent::div'
+        )[0]
+        # 从title_box的父元素获取ul列表
+        monthly_votes_ul = title_box.xpath("../ul")[0]
+
+        # 解析排名第一的数据
+        top1_item = monthly_votes_ul.xpath('./li[@class="top1"]')[0]
+        top1_data = {
+            "rank": 1,
+            "title": top1_item.xpath(".//h3/a/text()")[0].strip(),
+            "url": top1_item.xpath(".//h3/a/@href")[0],
+            "author": top1_item.xpath('.//p[@class="author"]/a/text()')[0],
+            "author_url": top1_item.xpath('.//p[@class="author"]/a/@href')[0],
+            "votes": top1_item.xpath('.//p[@class="num"]/span/text()')[0],
+            "cover_img": top1_item.xpath('.//a[@class="img"]/img/@data-original')[0],
+        }
+        monthly_votes_list.append(top1_data)
+
+        # 解析排名2-10的数据
+        other_items = monthly_votes_ul.xpath('./li[not(@class="top1")]')
+        for item in other_items:
+            rank_text = item.xpath('./a/i[@class="icon-top"]/text()')[0]
+            rank = int(rank_text)
+
+            # 提取分类，位于 [分类] 中
+            category_match = item.xpath("./a/b/text()")
+            category = category_match[0].strip("[]") if category_match else ""
+
+            # 提取标题
+            full_text = item.xpath("./a/text()")
+            title_parts = [t.strip() for t in full_text if t.strip()]
+            title = title_parts[-1] if title_parts else ""
+
+            # 提取月票数
+            votes = item.xpath('./a/span[@class="num"]/text()')[0]
+
+            item_data = {
+                "rank": rank,
+                "title": title,
+                "url": item.xpath("./a/@href")[0],
+                "category": category,
+                "votes": votes,
+            }
+            monthly_votes_list.append(item_data)
+    except Exception as e:
+        print(f"解析月票榜数据异常: {e}")
+        import traceback
+
+        print(traceback.format_exc())
+
+    return monthly_votes_list
+
+
+def parse_new_books(html_tree):
+    """
+    解析新书榜数据
+    """
+    new_books_list = []
+
+    # 获取新书榜的容器
+    try:
+        # 找到包含"新书榜"的标题框
+        title_box = html_tree.xpath(
+            '//div[@class="title-box icon-cat"]/h3[contains(text(), "新书榜")]/parent::div'
+        )[0]
+        # 从title_box的父元素获取ul列表
+        new_books_ul = title_box.xpath("../ul")[0]
+
+        # 新书榜的li元素
+        items = new_books_ul.xpath("./li")
+
+        for i, item in enumerate(items, 1):
+            book_data = {
+                "rank": i,
+                "title": item.xpath('.//h3[@class="tit"]/a/text()')[0].strip(),
+                "url": item.xpath('.//h3[@class="tit"]/a/@href')[0],
+                "author": item.xpath('.//p[@class="author"]/a/text()')[0],
+                "author_url": item.xpath('.//p[@class="author"]/a/@href')[0],
+                "latest_chapter": item.xpath('.//p[@class="desc"]/text()')[0],
+                "cover_img": item.xpath('.//a[@class="img"]/img/@data-original')[0],
+            }
+
+            # 更新频率信息可能不存在于所有项目中
+            update_rate = item.xpath('.//p[@class="tips"]/text()')
+            if update_rate:
+                book_data["update_rate"] = update_rate[0]
+
+            new_books_list.append(book_data)
+    except Exception as e:
+        print(f"解析新书榜数据异常: {e}")
+        import traceback
+
+        print(traceback.format_exc())
+
+    return new_books_list
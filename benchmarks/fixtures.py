@@ -0,0 +1,221 @@
+"""
+基准测试使用的页面和API数据样本
+
+fixtures/目录中保存刺猬猫首页、起点首页和番茄小说榜单API的样本，基准测试只从磁盘读取，不访问网络。
+默认样本由本模块按真实页面结构合成，也可以录制真实页面替换：
+
+    python benchmarks/fixtures.py            # 重新生成合成样本
+    python benchmarks/fixtures.py --record   # 从各网站录制真实样本(需要网络和cookie.json)
+"""
+
+import argparse
+import json
+import os
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+FIXTURE_FILES = {
+    "ciweimao": "ciweimao.html",
+    "qidian": "qidian.html",
+    "fanqie": "fanqie.json",
+}
+
+
+def fixture_path(site_code):
+    return os.path.join(FIXTURE_DIR, FIXTURE_FILES[site_code])
+
+
+def load_fixture(site_code):
+    """读取样本内容，返回字符串"""
+    with open(fixture_path(site_code), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _filler_blocks(prefix, count):
+    """页面中与榜单无关的区块，用于模拟真实页面大小"""
+    blocks = []
+    for i in range(count):
+        links = "".join(
+            f'<li><a href="/{prefix}/{i}/{j}">{prefix}链接{j}</a></li>'
+            for j in range(10)
+        )
+        blocks.append(
+            f'<div class="title-box icon-news"><h3>公告{i}</h3></div><ul>{links}</ul>'
+        )
+    return blocks
+
+
+def _ciweimao_top1(name, count):
+    return f"""
+<li class="top1">
+  <a class="img" href="https://www.ciweimao.com/book/100{name}"><img data-original="https://img.example.com/{name}.jpg"></a>
+  <h3><a href="https://www.ciweimao.com/book/100{name}"> 测试书籍{name} </a></h3>
+  <p class="author"><a href="https://www.ciweimao.com/reader/{name}">作者{name}</a></p>
+  <p class="num"><span>{count}</span></p>
+</li>"""
+
+
+def _ciweimao_row(name, rank, count):
+    return f"""
+<li><a href="https://www.ciweimao.com/book/{rank}{name}"><i class="icon-top">{rank}</i><b>[分类{rank}]</b> 测试书籍{name}{rank} <span class="num">{count}</span></a></li>"""
+
+
+def _ciweimao_new_book(rank):
+    return f"""
+<li>
+  <a class="img" href="https://www.ciweimao.com/book/200{rank}"><img data-original="https://img.example.com/n{rank}.jpg"></a>
+  <h3 class="tit"><a href="https://www.ciweimao.com/book/200{rank}"> 新书{rank} </a></h3>
+  <p class="author"><a href="https://www.ciweimao.com/reader/n{rank}">新作者{rank}</a></p>
+  <p class="desc">第{rank}章 最新章节</p>
+  {'<p class="tips">日更4000字</p>' if rank % 2 else ''}
+</li>"""
+
+
+def _ciweimao_block(box_class, title, items):
+    return f"""
+<div class="book-rank">
+  <div class="{box_class}"><h3>{title}</h3></div>
+  <ul>{''.join(items)}</ul>
+</div>"""
+
+
+def build_ciweimao_page(filler=300):
+    """生成与刺猬猫首页结构相同的页面，包含周点击榜、月票榜和新书榜"""
+    blocks = _filler_blocks("n", filler)
+    blocks.append(
+        _ciweimao_block(
+            "title-box icon-book",
+            "周点击榜",
+            [_ciweimao_top1("w", "12.3万")]
+            + [_ciweimao_row("w", rank, f"{rank}万") for rank in range(2, 11)],
+        )
+    )
+    blocks.append(
+        _ciweimao_block(
+            "title-box icon-book",
+            "月票榜",
+            [_ciweimao_top1("m", "8888")]
+            + [_ciweimao_row("m", rank, str(1000 - rank)) for rank in range(2, 11)],
+        )
+    )
+    blocks.append(
+        _ciweimao_block(
+            "title-box icon-cat",
+            "新书榜",
+            [_ciweimao_new_book(rank) for rank in range(1, 11)],
+        )
+    )
+    return f"<html><body>{''.join(blocks)}</body></html>"
+
+
+def _qidian_unfold(index):
+    return f"""
+<li class="unfold" data-rid="1"><div class="book-wrap cf">
+  <div class="book-info fl"><h3>NO.1</h3>
+    <h2><a href="//book.qidian.com/info/10{index}" data-bid="10{index}">榜首书籍{index}</a></h2>
+    <p class="digital"><em>{1000 + index}</em>月票</p>
+    <p class="author"><a class="type" href="//www.qidian.com/xuanhuan/">玄幻</a><i>·</i><a class="writer" href="//my.qidian.com/author/{index}/">作者{index}</a></p>
+  </div>
+  <div class="book-cover"><a class="link" href="//book.qidian.com/info/10{index}"><img src="//bookcover.yuewen.com/qdbimg/{index}/150" alt="榜首书籍{index}"></a></div>
+</div></li>"""
+
+
+def _qidian_row(index, rank):
+    return f"""
+<li data-rid="{rank}"><div class="num-box"><span class="num{rank}">{rank}</span></div>
+  <div class="name-box"><a class="name" href="//book.qidian.com/info/{index}0{rank}" data-bid="{index}0{rank}">书籍{index}-{rank}</a><i class="total">{900 - rank}</i></div>
+</li>"""
+
+
+def build_qidian_page(rank_count=10, filler=600):
+    """生成与起点首页结构相同的页面，#rank-list-row中包含rank_count个榜单"""
+    parts = ["<html><head><title>起点中文网</title></head><body>"]
+    parts += _filler_blocks("a", filler // 2)
+    parts.append('<div id="rank-list-row" class="rank-list-row cf">')
+    for index in range(rank_count):
+        parts.append(
+            f'<div class="rank-list" data-l2="{index + 1}">'
+            f'<h3 class="wrap-title lang"><a href="//www.qidian.com/rank/{index}/">榜单<span>{index}</span></a>'
+            f'<a class="more" href="//www.qidian.com/rank/{index}/">更多</a></h3>'
+            '<div class="book-list"><ul>'
+        )
+        parts.append(_qidian_unfold(index))
+        parts += [_qidian_row(index, rank) for rank in range(2, 11)]
+        parts.append("</ul></div></div>")
+    parts.append("</div>")
+    parts += _filler_blocks("b", filler - filler // 2)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def build_fanqie_payload(count=200):
+    """生成番茄小说榜单API单页响应"""
+    book_list = [
+        {
+            "author": f"作者{i}",
+            "book_id": str(7296152639836785675 + i),
+            "book_name": f"番茄书籍{i}",
+            "category": "宫斗宅斗",
+            "creation_status": i % 2,
+            "rank_score": "",
+            "thumb_url": f"https://p3-reading-sign.fqnovelpic.com/novel-pic/{i}.image",
+        }
+        for i in range(count)
+    ]
+    return json.dumps(
+        {"code": 0, "message": "success", "data": {"book_list": book_list}},
+        ensure_ascii=False,
+    )
+
+
+def build_fixtures():
+    """生成所有合成样本"""
+    return {
+        "ciweimao": build_ciweimao_page(),
+        "qidian": build_qidian_page(),
+        "fanqie": build_fanqie_payload(),
+    }
+
+
+def record_fixtures():
+    """从各网站录制真实样本"""
+    import http_client
+    import qidian
+
+    from booklist_db import FanqieAdapter
+
+    ciweimao_response = http_client.get("https://www.ciweimao.com/")
+    ciweimao_response.encoding = "utf-8"
+    qidian_response = http_client.get(qidian.QIDIAN_URL, headers=qidian.get_headers())
+    qidian_response.encoding = "utf-8"
+    fanqie_response = http_client.get(
+        "https://fanqienovel.com/api/author/misc/top_book_list/v1/?limit=200&offset=0",
+        headers=FanqieAdapter.headers,
+    )
+    fanqie_response.encoding = "utf-8"
+    return {
+        "ciweimao": ciweimao_response.text,
+        "qidian": qidian_response.text,
+        "fanqie": fanqie_response.text,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成或录制基准测试样本")
+    parser.add_argument("--record", action="store_true", help="从各网站录制真实样本")
+    args = parser.parse_args(argv)
+
+    fixtures = record_fixtures() if args.record else build_fixtures()
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for site_code, content in fixtures.items():
+        with open(fixture_path(site_code), "w", encoding="utf-8") as f:
+            f.write(content)
+        print(f"已写入 {fixture_path(site_code)} ({len(content.encode('utf-8'))} 字节)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+API压力测试
+
+生成指定规模的合成数据库，然后以指定并发数请求榜单接口，报告各接口的延迟分位数和吞吐量。
+
+用法:
+    # 生成数据库: 3个站点、200个榜单、5年每日快照、每个榜单10本书
+    python benchmarks/loadtest.py seed loadtest.db --ranking-types 200 --days 1825
+
+    # 启动API服务(使用生成的数据库)并依次以1、8、32并发各压测20秒
+    python benchmarks/loadtest.py run --serve loadtest.db --concurrency 1,8,32 --duration 20
+
+    # 压测已经运行的API服务
+    python benchmarks/loadtest.py run --url http://127.0.0.1:8000 --concurrency 16
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, PROJECT_DIR)
+
+import booklist_db  # noqa: E402
+
+CATEGORIES = ("玄幻", "都市", "仙侠", "历史", "科幻", "游戏", "悬疑", "轻小说")
+
+
+def seed_database(
+    path,
+    ranking_types=200,
+    days=1825,
+    books_per_ranking=10,
+    books_per_site=5000,
+    end_date=None,
+    seed=0,
+):
+    """
+    生成合成数据库
+    ranking_types个榜单平均分配到预置站点，每个榜单从end_date往前每天一个快照，
+    每个快照从所在站点的书库中随机抽取books_per_ranking本书
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f"数据库文件已存在: {path}")
+
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    db = booklist_db.BooklistDatabase(path)
+    try:
+        sites = [row[0] for row in db.get_active_sites()]
+
+        type_ids = []
+        for i in range(ranking_types):
+            site_id = sites[i % len(sites)]
+            type_code = f"bench_{i}"
+            db.add_or_update_ranking_type(
+                site_id, f"测试榜单{i}", type_code, "", f"压力测试榜单{i}"
+            )
+            type_ids.append((site_id, db.get_ranking_type_id(site_id, type_code)))
+
+        library = {
+            site_id: [
+                {
+                    "book_id": f"{site_id}{n:07d}",
+                    "title": f"测试书籍{site_id}-{n}",
+                    "author": f"作者{n % 997}",
+                    "category": CATEGORIES[n % len(CATEGORIES)],
+                    "book_url": f"https://fanqienovel.com/page/{site_id}{n:07d}",
+                    # 与番茄小说封面地址长度相近
+                    "cover_url": "https://p3-reading-sign.fqnovelpic.com/novel-pic/"
+                    f"{site_id}{n:07d}{'0' * 200}~tplv-resize:225:300.image",
+                }
+                for n in range(books_per_site)
+            ]
+            for site_id in sites
+        }
+
+        # 先删除rankings的索引，批量写入后再重建
+        db.cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'rankings' AND sql IS NOT NULL"
+        )
+        indexes = db.cursor.fetchall()
+        for name, _ in indexes:
+            db.cursor.execute(f"DROP INDEX {name}")
+        db.conn.execute("PRAGMA synchronous = OFF")
+
+        def rows():
+            for offset in range(days - 1, -1, -1):
+                fetch_date = (end_date - timedelta(days=offset)).isoformat()
+                for site_id, ranking_type_id in type_ids:
+                    books = rng.sample(library[site_id], books_per_ranking)
+                    for rank, book in enumerate(books, 1):
+                        yield db.build_ranking_row(
+                            site_id,
+                            ranking_type_id,
+                            fetch_date,
+                            dict(
+                                book,
+                                rank=rank,
+                                indicator_value=f"{rng.randint(1, 9999) / 10:.1f}万",
+                            ),
+                        )
+
+        start = time.perf_counter()
+        with db.conn:
+            db.cursor.executemany(booklist_db.INSERT_RANKING_SQL, rows())
+        row_count = days * ranking_types * books_per_ranking
+        print(f"写入 {row_count} 条记录，耗时 {time.perf_counter() - start:.1f} 秒")
+
+        start = time.perf_counter()
+        for _, sql in indexes:
+            db.cursor.execute(sql)
+        db.rebuild_latest_snapshot()
+        db.bump_generation()
+        db.conn.commit()
+        db.cursor.execute("ANALYZE")
+        print(f"重建索引，耗时 {time.perf_counter() - start:.1f} 秒")
+    finally:
+        db.close()
+
+
+class Endpoint:
+    """被压测的接口，paths为可以请求的路径列表"""
+
+    def __init__(self, name, paths):
+        self.name = name
+        self.paths = paths
+        self.latencies = []
+        self.errors = 0
+
+
+def build_endpoints(db_path):
+    """
+    根据数据库中的站点和榜单生成请求路径
+    返回 (接口列表, 历史日期范围)，数据库为空时日期范围为None
+    """
+    db = booklist_db.BooklistDatabase(db_path)
+    try:
+        db.cursor.execute("SELECT site_code FROM sites WHERE active = 1")
+        site_codes = [row[0] for row in db.cursor.fetchall()]
+        db.cursor.execute(
+            """
+        SELECT s.site_code, rt.type_code
+        FROM ranking_types rt JOIN sites s ON rt.site_id = s.site_id
+        WHERE rt.active = 1
+        """
+        )
+        types = db.cursor.fetchall()
+        db.cursor.execute("SELECT MIN(fetch_date), MAX(fetch_date) FROM rankings")
+        first_date, last_date = db.cursor.fetchone()
+    finally:
+        db.close()
+
+    endpoints = [
+        Endpoint("/api/rankings", ["/api/rankings"]),
+        Endpoint(
+            "/api/rankings/{site_code}",
+            [f"/api/rankings/{code}" for code in site_codes],
+        ),
+        Endpoint(
+            "/api/rankings/{site_code}/{ranking_type}",
+            [f"/api/rankings/{site}/{code}" for site, code in types],
+        ),
+    ]
+    if not first_date:
+        return endpoints, None
+    return endpoints, (date.fromisoformat(first_date), date.fromisoformat(last_date))
+
+
+def worker(base_url, endpoints, weights, history, deadline, lock, seed):
+    """
+    在一个保持连接的HTTP连接上循环请求，直到deadline
+    history为 (历史日期范围, 比例)，按比例请求范围内的随机日期，这些请求基本不会命中响应缓存
+    """
+    parts = urlsplit(base_url)
+    rng = random.Random(seed)
+    date_range, history_ratio = history
+    span = (date_range[1] - date_range[0]).days if date_range else 0
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    results = []
+    try:
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            path = rng.choice(endpoint.paths)
+            if date_range and rng.random() < history_ratio:
+                fetch_date = date_range[0] + timedelta(days=rng.randint(0, span))
+                path = f"{path}?{urlencode({'date': fetch_date.isoformat()})}"
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                ok = False
+            results.append((endpoint, ok, time.perf_counter() - start))
+    finally:
+        conn.close()
+    with lock:
+        for endpoint, ok, elapsed in results:
+            if ok:
+                endpoint.latencies.append(elapsed)
+            else:
+                endpoint.errors += 1
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(
+    base_url,
+    endpoints,
+    concurrency,
+    duration,
+    weights=None,
+    history=(None, 0.0),
+    seed=0,
+):
+    """以指定并发数压测duration秒，返回各接口的统计结果"""
+    for endpoint in endpoints:
+        endpoint.latencies = []
+        endpoint.errors = 0
+    weights = weights or [1] * len(endpoints)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(base_url, endpoints, weights, history, deadline, lock, seed + i),
+        )
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = []
+    for endpoint in endpoints:
+        latencies = sorted(endpoint.latencies)
+        stats.append(
+            {
+                "endpoint": endpoint.name,
+                "requests": len(latencies),
+                "errors": endpoint.errors,
+                "rps": len(latencies) / elapsed,
+                "p50": percentile(latencies, 50) * 1000,
+                "p90": percentile(latencies, 90) * 1000,
+                "p95": percentile(latencies, 95) * 1000,
+                "p99": percentile(latencies, 99) * 1000,
+                "max": latencies[-1] * 1000 if latencies else 0.0,
+            }
+        )
+    return stats
+
+
+def print_stats(concurrency, stats):
+    total = sum(s["rps"] for s in stats)
+    print(f"\n并发数 {concurrency}，总吞吐量 {total:.1f} 请求/秒")
+    print(
+        f"{'接口':<42}{'请求数':>8}{'错误':>6}{'请求/秒':>10}"
+        f"{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (毫秒)"
+    )
+    for s in stats:
+        print(
+            f"{s['endpoint']:<44}{s['requests']:>8}{s['errors']:>6}{s['rps']:>10.1f}"
+            f"{s['p50']:>9.1f}{s['p90']:>9.1f}{s['p95']:>9.1f}{s['p99']:>9.1f}{s['max']:>9.1f}"
+        )
+
+
+def start_server(db_path, port, cache_size=None):
+    """使用指定数据库启动API服务，返回子进程"""
+    env = dict(os.environ, BOOKLIST_DB=os.path.abspath(db_path))
+    if cache_size is not None:
+        env["BOOKLIST_CACHE_SIZE"] = str(cache_size)
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=PROJECT_DIR,
+        env=env,
+    )
+    # 等待服务可用
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/sites")
+            conn.getresponse().read()
+            conn.close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("API服务启动失败")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("等待API服务启动超时")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="API压力测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = subparsers.add_parser("seed", help="生成合成数据库")
+    seed_parser.add_argument("path", help="数据库文件路径，不能已存在")
+    seed_parser.add_argument("--ranking-types", type=int, default=200)
+    seed_parser.add_argument("--days", type=int, default=1825)
+    seed_parser.add_argument("--books-per-ranking", type=int, default=10)
+    seed_parser.add_argument("--books-per-site", type=int, default=5000)
+    seed_parser.add_argument("--seed", type=int, default=0)
+
+    run_parser = subparsers.add_parser("run", help="压测API服务")
+    target = run_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="已运行的API服务地址")
+    target.add_argument("--serve", metavar="DB", help="使用该数据库启动API服务并压测")
+    run_parser.add_argument("--db", help="生成请求路径使用的数据库，默认与--serve相同")
+    run_parser.add_argument("--port", type=int, default=8765, help="--serve使用的端口")
+    run_parser.add_argument(
+        "--cache-size",
+        type=int,
+        help="--serve时API响应缓存的大小，0表示关闭缓存",
+    )
+    run_parser.add_argument(
+        "--concurrency", default="1,8,32", help="逗号分隔的并发数，依次压测"
+    )
+    run_parser.add_argument("--duration", type=float, default=10, help="每轮压测秒数")
+    run_parser.add_argument(
+        "--weights",
+        default="1,1,1",
+        help="三个接口(全部榜单、站点榜单、指定榜单)的请求权重",
+    )
+    run_parser.add_argument(
+        "--history-ratio",
+        type=float,
+        default=0.0,
+        help="请求随机历史日期的比例(0-1)",
+    )
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--json", help="将结果保存为JSON文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "seed":
+        seed_database(
+            args.path,
+            ranking_types=args.ranking_types,
+            days=args.days,
+            books_per_ranking=args.books_per_ranking,
+            books_per_site=args.books_per_site,
+            seed=args.seed,
+        )
+        return 0
+
+    db_path = args.db or args.serve
+    if not db_path:
+        print("压测已运行的服务时需要通过--db指定数据库以生成请求路径")
+        return 1
+    endpoints, date_range = build_endpoints(db_path)
+    weights = [float(w) for w in args.weights.split(",")]
+
+    process = None
+    base_url = args.url
+    if args.serve:
+        process = start_server(args.serve, args.port, args.cache_size)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    results = {}
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            stats = run_load(
+                base_url,
+                endpoints,
+                concurrency,
+                args.duration,
+                weights,
+                (date_range, args.history_ratio),
+                args.seed,
+            )
+            print_stats(concurrency, stats)
+            results[concurrency] = stats
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+爬虫解析和入库基准测试
+
+从benchmarks/fixtures/读取样本，不访问网络。测试各站点的解析函数，以及通过本地回放服务器
+完成的完整fetch_and_save入库(写入临时数据库)。报告每秒操作数和峰值内存，并与保存的基线对比。
+
+用法:
+    python benchmarks/run.py                    # 运行并与基线对比，有性能退化时返回1
+    python benchmarks/run.py --save-baseline    # 运行并将结果保存为新基线
+    python benchmarks/run.py -k qidian          # 只运行名称包含qidian的测试
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from lxml import etree
+
+from fixtures import FIXTURE_DIR, load_fixture
+
+import booklist_db  # noqa: E402  fixtures已将项目根目录加入sys.path
+import ciwei  # noqa: E402
+import qidian  # noqa: E402
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baseline.json"
+)
+
+# 默认允许的性能波动比例，超过即视为退化
+DEFAULT_THRESHOLD = 0.25
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """回放样本的HTTP处理器，路径第一段为站点代码"""
+
+    fixtures = {}
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        site_code = parts.path.strip("/").split("/")[0]
+        body = self.fixtures.get(site_code)
+        if site_code == "fanqie":
+            # 番茄小说只有第一页，之后的分页返回空列表
+            offset = int(dict(parse_qsl(parts.query)).get("offset", 0))
+            if offset:
+                body = json.dumps({"code": 0, "data": {"book_list": []}})
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        content = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class IngestEnvironment:
+    """完整入库测试的环境：临时数据库、抓取缓存和本地回放服务器"""
+
+    def __init__(self, fixtures):
+        self.tmp_dir = tempfile.mkdtemp(prefix="booklist_bench_")
+        os.environ["BOOKLIST_FETCH_CACHE"] = os.path.join(
+            self.tmp_dir, "fetch_cache.json"
+        )
+        self.db = booklist_db.BooklistDatabase(os.path.join(self.tmp_dir, "bench.db"))
+
+        handler = type("Handler", (ReplayHandler,), {"fixtures": fixtures})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        qidian.QIDIAN_URL = f"{self.base_url}/qidian/"
+
+    def adapter(self, site_code):
+        """创建指向回放服务器的适配器，不使用抓取缓存，每次都完整解析和写入"""
+        self.db.cursor.execute("SELECT * FROM sites WHERE site_code = ?", (site_code,))
+        adapter = booklist_db.get_adapter_for_site(self.db.cursor.fetchone(), self.db)
+        adapter.use_fetch_cache = False
+        adapter.site_url = f"{self.base_url}/{site_code}/"
+        adapter.api_url = f"{self.base_url}/fanqie/?limit=200&offset=0"
+        return adapter
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def build_cases(fixtures, env):
+    """返回 {测试名称: 无参数函数}"""
+    ciweimao_tree = etree.HTML(fixtures["ciweimao"])
+    fanqie_payload = json.loads(fixtures["fanqie"])
+    fanqie_adapter = env.adapter("fanqie")
+
+    def fanqie_process():
+        pages = booklist_db.FanqiePages(
+            [fanqie_adapter.extract_book_list(fanqie_payload)]
+        )
+        return list(fanqie_adapter.process_data(pages)["hot_list"])
+
+    def ingest(site_code):
+        def run():
+            if not env.adapter(site_code).fetch_and_save():
+                raise RuntimeError(f"{site_code} 入库失败")
+
+        return run
+
+    return {
+        "ciwei.parse_weekly_clicks": lambda: ciwei.parse_weekly_clicks(ciweimao_tree),
+        "ciwei.parse_monthly_votes": lambda: ciwei.parse_monthly_votes(ciweimao_tree),
+        "ciwei.parse_new_books": lambda: ciwei.parse_new_books(ciweimao_tree),
+        "ciwei.parse_rankings": lambda: ciwei.parse_rankings(
+            etree.HTML(fixtures["ciweimao"])
+        ),
+        "qidian.parse_ranking_list": lambda: qidian.parse_ranking_list(
+            fixtures["qidian"]
+        ),
+        "fanqie.process_data": fanqie_process,
+        "ingest.ciweimao": ingest("ciweimao"),
+        "ingest.qidian": ingest("qidian"),
+        "ingest.fanqie": ingest("fanqie"),
+    }
+
+
+def measure(func, min_time=1.0, repeat=5, min_rounds=3):
+    """
+    运行func共约min_time秒，返回每秒操作数和峰值内存(KB)
+    分repeat组计时，取最快一组的结果以降低机器负载波动的影响；
+    峰值内存由tracemalloc单独运行一次测得，只统计Python分配的内存，不含lxml等C库内部的分配
+    """
+    func()  # 预热
+    best = 0.0
+    for _ in range(repeat):
+        rounds = 0
+        start = time.perf_counter()
+        while True:
+            func()
+            rounds += 1
+            elapsed = time.perf_counter() - start
+            if rounds >= min_rounds and elapsed >= min_time / repeat:
+                break
+        best = max(best, rounds / elapsed)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"ops_per_sec": round(best, 2), "peak_kb": round(peak / 1024, 1)}
+
+
+def compare(results, baseline, threshold):
+    """对比基线，返回退化列表"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{name}: 每秒操作数 {base['ops_per_sec']} -> {result['ops_per_sec']}"
+            )
+        if result["peak_kb"] > base["peak_kb"] * (1 + threshold):
+            regressions.append(
+                f"{name}: 峰值内存 {base['peak_kb']}KB -> {result['peak_kb']}KB"
+            )
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="爬虫解析和入库基准测试")
+    parser.add_argument("-k", dest="pattern", help="只运行名称包含该字符串的测试")
+    parser.add_argument(
+        "--min-time", type=float, default=1.0, help="每个测试的最短运行时间(秒)"
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件路径")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="将本次结果保存为基线"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="允许的性能波动比例，默认0.25",
+    )
+    args = parser.parse_args(argv)
+
+    # 入库过程会向booklist_fetch.log写入大量日志，测试期间关闭；入库失败时直接抛出异常
+    logging.getLogger("booklist").setLevel(logging.CRITICAL)
+
+    if not os.path.isdir(FIXTURE_DIR):
+        print("缺少样本，请先运行 python benchmarks/fixtures.py")
+        return 1
+    fixtures = {
+        site_code: load_fixture(site_code)
+        for site_code in ("ciweimao", "qidian", "fanqie")
+    }
+
+    env = IngestEnvironment(fixtures)
+    try:
+        cases = build_cases(fixtures, env)
+        results = {}
+        for name, func in cases.items():
+            if args.pattern and args.pattern not in name:
+                continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = measure(func, min_time=args.min_time)
+            print(
+                f"{name:<28} {results[name]['ops_per_sec']:>10.2f} ops/s"
+                f" {results[name]['peak_kb']:>10.1f} KB"
+            )
+    finally:
+        env.close()
+
+    if args.save_baseline:
+        baseline = load_baseline(args.baseline)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"基线已保存到 {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print("没有基线，使用 --save-baseline 保存本次结果")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\n性能退化:")
+        for regression in regressions:
+            print(f"- {regression}")
+        return 1
+    print(f"\n与基线相比没有超过 {args.threshold:.0%} 的性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
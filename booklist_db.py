@@ -4,21 +4,197 @@ import json
 import time
 import re
 import logging
+import asyncio
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import importlib
+import itertools
+import hashlib
 import traceback
+import argparse
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# 设置日志记录
+import requests
+
+import archive
+import columnar
+import http_client
+import metrics
+
+# 设置日志记录，日志文件固定写在项目目录下，与运行时的工作目录无关
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    filename="booklist_fetch.log",
+    filename=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "booklist_fetch.log"
+    ),
     filemode="a",
     # encoding="utf-8",
     encoding="utf-8",
 )
 logger = logging.getLogger("booklist")
 
+# rankings表中有对应列的书籍字段，其余字段存入extra_data
+RANKING_COLUMN_KEYS = frozenset(
+    {
+        "book_id",
+        "rank",
+        "title",
+        "author",
+        "url",
+        "book_url",
+        "category",
+        "indicator_value",
+        "clicks",
+        "votes",
+        "indicator_unit",
+        "cover_url",
+        "cover_img",
+        "latest_chapter",
+        "creation_status",
+    }
+)
+
+# 抓取的内容自今天上次保存以来没有变化
+NOT_MODIFIED = object()
+
+
+class DataUnchanged(Exception):
+    """榜单数据与今天已保存的相同，用于回滚本次写入"""
+
+
+# fetch_logs表中每次抓取的结构化统计列，旧数据库由upgrade_schema补充
+FETCH_LOG_STAT_COLUMNS = (
+    ("fetch_seconds", "REAL"),
+    ("parse_seconds", "REAL"),
+    ("save_seconds", "REAL"),
+    ("bytes_downloaded", "INTEGER"),
+    ("retry_count", "INTEGER"),
+    ("rows_rejected", "INTEGER"),
+    ("row_counts", "TEXT"),
+)
+
+INSERT_RANKING_SQL = """
+INSERT INTO rankings
+(site_id, ranking_type_id, fetch_date, rank, book_ref,
+indicator_value, indicator_num, indicator_unit, extra_data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 同一榜单同一天同一排名只保留一条，重复抓取时覆盖旧数据
+UPSERT_RANKING_SQL = (
+    INSERT_RANKING_SQL
+    + """ON CONFLICT (ranking_type_id, fetch_date, rank) DO UPDATE SET
+book_ref = excluded.book_ref, indicator_value = excluded.indicator_value,
+indicator_num = excluded.indicator_num, indicator_unit = excluded.indicator_unit,
+extra_data = excluded.extra_data,
+created_at = CURRENT_TIMESTAMP
+"""
+)
+
+# 指标数值中的数量单位
+INDICATOR_MULTIPLIERS = {"万": 10**4, "亿": 10**8}
+INDICATOR_PATTERN = re.compile(r"^\s*([+-]?[\d,]*\.?\d+)\s*([万亿]?)\s*(.*?)\s*$")
+
+# 没有单位的指标按来源字段确定单位，如刺猬猫周点击榜的clicks和月票榜的votes
+INDICATOR_FIELD_UNITS = {"clicks": "点击", "votes": "月票"}
+
+
+def parse_indicator(text, unit=""):
+    """
+    将指标文本解析为数值和规范单位，如 ("74.0万", "") -> (740000, "")，
+    ("1.2", "万月票") -> (12000, "月票")；无法解析时数值为None
+    """
+    unit = (unit or "").strip()
+    match = INDICATOR_PATTERN.match(str(text or ""))
+    if not match:
+        return None, unit
+    number, multiplier, suffix = match.groups()
+    try:
+        value = Decimal(number.replace(",", ""))
+    except InvalidOperation:
+        return None, unit
+    # 数量单位可能在数值后，也可能在单位文本的开头
+    if not multiplier and unit[:1] in INDICATOR_MULTIPLIERS:
+        multiplier, unit = unit[0], unit[1:].strip()
+    if multiplier:
+        value *= INDICATOR_MULTIPLIERS[multiplier]
+    unit = unit or suffix.strip("+ ")
+    return (int(value) if value == value.to_integral_value() else float(value)), unit
+
+
+def indicator_fields(book_data, default_unit=""):
+    """
+    从书籍数据中提取指标，返回 (原始文本, 数值, 规范单位)
+    数值有效但没有单位时使用default_unit
+    """
+    unit = book_data.get("indicator_unit", "")
+    text = book_data.get("indicator_value")
+    if text is None:
+        for field, field_unit in INDICATOR_FIELD_UNITS.items():
+            if field in book_data:
+                text = book_data[field]
+                unit = unit or field_unit
+                break
+    text = str(text if text is not None else "")
+    number, unit = parse_indicator(text, unit)
+    if number is not None and not unit:
+        unit = default_unit
+    return text, number, unit
+
+
+# books表中书籍属性的列，与resolve_book_ref中属性元组的顺序一致
+BOOK_VALUE_COLUMNS = (
+    "book_id, title, author_id, book_url, category, "
+    "cover_url, latest_chapter, creation_status"
+)
+
+# 一次预先读取的书籍条数，每批书籍只需一次查询即可得到已有书籍的book_ref和属性
+BOOK_PRELOAD_SIZE = 500
+
+# 书籍的属性保存在books表中，同一站点以book_key唯一标识一本书：
+# 有book_id时为book_id，否则为书名；新值为空时保留已有的值
+# 通过RETURNING在同一条语句中取得book_ref和合并后的属性
+UPSERT_BOOK_SQL = f"""
+INSERT INTO books
+(site_id, book_key, book_id, title, author_id, book_url, category,
+cover_url, latest_chapter, creation_status)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (site_id, book_key) DO UPDATE SET
+title = COALESCE(NULLIF(excluded.title, ''), books.title),
+author_id = COALESCE(excluded.author_id, books.author_id),
+book_url = COALESCE(NULLIF(excluded.book_url, ''), books.book_url),
+category = COALESCE(NULLIF(excluded.category, ''), books.category),
+cover_url = COALESCE(NULLIF(excluded.cover_url, ''), books.cover_url),
+latest_chapter = COALESCE(NULLIF(excluded.latest_chapter, ''), books.latest_chapter),
+creation_status = COALESCE(excluded.creation_status, books.creation_status),
+updated_at = CURRENT_TIMESTAMP
+RETURNING book_ref, {BOOK_VALUE_COLUMNS}
+"""
+
+
+def merge_book_values(stored, values):
+    """按UPSERT_BOOK_SQL的规则合并书籍属性：book_id不更新，新值为空时保留已有的值"""
+    return (stored[0],) + tuple(
+        old if new in ("", None) else new for old, new in zip(stored[1:], values[1:])
+    )
+
+
+# 旧版本rankings表中由books和authors表取代的文本列
+LEGACY_BOOK_COLUMNS = (
+    "book_id",
+    "title",
+    "author",
+    "book_url",
+    "category",
+    "cover_url",
+    "latest_chapter",
+    "creation_status",
+)
+
 
 class BooklistDatabase:
     """
@@ -26,11 +202,24 @@ class BooklistDatabase:
     负责创建、连接数据库和执行数据库操作
     """
 
-    def __init__(self, db_path="booklist.db"):
-        """初始化数据库连接"""
+    def __init__(self, db_path="booklist.db", migrate=False):
+        """
+        初始化数据库连接
+        旧版本数据库的迁移会重建rankings表，只在migrate为True时执行，否则抛出RuntimeError
+        """
         self.db_path = db_path
+        self.migrate = migrate
         self.conn = None
         self.cursor = None
+        self.has_unique_rank_index = False
+        # 本进程已写入books和authors表的条目，属性没有变化时不再重复写入
+        self._author_ids = {}
+        self._book_refs = {}
+        # transaction()的嵌套层数，内层使用SAVEPOINT
+        self._transaction_depth = 0
+        # 打开数据库时从旧版本结构迁移的榜单条数，以及迁移前的备份文件
+        self.migrated_rows = 0
+        self.backup_path = None
         self.initialize()
 
     def initialize(self):
@@ -39,13 +228,386 @@ class BooklistDatabase:
         db_exists = os.path.exists(self.db_path)
 
         # 连接数据库
-        self.conn = sqlite3.connect(self.db_path)
+        # 语句耗时记录到抓取指标中
+        self.conn = sqlite3.connect(self.db_path, factory=metrics.CrawlConnection)
         self.conn.execute("PRAGMA foreign_keys = ON")  # 启用外键约束
+        # WAL模式下写入不会阻塞API的读取
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA busy_timeout = 5000")
         self.cursor = self.conn.cursor()
 
         # 如果数据库文件不存在，创建表结构
         if not db_exists:
             self.create_tables()
+        elif self.has_legacy_rankings() and not self.migrate:
+            self.conn.close()
+            raise RuntimeError(
+                f"数据库 {self.db_path} 仍为旧版本结构，请先运行 python booklist_db.py migrate 迁移"
+            )
+
+        # 为已有数据库补充新版本的索引等结构
+        self.upgrade_schema()
+
+    def upgrade_schema(self):
+        """升级已有数据库的表结构，可重复执行"""
+        # 书籍属性拆分到books和authors表，rankings表只保存书籍的整数引用
+        self.create_book_tables()
+        if self.has_legacy_rankings():
+            self.backup_path = self.backup_database("legacy")
+            logger.info(f"迁移前已将数据库备份到 {self.backup_path}")
+            self.migrated_rows = self.normalize_rankings()
+
+        # 数据版本号，每次写入新数据后递增，API据此使缓存失效
+        self.cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """
+        )
+        self.cursor.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)"
+        )
+        self.conn.commit()
+
+        # 每个榜单最近一次有数据的日期，API据此直接定位最新数据
+        self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'latest_snapshot'"
+        )
+        has_latest_snapshot = self.cursor.fetchone() is not None
+        self.cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS latest_snapshot (
+            site_id INTEGER NOT NULL,
+            ranking_type_id INTEGER NOT NULL,
+            fetch_date DATE NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (site_id, ranking_type_id),
+            FOREIGN KEY (site_id) REFERENCES sites (site_id),
+            FOREIGN KEY (ranking_type_id) REFERENCES ranking_types (ranking_type_id)
+        )
+        """
+        )
+        self.conn.commit()
+        if not has_latest_snapshot:
+            self.rebuild_latest_snapshot()
+
+        # 指标数值列，原始文本仍保存在indicator_value中
+        self.cursor.execute("PRAGMA table_info(rankings)")
+        if "indicator_num" not in {row[1] for row in self.cursor.fetchall()}:
+            self.cursor.execute("ALTER TABLE rankings ADD COLUMN indicator_num NUMERIC")
+            self.conn.commit()
+        self.cursor.execute("SELECT 1 FROM meta WHERE key = 'indicator_num_filled'")
+        if self.cursor.fetchone() is None:
+            self.fill_indicator_num()
+
+        # 按站点或日期范围查询和导出快照
+        archive.create_snapshot_indexes(self.conn)
+        # 书籍历史查询使用覆盖索引，不读取rankings表本身；旧版本的索引不含indicator_num，重新创建
+        self.cursor.execute("PRAGMA index_info(idx_rankings_book_history)")
+        if "indicator_num" not in {row[2] for row in self.cursor.fetchall()}:
+            self.cursor.execute("DROP INDEX IF EXISTS idx_rankings_book_history")
+        self.cursor.execute(
+            """
+        CREATE INDEX IF NOT EXISTS idx_rankings_book_history
+        ON rankings (book_ref, fetch_date, ranking_type_id, rank, indicator_value, indicator_num)
+        """
+        )
+        self.cursor.execute("DROP INDEX IF EXISTS idx_rankings_book")
+        # 按单位查询某天指标最高的书籍，如跨站点的月票排行
+        self.cursor.execute(
+            """
+        CREATE INDEX IF NOT EXISTS idx_rankings_indicator
+        ON rankings (indicator_unit, fetch_date, indicator_num)
+        """
+        )
+        self.conn.commit()
+
+        try:
+            self.cursor.execute(
+                """
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_rankings_type_date_rank
+            ON rankings (ranking_type_id, fetch_date, rank)
+            """
+            )
+            # (ranking_type_id, fetch_date)是唯一索引的前缀，不再需要单独的索引
+            self.cursor.execute("DROP INDEX IF EXISTS idx_rankings_type_date")
+            self.conn.commit()
+            self.has_unique_rank_index = True
+        except sqlite3.IntegrityError:
+            # 旧数据中存在重复记录，需要先执行压缩命令
+            self.has_unique_rank_index = False
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_rankings_type_date ON rankings (ranking_type_id, fetch_date)"
+            )
+            self.conn.commit()
+            logger.warning(
+                "rankings表存在重复数据，无法创建唯一索引，请运行 python booklist_db.py compact"
+            )
+
+        # fetch_logs表记录每次抓取各阶段的结构化统计
+        self.cursor.execute("PRAGMA table_info(fetch_logs)")
+        existing_columns = {row[1] for row in self.cursor.fetchall()}
+        for column, column_type in FETCH_LOG_STAT_COLUMNS:
+            if column not in existing_columns:
+                self.cursor.execute(
+                    f"ALTER TABLE fetch_logs ADD COLUMN {column} {column_type}"
+                )
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_fetch_logs_site ON fetch_logs (site_id, log_id)"
+        )
+        # extra_data中常用于筛选的字段，以生成列的形式加到rankings表并建立索引
+        archive.create_extra_columns(self.conn)
+        # 已归档到单独文件的月份
+        archive.create_partitions_table(self.conn)
+        self.conn.commit()
+        self.cursor.execute("SELECT value FROM meta WHERE key = 'archive_version'")
+        row = self.cursor.fetchone()
+        if (row[0] if row else 1) < archive.ARCHIVE_SCHEMA_VERSION:
+            archive.upgrade_partitions(self.conn, self.db_path)
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('archive_version', ?)",
+                (archive.ARCHIVE_SCHEMA_VERSION,),
+            )
+            self.conn.commit()
+
+    def fill_indicator_num(self):
+        """
+        解析已有数据的指标文本，补充indicator_num和规范单位，完成后在meta表中记录
+        与写入时相同，同一快照中没有单位的书籍沿用其他书籍的单位；
+        榜单代码以clicks或votes结尾的(刺猬猫)按INDICATOR_FIELD_UNITS确定单位
+        """
+        rows = self.conn.execute(
+            """
+        SELECT r.ranking_id, r.ranking_type_id, r.fetch_date, r.indicator_value,
+               r.indicator_unit, rt.type_code
+        FROM rankings r
+        JOIN ranking_types rt ON r.ranking_type_id = rt.ranking_type_id
+        WHERE r.indicator_num IS NULL AND r.indicator_value != ''
+        ORDER BY r.ranking_type_id, r.fetch_date, r.rank
+        """
+        ).fetchall()
+
+        def iter_updates():
+            snapshot = None
+            for ranking_id, type_id, fetch_date, text, unit, type_code in rows:
+                if (type_id, fetch_date) != snapshot:
+                    snapshot = (type_id, fetch_date)
+                    field = type_code.rsplit("_", 1)[-1]
+                    batch_unit = INDICATOR_FIELD_UNITS.get(field, "")
+                number, unit = parse_indicator(text, unit)
+                if number is None:
+                    continue
+                batch_unit = unit or batch_unit
+                yield number, unit or batch_unit, ranking_id
+
+        with self.conn:
+            self.cursor.executemany(
+                "UPDATE rankings SET indicator_num = ?, indicator_unit = ? WHERE ranking_id = ?",
+                iter_updates(),
+            )
+            filled = self.cursor.rowcount
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('indicator_num_filled', 1)"
+            )
+        if filled > 0:
+            logger.info(f"已为 {filled} 条榜单数据补充指标数值")
+
+    def rebuild_latest_snapshot(self):
+        """根据rankings表重新生成latest_snapshot表"""
+        with self.conn:
+            self.cursor.execute("DELETE FROM latest_snapshot")
+            self.cursor.execute(
+                """
+            INSERT INTO latest_snapshot (site_id, ranking_type_id, fetch_date, row_count)
+            SELECT r.site_id, r.ranking_type_id, r.fetch_date, COUNT(*)
+            FROM rankings r
+            JOIN (
+                SELECT ranking_type_id, MAX(fetch_date) AS fetch_date
+                FROM rankings GROUP BY ranking_type_id
+            ) latest
+            ON r.ranking_type_id = latest.ranking_type_id
+            AND r.fetch_date = latest.fetch_date
+            GROUP BY r.site_id, r.ranking_type_id, r.fetch_date
+            """
+            )
+
+    def compact_rankings(self, vacuum=False):
+        """
+        删除rankings表中的重复数据并创建唯一索引
+        同一榜单同一天同一排名只保留最后写入的一条，返回删除的条数
+        """
+        with self.conn:
+            self.cursor.execute(
+                """
+            DELETE FROM rankings
+            WHERE ranking_id NOT IN (
+                SELECT MAX(ranking_id) FROM rankings
+                GROUP BY ranking_type_id, fetch_date, rank
+            )
+            """
+            )
+            removed = self.cursor.rowcount
+        logger.info(f"已删除 {removed} 条重复榜单数据")
+
+        self.upgrade_schema()
+        self.rebuild_latest_snapshot()
+        self.bump_generation()
+        self.conn.commit()
+        if vacuum:
+            self.conn.execute("VACUUM")
+        return removed
+
+    def archive_old_snapshots(
+        self, keep_days=archive.ARCHIVE_KEEP_DAYS, vacuum=False, today=None
+    ):
+        """
+        将整月早于保留窗口的快照按月移动到归档文件，返回 {月份: 移动的条数}
+        books和authors表不归档，归档的快照仍通过book_ref引用热数据库中的书籍
+        """
+        archived = {}
+        for month in archive.months_to_archive(self.conn, keep_days, today):
+            archived[month] = archive.archive_month(self.conn, self.db_path, month)
+            logger.info(f"已将 {month} 的 {archived[month]} 条榜单数据移动到归档文件")
+        if archived and vacuum:
+            self.conn.execute("VACUUM")
+        return archived
+
+    def create_book_tables(self):
+        """创建books和authors表，可重复执行"""
+        self.cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS authors (
+            author_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site_id INTEGER NOT NULL,
+            author_name TEXT NOT NULL,
+            FOREIGN KEY (site_id) REFERENCES sites (site_id),
+            UNIQUE (site_id, author_name)
+        )
+        """
+        )
+        self.cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS books (
+            book_ref INTEGER PRIMARY KEY AUTOINCREMENT,
+            site_id INTEGER NOT NULL,
+            book_key TEXT NOT NULL,
+            book_id TEXT,
+            title TEXT NOT NULL,
+            author_id INTEGER,
+            book_url TEXT,
+            category TEXT,
+            cover_url TEXT,
+            latest_chapter TEXT,
+            creation_status INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (site_id) REFERENCES sites (site_id),
+            FOREIGN KEY (author_id) REFERENCES authors (author_id),
+            UNIQUE (site_id, book_key)
+        )
+        """
+        )
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_books_book_id ON books (book_id)"
+        )
+        self.conn.commit()
+
+    def backup_database(self, label):
+        """使用SQLite在线备份接口复制数据库，返回备份文件路径"""
+        path = f"{self.db_path}.{label}-{datetime.now():%Y%m%d%H%M%S}.bak"
+        target = sqlite3.connect(path)
+        try:
+            self.conn.backup(target)
+        finally:
+            target.close()
+        return path
+
+    def has_legacy_rankings(self):
+        """rankings表是否仍为在每行保存书名、作者等文本的旧版本结构"""
+        self.cursor.execute("PRAGMA table_info(rankings)")
+        return "title" in {row[1] for row in self.cursor.fetchall()}
+
+    def normalize_rankings(self):
+        """
+        将旧版本rankings表的书籍属性迁移到books和authors表，返回迁移的条数
+        按ranking_id顺序重放旧数据，books表保存每本书最近一次非空的属性，
+        每天的最新章节和封面等历史属性不再保留，只存在于迁移前的备份中；
+        ranking_id保持不变。整个迁移在一个事务中完成，失败时回滚
+        """
+        self.create_book_tables()
+        start = time.perf_counter()
+        self.cursor.execute("BEGIN")
+        try:
+            # 旧索引引用了将被删除的列，随旧表一起删除
+            self.cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'rankings' AND sql IS NOT NULL"
+            )
+            for (name,) in self.cursor.fetchall():
+                self.cursor.execute(f"DROP INDEX {name}")
+            self.cursor.execute("ALTER TABLE rankings RENAME TO rankings_legacy")
+            self.create_rankings_table()
+
+            legacy = self.conn.execute(
+                f"""
+            SELECT ranking_id, site_id, ranking_type_id, fetch_date, rank,
+                   indicator_value, indicator_unit, extra_data, created_at,
+                   {', '.join(LEGACY_BOOK_COLUMNS)}
+            FROM rankings_legacy ORDER BY ranking_id
+            """
+            )
+
+            def iter_rows():
+                for row in legacy:
+                    book = dict(zip(LEGACY_BOOK_COLUMNS, row[9:]))
+                    yield row[:5] + (self.resolve_book_ref(row[1], book),) + row[5:9]
+
+            self.cursor.executemany(
+                """
+            INSERT INTO rankings
+            (ranking_id, site_id, ranking_type_id, fetch_date, rank, book_ref,
+            indicator_value, indicator_unit, extra_data, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                iter_rows(),
+            )
+            migrated = self.cursor.rowcount
+            self.cursor.execute("DROP TABLE rankings_legacy")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.clear_book_cache()
+            raise
+
+        logger.info(
+            f"已将 {migrated} 条榜单数据迁移到books和authors表，"
+            f"耗时 {time.perf_counter() - start:.1f} 秒"
+        )
+        return migrated
+
+    def create_rankings_table(self):
+        """创建rankings表，书籍属性通过book_ref引用books表"""
+        self.cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS rankings (
+            ranking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            site_id INTEGER NOT NULL,
+            ranking_type_id INTEGER NOT NULL,
+            fetch_date DATE NOT NULL,
+            rank INTEGER NOT NULL,
+            book_ref INTEGER NOT NULL,
+            indicator_value TEXT,
+            indicator_num NUMERIC,
+            indicator_unit TEXT,
+            extra_data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (site_id) REFERENCES sites (site_id),
+            FOREIGN KEY (ranking_type_id) REFERENCES ranking_types (ranking_type_id),
+            FOREIGN KEY (book_ref) REFERENCES books (book_ref)
+        )
+        """
+        )
 
     def create_tables(self):
         """创建数据库表结构"""
@@ -86,32 +648,11 @@ class BooklistDatabase:
         """
         )
 
+        # 创建books和authors表
+        self.create_book_tables()
+
         # 创建rankings表
-        self.cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS rankings (
-            ranking_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            site_id INTEGER NOT NULL,
-            ranking_type_id INTEGER NOT NULL,
-            fetch_date DATE NOT NULL,
-            book_id TEXT,
-            rank INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            author TEXT,
-            book_url TEXT,
-            category TEXT,
-            indicator_value TEXT,
-            indicator_unit TEXT,
-            cover_url TEXT,
-            latest_chapter TEXT,
-            creation_status INTEGER,
-            extra_data TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (site_id) REFERENCES sites (site_id),
-            FOREIGN KEY (ranking_type_id) REFERENCES ranking_types (ranking_type_id)
-        )
-        """
-        )
+        self.create_rankings_table()
 
         # 创建fetch_logs表
         self.cursor.execute(
@@ -128,17 +669,6 @@ class BooklistDatabase:
         """
         )
 
-        # 创建索引
-        self.cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_rankings_site_date ON rankings (site_id, fetch_date)"
-        )
-        self.cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_rankings_type_date ON rankings (ranking_type_id, fetch_date)"
-        )
-        self.cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_rankings_book ON rankings (book_id)"
-        )
-
         # 提交事务
         self.conn.commit()
         logger.info("数据库表结构创建完成")
@@ -285,15 +815,15 @@ class BooklistDatabase:
     ):
         """添加或更新榜单类型"""
         try:
-            self.cursor.execute(
-                """
-            INSERT OR REPLACE INTO ranking_types 
-            (site_id, type_name, type_code, type_url, description, updated_at)
-            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """,
-                (site_id, type_name, type_code, type_url, description),
-            )
-            self.conn.commit()
+            with self.transaction():
+                self.cursor.execute(
+                    """
+                INSERT OR REPLACE INTO ranking_types 
+                (site_id, type_name, type_code, type_url, description, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                    (site_id, type_name, type_code, type_url, description),
+                )
             return True
         except Exception as e:
             logger.error(f"添加或更新榜单类型失败: {str(e)}")
@@ -308,87 +838,347 @@ class BooklistDatabase:
         result = self.cursor.fetchone()
         return result[0] if result else None
 
-    def save_ranking_data(self, site_id, ranking_type_id, fetch_date, book_data):
-        """保存榜单数据"""
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        事务上下文管理器，正常退出时提交，出现异常时回滚
+        嵌套使用时内层为SAVEPOINT，出错只回滚内层的写入，整体由最外层提交
+        """
+        depth = self._transaction_depth
+        savepoint = f"booklist_{depth}"
+        if depth:
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+        elif not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self._transaction_depth += 1
+        try:
+            yield
+        except BaseException:
+            if depth:
+                self.conn.execute(f"ROLLBACK TO {savepoint}")
+                self.conn.execute(f"RELEASE {savepoint}")
+            else:
+                self.conn.rollback()
+            # 回滚的事务中可能新写入了书籍和作者
+            self.clear_book_cache()
+            raise
+        else:
+            if depth:
+                self.conn.execute(f"RELEASE {savepoint}")
+            else:
+                self.conn.commit()
+        finally:
+            self._transaction_depth -= 1
+
+    def clear_book_cache(self):
+        """事务回滚后清空books和authors表的缓存，其中可能有已回滚的条目"""
+        self._author_ids.clear()
+        self._book_refs.clear()
+
+    def resolve_author_id(self, site_id, author_name):
+        """获取作者ID，作者不存在时写入authors表；作者为空时返回None"""
+        if not author_name:
+            return None
+        key = (site_id, author_name)
+        author_id = self._author_ids.get(key)
+        if author_id is None:
+            # 使用独立的游标，调用方可能正在用self.cursor执行executemany
+            # 冲突时更新为相同的值，使RETURNING在一条语句中返回已有作者的ID
+            author_id = self.conn.execute(
+                """
+            INSERT INTO authors (site_id, author_name) VALUES (?, ?)
+            ON CONFLICT (site_id, author_name) DO UPDATE SET author_name = excluded.author_name
+            RETURNING author_id
+            """,
+                key,
+            ).fetchall()[0][0]
+            self._author_ids[key] = author_id
+        return author_id
+
+    def preload_books(self, site_id, books):
+        """
+        一次查询读取一批书籍数据中尚未缓存的作者和书籍，books为书籍数据字典的列表
+        抓取程序每次运行都是新进程，预先读取后属性没有变化的已有书籍不需要任何写入
+        """
+        author_names = {
+            book.get("author")
+            for book in books
+            if book.get("author")
+            and (site_id, book.get("author")) not in self._author_ids
+        }
+        if author_names:
+            rows = self.conn.execute(
+                f"""
+            SELECT author_name, author_id FROM authors
+            WHERE site_id = ? AND author_name IN ({', '.join('?' * len(author_names))})
+            """,
+                (site_id, *author_names),
+            )
+            for author_name, author_id in rows:
+                self._author_ids[(site_id, author_name)] = author_id
+
+        book_keys = {
+            book.get("book_id") or book.get("title")
+            for book in books
+            if (site_id, book.get("book_id") or book.get("title"))
+            not in self._book_refs
+        }
+        book_keys.discard(None)
+        book_keys.discard("")
+        if book_keys:
+            rows = self.conn.execute(
+                f"""
+            SELECT book_key, book_ref, {BOOK_VALUE_COLUMNS} FROM books
+            WHERE site_id = ? AND book_key IN ({', '.join('?' * len(book_keys))})
+            """,
+                (site_id, *book_keys),
+            )
+            for row in rows:
+                self._book_refs[(site_id, row[0])] = (row[1], tuple(row[2:]))
+
+    def resolve_book_ref(self, site_id, book):
+        """
+        获取书籍在books表中的book_ref，不存在时写入，属性有变化时更新
+        book为包含LEGACY_BOOK_COLUMNS各键的字典
+        已缓存(或由preload_books读取)且属性没有变化的书籍不执行任何语句，其余书籍执行一条upsert
+        """
+        book_key = book["book_id"] or book["title"]
+        values = (
+            book["book_id"] or "",
+            book["title"],
+            self.resolve_author_id(site_id, book["author"]),
+            book["book_url"] or "",
+            book["category"] or "",
+            book["cover_url"] or "",
+            book["latest_chapter"] or "",
+            book["creation_status"],
+        )
+        cached = self._book_refs.get((site_id, book_key))
+        if cached and merge_book_values(cached[1], values) == cached[1]:
+            return cached[0]
+
+        row = self.conn.execute(
+            UPSERT_BOOK_SQL, (site_id, book_key) + values
+        ).fetchall()[0]
+        self._book_refs[(site_id, book_key)] = (row[0], tuple(row[1:]))
+        return row[0]
+
+    def build_ranking_row(
+        self, site_id, ranking_type_id, fetch_date, book_data, indicator=None
+    ):
+        """
+        将书籍数据转换为rankings表的行元组，书籍属性写入books和authors表
+        indicator为indicator_fields的结果，为None时从book_data中提取
+        排名无法转换为整数或缺少书名的数据会抛出ValueError
+        """
         # 提取书籍数据
-        book_id = book_data.get("book_id", "")
-        rank = book_data.get("rank", 0)
+        try:
+            rank = int(book_data.get("rank", 0))
+        except (TypeError, ValueError):
+            raise ValueError(f"无效的排名: {book_data.get('rank')!r}")
         title = book_data.get("title", "")
-        author = book_data.get("author", "")
-        book_url = book_data.get("url", book_data.get("book_url", ""))
-        category = book_data.get("category", "")
-        indicator_value = str(
-            book_data.get(
-                "indicator_value", book_data.get("clicks", book_data.get("votes", ""))
-            )
+        if not title:
+            raise ValueError("缺少书名")
+
+        indicator_value, indicator_num, indicator_unit = indicator or indicator_fields(
+            book_data
         )
-        indicator_unit = book_data.get("indicator_unit", "")
-        cover_url = book_data.get("cover_url", book_data.get("cover_img", ""))
-        latest_chapter = book_data.get("latest_chapter", "")
-        creation_status = book_data.get("creation_status", None)
 
         # 额外数据转为JSON字符串
-        extra_keys = set(book_data.keys()) - {
-            "book_id",
-            "rank",
-            "title",
-            "author",
-            "url",
-            "book_url",
-            "category",
-            "indicator_value",
-            "clicks",
-            "votes",
-            "indicator_unit",
-            "cover_url",
-            "cover_img",
-            "latest_chapter",
-            "creation_status",
+        extra_data = {
+            k: v for k, v in book_data.items() if k not in RANKING_COLUMN_KEYS
         }
-        extra_data = {k: book_data[k] for k in extra_keys if k in book_data}
         extra_json = json.dumps(extra_data, ensure_ascii=False) if extra_data else None
 
+        book = {
+            "book_id": book_data.get("book_id", ""),
+            "title": title,
+            "author": book_data.get("author", ""),
+            "book_url": book_data.get("url", book_data.get("book_url", "")),
+            "category": book_data.get("category", ""),
+            "cover_url": book_data.get("cover_url", book_data.get("cover_img", "")),
+            "latest_chapter": book_data.get("latest_chapter", ""),
+            "creation_status": book_data.get("creation_status", None),
+        }
+
+        return (
+            site_id,
+            ranking_type_id,
+            fetch_date,
+            rank,
+            self.resolve_book_ref(site_id, book),
+            indicator_value,
+            indicator_num,
+            indicator_unit,
+            extra_json,
+        )
+
+    def check_not_archived(self, fetch_date):
+        """
+        日期所在月份已归档时拒绝写入：API从归档文件读取该月数据，写入热数据库的行不会被查询到
+        """
+        partition = archive.find_partition(self.conn, fetch_date)
+        if partition is not None:
+            raise ValueError(
+                f"{partition[0]} 的榜单快照已归档到 {partition[1]}，不能再写入热数据库"
+            )
+
+    def save_ranking_data(self, site_id, ranking_type_id, fetch_date, book_data):
+        """保存榜单数据，日期所在月份已归档时返回False"""
         try:
-            self.cursor.execute(
-                """
-            INSERT INTO rankings 
-            (site_id, ranking_type_id, fetch_date, book_id, rank, title, author, 
-            book_url, category, indicator_value, indicator_unit, cover_url, 
-            latest_chapter, creation_status, extra_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    site_id,
-                    ranking_type_id,
-                    fetch_date,
-                    book_id,
-                    rank,
-                    title,
-                    author,
-                    book_url,
-                    category,
-                    indicator_value,
-                    indicator_unit,
-                    cover_url,
-                    latest_chapter,
-                    creation_status,
-                    extra_json,
-                ),
+            self.check_not_archived(fetch_date)
+            row = self.build_ranking_row(
+                site_id, ranking_type_id, fetch_date, book_data
             )
+            self.cursor.execute(self._insert_ranking_sql(), row)
+            self._update_latest_snapshot(site_id, ranking_type_id, fetch_date)
             return True
         except Exception as e:
             logger.error(f"保存榜单数据失败: {str(e)} - {book_data}")
             return False
 
-    def log_fetch_activity(self, site_id, status, message="", items_fetched=0):
-        """记录抓取活动日志"""
+    def _insert_ranking_sql(self):
+        """有唯一索引时使用upsert，否则退回普通插入"""
+        return UPSERT_RANKING_SQL if self.has_unique_rank_index else INSERT_RANKING_SQL
+
+    def save_ranking_batch(
+        self, site_id, ranking_type_id, fetch_date, books, replace_snapshot=True
+    ):
+        """
+        批量保存一个榜单的数据
+        books可以是列表或生成器，逐条转换为行元组后直接交给executemany，在同一个事务中写入
+        replace_snapshot为True时先删除该榜单当天的旧数据，使重复抓取以新快照为准；
+        为False时按排名upsert
+        日期所在月份已归档时抛出ValueError
+        返回 (写入条数, 拒绝条数)
+        """
+        self.check_not_archived(fetch_date)
+        counts = {"built": 0, "rejected": 0}
+
+        def iter_rows():
+            # 同一榜单中只有部分书籍显示指标单位时(如起点月票榜只有第一名带"月票")，其余书籍沿用该单位
+            batch_unit = ""
+            iterator = iter(books)
+            # 每次取出一批书籍，先一次查询读取其中已有的书籍和作者
+            while True:
+                chunk = list(itertools.islice(iterator, BOOK_PRELOAD_SIZE))
+                if not chunk:
+                    break
+                self.preload_books(site_id, chunk)
+                for book_data in chunk:
+                    indicator = indicator_fields(book_data, batch_unit)
+                    batch_unit = indicator[2] or batch_unit
+                    try:
+                        row = self.build_ranking_row(
+                            site_id, ranking_type_id, fetch_date, book_data, indicator
+                        )
+                    except ValueError as e:
+                        logger.warning(f"跳过无效榜单数据: {str(e)} - {book_data}")
+                        counts["rejected"] += 1
+                        continue
+                    counts["built"] += 1
+                    yield row
+
+        rows = iter_rows()
+        # 没有任何有效数据时不写入，保留已有的快照
+        first_row = next(rows, None)
+        if first_row is None:
+            return 0, counts["rejected"]
+
+        try:
+            # 每个榜单一个事务，出错时整体回滚；在外层事务中时只回滚该榜单的写入
+            with self.transaction():
+                if replace_snapshot:
+                    self.cursor.execute(
+                        "DELETE FROM rankings WHERE ranking_type_id = ? AND fetch_date = ?",
+                        (ranking_type_id, fetch_date),
+                    )
+                self.cursor.executemany(
+                    self._insert_ranking_sql(), itertools.chain([first_row], rows)
+                )
+                self._update_latest_snapshot(site_id, ranking_type_id, fetch_date)
+        except sqlite3.Error as e:
+            logger.error(f"批量保存榜单数据失败: {str(e)}")
+            return 0, counts["rejected"] + counts["built"]
+
+        return counts["built"], counts["rejected"]
+
+    def _update_latest_snapshot(self, site_id, ranking_type_id, fetch_date):
+        """写入榜单数据后更新latest_snapshot，补录历史数据时不会回退日期"""
+        self.cursor.execute(
+            """
+        INSERT INTO latest_snapshot
+        (site_id, ranking_type_id, fetch_date, row_count, updated_at)
+        SELECT ?, ?, ?, COUNT(*), CURRENT_TIMESTAMP
+        FROM rankings WHERE ranking_type_id = ? AND fetch_date = ?
+        ON CONFLICT (site_id, ranking_type_id) DO UPDATE SET
+        fetch_date = excluded.fetch_date, row_count = excluded.row_count,
+        updated_at = excluded.updated_at
+        WHERE excluded.fetch_date >= latest_snapshot.fetch_date
+        """,
+            (site_id, ranking_type_id, fetch_date, ranking_type_id, fetch_date),
+        )
+
+    def bump_generation(self):
+        """递增数据版本号并记录更新时间(Unix时间戳)，与本次写入一同提交"""
+        self.cursor.execute(
+            """
+        INSERT INTO meta (key, value) VALUES ('generation', 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1
+        """
+        )
+        self.cursor.execute(
+            """
+        INSERT OR REPLACE INTO meta (key, value)
+        VALUES ('generation_time', CAST(strftime('%s', 'now') AS INTEGER))
+        """
+        )
+
+    def log_fetch_activity(
+        self,
+        site_id,
+        status,
+        message="",
+        items_fetched=0,
+        fetch_seconds=None,
+        parse_seconds=None,
+        save_seconds=None,
+        bytes_downloaded=None,
+        retry_count=None,
+        rows_rejected=None,
+        row_counts=None,
+    ):
+        """
+        记录抓取活动日志
+        各阶段耗时(秒)、下载字节数、重试次数和拒绝条数为可选的结构化统计，
+        row_counts为 {榜单类型: 写入条数}，以JSON保存
+        """
         try:
             self.cursor.execute(
                 """
-            INSERT INTO fetch_logs (site_id, status, message, items_fetched)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO fetch_logs (
+                site_id, status, message, items_fetched, fetch_seconds, parse_seconds,
+                save_seconds, bytes_downloaded, retry_count, rows_rejected, row_counts
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
-                (site_id, status, message, items_fetched),
+                (
+                    site_id,
+                    status,
+                    message,
+                    items_fetched,
+                    fetch_seconds,
+                    parse_seconds,
+                    save_seconds,
+                    bytes_downloaded,
+                    retry_count,
+                    rows_rejected,
+                    (
+                        json.dumps(row_counts, ensure_ascii=False)
+                        if row_counts is not None
+                        else None
+                    ),
+                ),
             )
             self.conn.commit()
             return True
@@ -400,6 +1190,16 @@ class BooklistDatabase:
 class SiteAdapter:
     """站点适配器基类"""
 
+    # 异步抓取时该站点的最大并发请求数和每秒请求数(None表示不限速)
+    async_concurrency = 4
+    async_rate = None
+
+    # 是否使用抓取缓存，页面或榜单数据没有变化时跳过解析和写入
+    use_fetch_cache = True
+
+    # 列式快照的根目录，设置后每次写入的榜单快照同时写入Parquet文件(需要安装pyarrow)
+    parquet_dir = columnar.PARQUET_DIR
+
     def __init__(
         self, site_id, site_code, site_name, site_url, fetch_type, api_url, db
     ):
@@ -411,6 +1211,14 @@ class SiteAdapter:
         self.api_url = api_url
         self.db = db
         self.today = datetime.now().strftime("%Y-%m-%d")
+        # 保存成功后才写入抓取缓存的条目
+        self.pending_cache_entries = {}
+        # 写入时才消费的流式解析耗时，从save阶段中扣除
+        self.lazy_parse_seconds = 0.0
+        # 本次抓取的统计，写入fetch_logs后清零；番茄小说分页在多个线程中累计
+        self._stats_lock = threading.Lock()
+        self.save_start = None
+        self.reset_run_stats()
 
     def fetch_data(self):
         """抓取数据，由子类实现"""
@@ -420,58 +1228,331 @@ class SiteAdapter:
         """处理数据，由子类实现"""
         raise NotImplementedError("子类必须实现process_data方法")
 
+    async def fetch_data_async(self, fetcher):
+        """
+        异步抓取数据，fetcher为http_client.AsyncSiteFetcher
+        子类没有异步实现时，在线程池中执行同步的fetch_data
+        """
+        return await asyncio.to_thread(self.fetch_data)
+
+    def get_cache_entry(self, key):
+        """获取今天已保存到数据库的抓取缓存条目"""
+        if not self.use_fetch_cache:
+            return None
+        entry = http_client.get_fetch_cache().get(key)
+        if entry and entry.get("saved_date") == self.today:
+            return entry
+        return None
+
+    def conditional_headers(self, url, headers=None):
+        """今天已保存过该页面时，在请求头中加入条件请求的验证信息"""
+        headers = dict(headers or {})
+        entry = self.get_cache_entry(url)
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def check_changed(self, url, response):
+        """根据响应状态码和内容哈希判断页面是否变化，变化时记录待写入的缓存条目"""
+        if response.status_code == 304:
+            return False
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        entry = self.get_cache_entry(url)
+        if entry and entry.get("content_hash") == content_hash:
+            return False
+        self.pending_cache_entries[url] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": content_hash,
+        }
+        return True
+
+    def fetch_if_changed(self, url, headers=None):
+        """
+        使用条件请求抓取页面
+        返回页面文本；内容自今天上次保存以来没有变化时返回NOT_MODIFIED；请求失败时返回None
+        """
+        with self.phase("fetch"):
+            response = http_client.get(
+                url, headers=self.conditional_headers(url, headers)
+            )
+        self.record_response(response)
+        if response.status_code not in (200, 304):
+            logger.error(f"请求 {url} 失败，状态码: {response.status_code}")
+            return None
+        if not self.check_changed(url, response):
+            return NOT_MODIFIED
+        response.encoding = "utf-8"
+        return response.text
+
+    async def fetch_if_changed_async(self, fetcher, url, headers=None):
+        """fetch_if_changed的异步版本"""
+        with self.phase("fetch"):
+            response = await fetcher.get(
+                url, headers=self.conditional_headers(url, headers)
+            )
+        self.record_response(response)
+        if response.status_code not in (200, 304):
+            logger.error(f"请求 {url} 失败，状态码: {response.status_code}")
+            return None
+        if not self.check_changed(url, response):
+            return NOT_MODIFIED
+        response.encoding = "utf-8"
+        return response.text
+
+    def reset_run_stats(self):
+        """清零本次抓取的统计，键与log_fetch_activity的参数对应"""
+        self.run_stats = {
+            "fetch_seconds": 0.0,
+            "parse_seconds": 0.0,
+            "save_seconds": 0.0,
+            "bytes_downloaded": 0,
+            "retry_count": 0,
+            "rows_rejected": 0,
+            "row_counts": {},
+        }
+
+    def add_run_stat(self, key, amount):
+        with self._stats_lock:
+            self.run_stats[key] += amount
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """记录抓取阶段耗时的上下文管理器，name为fetch/parse"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.CRAWL_PHASE_SECONDS.observe(
+                elapsed, site=self.site_code, phase=name
+            )
+            self.add_run_stat(f"{name}_seconds", elapsed)
+
+    def record_response(self, response):
+        """累计下载的字节数和重试次数"""
+        size = len(response.content)
+        metrics.CRAWL_BYTES.inc(size, site=self.site_code)
+        self.add_run_stat("bytes_downloaded", size)
+        self.add_run_stat("retry_count", http_client.retry_count(response))
+
+    def timed_parse(self, iterable):
+        """
+        包装流式解析的迭代器，迭代耗时计入parse阶段
+        这类迭代器在写入时才被消费，其耗时会从save阶段中扣除
+        """
+        iterator = iter(iterable)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            self.lazy_parse_seconds += elapsed
+            metrics.CRAWL_PHASE_SECONDS.observe(
+                elapsed, site=self.site_code, phase="parse"
+            )
+            self.add_run_stat("parse_seconds", elapsed)
+
+    def commit_fetch_cache(self):
+        """数据保存成功后写入抓取缓存"""
+        if not self.use_fetch_cache or not self.pending_cache_entries:
+            return
+        for entry in self.pending_cache_entries.values():
+            entry["saved_date"] = self.today
+        http_client.get_fetch_cache().update(self.pending_cache_entries)
+        self.pending_cache_entries = {}
+
+    def write_parquet_snapshots(self, ranking_types):
+        """
+        将本次写入的各榜单当天快照写入Parquet文件，ranking_types为 (榜单代码, ranking_type_id) 列表
+        数据已提交到SQLite，写入失败只记录日志
+        """
+        start = time.perf_counter()
+        try:
+            for type_code, ranking_type_id in ranking_types:
+                columnar.write_snapshot(
+                    self.db.conn,
+                    self.parquet_dir,
+                    self.site_code,
+                    type_code,
+                    ranking_type_id,
+                    self.today,
+                )
+        except Exception as e:
+            logger.error(f"{self.site_name} 写入Parquet快照失败: {str(e)}")
+        metrics.CRAWL_PHASE_SECONDS.observe(
+            time.perf_counter() - start, site=self.site_code, phase="parquet"
+        )
+
+    def hash_books(self, hasher, ranking_type, books):
+        """
+        逐条产出书籍数据，同时将其累加到hasher中
+        写入完成后得到整次抓取的榜单数据哈希，不需要先取出全部数据
+        """
+        hasher.update(json.dumps(ranking_type, ensure_ascii=False).encode("utf-8"))
+        for book in books:
+            hasher.update(
+                json.dumps(
+                    book, ensure_ascii=False, sort_keys=True, default=str
+                ).encode("utf-8")
+            )
+            hasher.update(b"\n")
+            yield book
+
     def fetch_and_save(self):
         """抓取和保存数据"""
+        return self.save_fetched_data(self.fetch_data())
+
+    async def fetch_and_save_async(self, fetcher):
+        """异步抓取和保存数据，数据库写入在事件循环所在的线程中完成"""
+        return self.save_fetched_data(await self.fetch_data_async(fetcher))
+
+    def save_fetched_data(self, data):
+        """处理并保存已抓取的数据
+
+        与fetch_data分离，使并发模式下网络抓取可以在工作线程中进行，
+        而数据库写入始终在持有数据库连接的线程中完成
+        """
+        self.lazy_parse_seconds = 0.0
+        self.save_start = None if data is NOT_MODIFIED else time.perf_counter()
+        success = self._save_fetched_data(data)
+        metrics.CRAWL_RUNS.inc(
+            site=self.site_code, status="success" if success else "failure"
+        )
+        return success
+
+    def log_run(self, status, message="", items_fetched=0):
+        """记录本次抓取的日志，附带各阶段耗时、下载字节数、重试次数和各榜单写入条数"""
+        if self.save_start is not None:
+            save_seconds = (
+                time.perf_counter() - self.save_start - self.lazy_parse_seconds
+            )
+            metrics.CRAWL_PHASE_SECONDS.observe(
+                save_seconds, site=self.site_code, phase="save"
+            )
+            self.run_stats["save_seconds"] = save_seconds
+            self.save_start = None
+        self.db.log_fetch_activity(
+            self.site_id, status, message, items_fetched, **self.run_stats
+        )
+        self.reset_run_stats()
+
+    def _save_fetched_data(self, data):
         try:
-            # 抓取数据
-            data = self.fetch_data()
+            if data is NOT_MODIFIED:
+                logger.info(f"{self.site_name} 页面内容没有变化，跳过解析和写入")
+                self.log_run("未变化", "页面内容没有变化", 0)
+                return True
+
             if not data:
-                self.db.log_fetch_activity(self.site_id, "失败", "抓取数据为空", 0)
+                self.log_run("失败", "抓取数据为空", 0)
                 return False
 
             # 处理数据
             processed_data = self.process_data(data)
             if not processed_data:
-                self.db.log_fetch_activity(self.site_id, "失败", "处理数据为空", 0)
+                self.log_run("失败", "处理数据为空", 0)
+                return False
+            if isinstance(processed_data, dict):
+                processed_data = processed_data.items()
+
+            data_key = f"data:{self.site_code}"
+            entry = self.get_cache_entry(data_key)
+            hasher = hashlib.sha256()
+            saved_types = []
+            try:
+                # 流式解析的榜单边解析边写入，内存中只有一个榜单的数据；
+                # 所有榜单在一个事务中写入，解析或写入中途出错时整体回滚
+                with self.db.transaction():
+                    for ranking_type, books in processed_data:
+                        # 获取或创建榜单类型
+                        ranking_type_id = self.db.get_ranking_type_id(
+                            self.site_id, ranking_type
+                        )
+                        if not ranking_type_id:
+                            self.db.add_or_update_ranking_type(
+                                self.site_id,
+                                ranking_type,
+                                ranking_type,
+                                "",
+                                f"{self.site_name} {ranking_type}",
+                            )
+                            ranking_type_id = self.db.get_ranking_type_id(
+                                self.site_id, ranking_type
+                            )
+
+                        # 批量保存书籍数据
+                        inserted, rejected = self.db.save_ranking_batch(
+                            self.site_id,
+                            ranking_type_id,
+                            self.today,
+                            self.hash_books(hasher, ranking_type, books),
+                        )
+                        saved_types.append(
+                            (ranking_type, ranking_type_id, inserted, rejected)
+                        )
+
+                    # 页面有变化但榜单数据与今天已保存的相同时，回滚本次写入
+                    data_hash = hasher.hexdigest()
+                    if entry and entry.get("content_hash") == data_hash:
+                        raise DataUnchanged()
+                    # 递增数据版本号使API缓存失效，与榜单数据一同提交
+                    if saved_types:
+                        self.db.bump_generation()
+            except DataUnchanged:
+                logger.info(f"{self.site_name} 榜单数据没有变化，跳过写入")
+                self.log_run("未变化", "榜单数据没有变化", 0)
+                self.commit_fetch_cache()
+                return True
+
+            if not saved_types:
+                self.log_run("失败", "处理数据为空", 0)
                 return False
 
-            # 保存数据
             total_items = 0
-            for ranking_type, books in processed_data.items():
-                # 获取或创建榜单类型
-                ranking_type_id = self.db.get_ranking_type_id(
-                    self.site_id, ranking_type
+            for ranking_type, ranking_type_id, inserted, rejected in saved_types:
+                metrics.CRAWL_ROWS_INSERTED.inc(
+                    inserted, site=self.site_code, ranking_type=ranking_type
                 )
-                if not ranking_type_id:
-                    self.db.add_or_update_ranking_type(
-                        self.site_id,
-                        ranking_type,
-                        ranking_type,
-                        "",
-                        f"{self.site_name} {ranking_type}",
-                    )
-                    ranking_type_id = self.db.get_ranking_type_id(
-                        self.site_id, ranking_type
-                    )
-
-                # 保存书籍数据
-                for book in books:
-                    self.db.save_ranking_data(
-                        self.site_id, ranking_type_id, self.today, book
+                metrics.CRAWL_ROWS_REJECTED.inc(
+                    rejected, site=self.site_code, ranking_type=ranking_type
+                )
+                self.run_stats["row_counts"][ranking_type] = inserted
+                self.run_stats["rows_rejected"] += rejected
+                if rejected:
+                    logger.warning(
+                        f"{self.site_name} {ranking_type}: 写入 {inserted} 条，拒绝 {rejected} 条"
                     )
-                    total_items += 1
+                total_items += inserted
 
             # 记录抓取日志
-            self.db.log_fetch_activity(
-                self.site_id, "成功", f"已抓取 {total_items} 条数据", total_items
-            )
-            self.db.conn.commit()
-
+            self.pending_cache_entries[data_key] = {"content_hash": data_hash}
+            self.log_run("成功", f"已抓取 {total_items} 条数据", total_items)
+            self.commit_fetch_cache()
+
+            if self.parquet_dir:
+                self.write_parquet_snapshots(
+                    [
+                        (ranking_type, ranking_type_id)
+                        for ranking_type, ranking_type_id, _, _ in saved_types
+                    ]
+                )
             return True
         except Exception as e:
             logger.error(f"抓取和保存数据失败: {str(e)}")
             logger.error(traceback.format_exc())
-            self.db.log_fetch_activity(self.site_id, "失败", f"异常: {str(e)}", 0)
+            # 写入已整体回滚
+            self.log_run("失败", f"异常: {str(e)}", 0)
             return False
 
 
@@ -481,37 +1562,49 @@ class CiweimaoAdapter(SiteAdapter):
     def fetch_data(self):
         """抓取刺猬猫数据"""
         try:
-            # 导入刺猬猫模块
-            ciwei_module = importlib.import_module("ciwei")
-
-            # 调用ciwei.py中的函数获取数据
-            html_content = ciwei_module.get_webpage_content(self.site_url)
+            # 页面没有变化时跳过解析
+            html_content = self.fetch_if_changed(self.site_url)
+            if html_content is NOT_MODIFIED:
+                return NOT_MODIFIED
             if not html_content:
                 logger.error("获取刺猬猫网页内容失败")
                 return None
 
-            # 解析HTML
-            from lxml import etree
-
-            html_tree = etree.HTML(html_content)
-
-            # 解析三个榜单数据
-            weekly_clicks = ciwei_module.parse_weekly_clicks(html_tree)
-            monthly_votes = ciwei_module.parse_monthly_votes(html_tree)
-            new_books = ciwei_module.parse_new_books(html_tree)
-
-            # 组装最终数据
-            results = {
-                "weekly_clicks": weekly_clicks,
-                "monthly_votes": monthly_votes,
-                "new_books": new_books,
-            }
-            return results
+            with self.phase("parse"):
+                return self.parse_html(html_content)
         except Exception as e:
             logger.error(f"抓取刺猬猫数据失败: {str(e)}")
             logger.error(traceback.format_exc())
             return None
 
+    async def fetch_data_async(self, fetcher):
+        """异步抓取刺猬猫数据，HTML解析在线程池中进行"""
+        try:
+            html_content = await self.fetch_if_changed_async(fetcher, self.site_url)
+            if html_content is NOT_MODIFIED:
+                return NOT_MODIFIED
+            if not html_content:
+                logger.error("获取刺猬猫网页内容失败")
+                return None
+            with self.phase("parse"):
+                return await asyncio.to_thread(self.parse_html, html_content)
+        except Exception as e:
+            logger.error(f"异步抓取刺猬猫数据失败: {str(e)}")
+            logger.error(traceback.format_exc())
+            return None
+
+    def parse_html(self, html_content):
+        """解析刺猬猫首页HTML中的榜单数据"""
+        ciwei_module = importlib.import_module("ciwei")
+
+        # 解析HTML
+        from lxml import etree
+
+        html_tree = etree.HTML(html_content)
+
+        # 一次遍历解析所有榜单，结果以榜单key(weekly_clicks等)为键
+        return ciwei_module.parse_rankings(html_tree)
+
     def process_data(self, data):
         """处理刺猬猫数据"""
         if not data:
@@ -544,30 +1637,63 @@ class QidianAdapter(SiteAdapter):
             # 导入起点模块
             qidian_module = importlib.import_module("qidian")
 
-            # 调用qidian.py中的函数获取数据
-            html_content = qidian_module.fetch_qidian()
+            # 页面没有变化时跳过解析
+            html_content = self.fetch_if_changed(
+                qidian_module.QIDIAN_URL, headers=qidian_module.get_headers()
+            )
+            if html_content is NOT_MODIFIED:
+                return NOT_MODIFIED
             if not html_content:
                 logger.error("获取起点中文网网页内容失败")
                 return None
 
-            # 解析榜单数据
-            rankings = qidian_module.parse_ranking_list(html_content)
-
-            return rankings
+            # 返回流式解析的迭代器，由写入线程逐个榜单解析并写入，不在抓取线程中解析
+            return self.timed_parse(qidian_module.iter_ranking_lists(html_content))
         except Exception as e:
             logger.error(f"抓取起点中文网数据失败: {str(e)}")
             logger.error(traceback.format_exc())
             return None
 
+    async def fetch_data_async(self, fetcher):
+        """异步抓取起点中文网数据，HTML解析在线程池中进行"""
+        try:
+            qidian_module = importlib.import_module("qidian")
+
+            html_content = await self.fetch_if_changed_async(
+                fetcher, qidian_module.QIDIAN_URL, headers=qidian_module.get_headers()
+            )
+            if html_content is NOT_MODIFIED:
+                return NOT_MODIFIED
+            if not html_content:
+                logger.error("获取起点中文网网页内容失败")
+                return None
+
+            # 在线程池中完成流式解析，避免阻塞事件循环
+            with self.phase("parse"):
+                return await asyncio.to_thread(
+                    lambda: list(qidian_module.iter_ranking_lists(html_content))
+                )
+        except Exception as e:
+            logger.error(f"异步抓取起点中文网数据失败: {str(e)}")
+            logger.error(traceback.format_exc())
+            return None
+
     def process_data(self, data):
-        """处理起点中文网数据"""
+        """
+        处理起点中文网数据
+        data可以是 {榜单名称: 榜单信息} 字典，也可以是逐个生成 (榜单名称, 榜单信息) 的迭代器，
+        返回逐个生成 (榜单代码, 书籍列表) 的生成器
+        """
         if not data:
             return None
+        if isinstance(data, dict):
+            data = data.items()
+        return self.iter_processed_rankings(data)
 
-        processed_data = {}
-
+    def iter_processed_rankings(self, rankings):
+        """逐个处理榜单，每个榜单处理完成后立即交给调用方写入"""
         # 遍历所有榜单
-        for rank_name, rank_data in data.items():
+        for rank_name, rank_data in rankings:
             # 创建榜单代码，去除空格和特殊字符
             rank_code = rank_name.strip().replace(" ", "_").lower()
 
@@ -580,8 +1706,6 @@ class QidianAdapter(SiteAdapter):
 
                 processed_books.append(book)
 
-            processed_data[rank_code] = processed_books
-
             # 添加或更新榜单类型
             self.db.add_or_update_ranking_type(
                 self.site_id,
@@ -591,140 +1715,198 @@ class QidianAdapter(SiteAdapter):
                 f"起点中文网 {rank_name}",
             )
 
-        return processed_data
+            yield rank_code, processed_books
+
+
+class FanqiePages(list):
+    """番茄小说分页抓取的结果，每个元素是一页的书籍列表"""
+
+    # 中途有一页请求失败时为True，此时榜单不完整，不能用来替换当天已有的快照
+    failed = False
 
 
 class FanqieAdapter(SiteAdapter):
     """番茄小说适配器"""
 
-    def fetch_data(self):
-        """抓取番茄小说数据"""
+    headers = {
+        "Referer": "https://fanqienovel.com/",
+        "Accept": "application/json, text/plain, */*",
+    }
+
+    # 同时请求的页数和最多抓取的页数
+    page_workers = 4
+    max_pages = 50
+
+    @property
+    def page_size(self):
+        """每页条数，取api_url中的limit参数"""
+        query = dict(parse_qsl(urlsplit(self.api_url).query))
+        return int(query.get("limit", 200))
+
+    def page_url(self, offset):
+        """构造指定偏移量的分页URL"""
+        parts = urlsplit(self.api_url)
+        query = dict(parse_qsl(parts.query))
+        query["limit"] = str(self.page_size)
+        query["offset"] = str(offset)
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def page_batches(self):
+        """按page_workers分批生成各页的偏移量"""
+        for start in range(0, self.max_pages, self.page_workers):
+            end = min(start + self.page_workers, self.max_pages)
+            yield [page * self.page_size for page in range(start, end)]
+
+    def collect_pages(self, pages, results):
+        """
+        按顺序收集一批分页结果，返回是否应停止翻页
+        不足一页时视为到达榜单末尾；某一页请求失败时停止翻页并将pages标记为失败
+        """
+        for books in results:
+            if books is None:
+                pages.failed = True
+                return True
+            pages.append(books)
+            if len(books) < self.page_size:
+                return True
+        return False
+
+    def log_incomplete(self, pages):
+        """翻页中途失败时放弃本次抓取，避免不完整的榜单覆盖当天已保存的完整快照"""
+        logger.error(
+            f"番茄小说第 {len(pages) + 1} 页请求失败，放弃本次抓取，保留已有快照"
+        )
+
+    def fetch_page(self, offset):
+        """抓取一页数据，失败时返回None"""
         try:
-            # 尝试直接使用requests获取数据，添加请求头
-            import requests
-
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-                "Referer": "https://fanqienovel.com/",
-                "Accept": "application/json, text/plain, */*",
-            }
-
-            # 添加重试机制
-            max_retries = 3
-            retry_count = 0
-            while retry_count < max_retries:
-                try:
-                    response = requests.get(self.api_url, headers=headers, timeout=10)
-                    response.raise_for_status()  # 检查HTTP错误
-                    return response.json()
-                except (requests.RequestException, json.JSONDecodeError) as e:
-                    logger.warning(
-                        f"番茄小说API请求失败，正在重试 ({retry_count+1}/{max_retries}): {str(e)}"
-                    )
-                    retry_count += 1
-                    time.sleep(2)  # 等待2秒后重试
+            response = http_client.get(self.page_url(offset), headers=self.headers)
+            self.record_response(response)
+            response.raise_for_status()  # 检查HTTP错误
+            return self.extract_book_list(response.json())
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"番茄小说API请求失败 (offset={offset}): {str(e)}")
+            return None
 
-            # 如果所有重试都失败，尝试使用fanqie模块
-            logger.info("尝试使用fanqie模块获取数据")
-            fanqie_module = importlib.import_module("fanqie")
-            return fanqie_module.getJson()
+    async def fetch_page_async(self, fetcher, offset):
+        """异步抓取一页数据，失败时返回None"""
+        try:
+            response = await fetcher.get(self.page_url(offset), headers=self.headers)
+            self.record_response(response)
+            response.raise_for_status()
+            return self.extract_book_list(response.json())
+        except Exception as e:
+            logger.warning(f"番茄小说API请求失败 (offset={offset}): {str(e)}")
+            return None
 
+    def fetch_data(self):
+        """并发翻页抓取番茄小说完整榜单"""
+        try:
+            # 共享Session自带超时和指数退避重试
+            pages = FanqiePages()
+            with self.phase("fetch"), ThreadPoolExecutor(
+                max_workers=self.page_workers
+            ) as executor:
+                for offsets in self.page_batches():
+                    results = list(executor.map(self.fetch_page, offsets))
+                    if self.collect_pages(pages, results):
+                        break
+            if pages.failed:
+                self.log_incomplete(pages)
+                return None
+            logger.info(f"番茄小说共抓取 {len(pages)} 页数据")
+            return pages or None
         except Exception as e:
             logger.error(f"抓取番茄小说数据失败: {str(e)}")
             logger.error(traceback.format_exc())
             return None
 
-    def process_data(self, data):
-        """处理番茄小说数据"""
-        if not data:
-            logger.error("番茄小说数据为空")
+    async def fetch_data_async(self, fetcher):
+        """异步并发翻页抓取番茄小说完整榜单，并发数由fetcher限制"""
+        try:
+            pages = FanqiePages()
+            with self.phase("fetch"):
+                for offsets in self.page_batches():
+                    results = await asyncio.gather(
+                        *(self.fetch_page_async(fetcher, offset) for offset in offsets)
+                    )
+                    if self.collect_pages(pages, results):
+                        break
+            if pages.failed:
+                self.log_incomplete(pages)
+                return None
+            return pages or None
+        except Exception as e:
+            logger.error(f"异步抓取番茄小说数据失败: {str(e)}")
+            logger.error(traceback.format_exc())
             return None
 
-        # 输出API返回的数据结构，以便调试
-        logger.info(
-            f"番茄小说API返回数据结构: {json.dumps(data, ensure_ascii=False)[:200]}..."
+    def extract_book_list(self, data):
+        """从API响应中提取书籍列表，格式无法识别时返回None"""
+        if isinstance(data, dict):
+            # 方式1: 标准API格式
+            if "data" in data and "book_list" in data["data"]:
+                return data["data"]["book_list"]
+            # 方式2: 可能是直接返回书籍列表
+            if "book_list" in data:
+                return data["book_list"]
+        elif isinstance(data, list):
+            # 方式3: 直接是列表格式
+            return data
+
+        # 记录数据结构，以便分析
+        logger.error(
+            f"番茄小说数据格式不符合预期: {json.dumps(data, ensure_ascii=False)[:500]}"
         )
+        return None
 
-        processed_data = {}
+    def iter_ranked_books(self, pages):
+        """
+        按页顺序合并分页数据并生成全局排名，逐条产出供批量写入使用
+        翻页期间榜单变动可能导致同一本书出现在相邻两页，只保留第一次出现的位置
+        """
+        rank = 0
+        seen = set()
+        for page in pages:
+            for book in page:
+                book_id = book.get("book_id", "")
+                if book_id and book_id in seen:
+                    continue
+                seen.add(book_id)
+                rank += 1
+                yield {
+                    "rank": rank,
+                    "book_id": book_id,
+                    "title": book.get("book_name", book.get("title", "")),
+                    "author": book.get("author", ""),
+                    "category": book.get("category", ""),
+                    "creation_status": book.get("creation_status", 0),
+                    "cover_url": book.get("thumb_url", book.get("cover_url", "")),
+                    "rank_score": book.get("rank_score", ""),
+                }
 
-        try:
-            # 尝试不同的数据格式处理方式
-            if isinstance(data, dict):
-                # 方式1: 标准API格式
-                if "data" in data and "book_list" in data["data"]:
-                    books = []
-                    for i, book in enumerate(data["data"]["book_list"], 1):
-                        book_data = {
-                            "rank": i,
-                            "book_id": book.get("book_id", ""),
-                            "title": book.get("book_name", ""),
-                            "author": book.get("author", ""),
-                            "category": book.get("category", ""),
-                            "creation_status": book.get("creation_status", 0),
-                            "cover_url": book.get("thumb_url", ""),
-                            "rank_score": book.get("rank_score", ""),
-                        }
-                        books.append(book_data)
-
-                    processed_data["hot_list"] = books
-                    logger.info(f"成功处理番茄小说热门榜数据: {len(books)} 条")
-                    return processed_data
-                # 方式2: 可能是直接返回书籍列表
-                elif "book_list" in data:
-                    books = []
-                    for i, book in enumerate(data["book_list"], 1):
-                        book_data = {
-                            "rank": i,
-                            "book_id": book.get("book_id", ""),
-                            "title": book.get("book_name", ""),
-                            "author": book.get("author", ""),
-                            "category": book.get("category", ""),
-                            "creation_status": book.get("creation_status", 0),
-                            "cover_url": book.get("thumb_url", ""),
-                            "rank_score": book.get("rank_score", ""),
-                        }
-                        books.append(book_data)
-
-                    processed_data["hot_list"] = books
-                    logger.info(f"成功处理番茄小说热门榜数据(方式2): {len(books)} 条")
-                    return processed_data
-                else:
-                    # 记录数据结构，以便分析
-                    logger.error(
-                        f"番茄小说数据格式不符合预期: {json.dumps(data, ensure_ascii=False)[:500]}"
-                    )
-            elif isinstance(data, list):
-                # 方式3: 直接是列表格式
-                books = []
-                for i, book in enumerate(data, 1):
-                    book_data = {
-                        "rank": i,
-                        "book_id": book.get("book_id", ""),
-                        "title": book.get("book_name", book.get("title", "")),
-                        "author": book.get("author", ""),
-                        "category": book.get("category", ""),
-                        "creation_status": book.get("creation_status", 0),
-                        "cover_url": book.get("thumb_url", book.get("cover_url", "")),
-                        "rank_score": book.get("rank_score", ""),
-                    }
-                    books.append(book_data)
-
-                processed_data["hot_list"] = books
-                logger.info(f"成功处理番茄小说热门榜数据(列表格式): {len(books)} 条")
-                return processed_data
-
-            # 如果上面的所有方法都失败了，创建一个空榜单
-            logger.warning("无法识别番茄小说数据格式，创建空榜单")
-            processed_data["hot_list"] = []
-            return processed_data
+    def process_data(self, data):
+        """处理番茄小说数据"""
+        if not data:
+            logger.error("番茄小说数据为空")
+            return None
 
-        except Exception as e:
-            logger.error(f"处理番茄小说数据时出错: {str(e)}")
-            logger.error(traceback.format_exc())
+        if isinstance(data, FanqiePages):
+            pages = data
+        else:
+            # 单个API响应，如fanqie模块返回的数据
+            logger.info(
+                f"番茄小说API返回数据结构: {json.dumps(data, ensure_ascii=False)[:200]}..."
+            )
+            book_list = self.extract_book_list(data)
+            if book_list is None:
+                # 无法识别数据格式时创建一个空榜单
+                logger.warning("无法识别番茄小说数据格式，创建空榜单")
+                return {"hot_list": []}
+            pages = [book_list]
 
-            # 出错时也创建一个空榜单，确保不会返回None
-            processed_data["hot_list"] = []
-            return processed_data
+        # 以生成器形式返回，写入时才合并，合并耗时计入parse阶段
+        return {"hot_list": self.timed_parse(self.iter_ranked_books(pages))}
 
 
 def get_adapter_for_site(site, db):
@@ -758,35 +1940,161 @@ def get_adapter_for_site(site, db):
         return None
 
 
-def main():
+def _timed_fetch(adapter):
+    """
+    在工作线程中抓取站点数据，返回数据和耗时(秒)
+    刺猬猫的解析在这里完成，计入抓取耗时；起点和番茄返回流式解析的迭代器，在写入时才解析
+    """
+    start = time.perf_counter()
+    try:
+        data = adapter.fetch_data()
+    except Exception as e:
+        logger.error(f"抓取 {adapter.site_name} 数据异常: {str(e)}")
+        logger.error(traceback.format_exc())
+        data = None
+    return data, time.perf_counter() - start
+
+
+def _timed_save(adapter, data, fetch_seconds):
+    """
+    在当前线程中保存站点数据，返回该站点的耗时统计
+    写入时才消费的流式解析在当前线程中进行，其耗时单独记为parse_seconds，不计入保存耗时
+    """
+    save_start = time.perf_counter()
+    success = adapter.save_fetched_data(data)
+    return {
+        "site_code": adapter.site_code,
+        "site_name": adapter.site_name,
+        "success": success,
+        "fetch_seconds": fetch_seconds,
+        "parse_seconds": adapter.lazy_parse_seconds,
+        "save_seconds": time.perf_counter() - save_start - adapter.lazy_parse_seconds,
+    }
+
+
+def fetch_sites_concurrently(adapters, max_workers=None):
+    """
+    并发抓取多个站点的榜单数据
+    各站点的fetch_data在线程池中并行执行，抓取完成后由当前线程依次写入数据库，
+    保证共享的数据库连接只被一个线程使用
+    起点和番茄的数据在写入线程中边解析边写入，内存中只保留一个榜单，
+    这部分解析与其他站点的写入串行执行，耗时在统计中单独列出
+    返回每个站点的耗时统计列表
+    """
+    timings = []
+    if not adapters:
+        return timings
+
+    max_workers = max_workers or len(adapters)
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="fetch"
+    ) as executor:
+        futures = {
+            executor.submit(_timed_fetch, adapter): adapter for adapter in adapters
+        }
+        # 先完成抓取的站点先写入
+        for future in as_completed(futures):
+            adapter = futures[future]
+            data, fetch_seconds = future.result()
+            timings.append(_timed_save(adapter, data, fetch_seconds))
+
+    return timings
+
+
+def fetch_sites_serially(adapters):
+    """逐个抓取站点的榜单数据，返回每个站点的耗时统计列表"""
+    timings = []
+    for adapter in adapters:
+        data, fetch_seconds = _timed_fetch(adapter)
+        timings.append(_timed_save(adapter, data, fetch_seconds))
+    return timings
+
+
+async def fetch_sites_async(adapters):
+    """
+    使用异步抓取引擎抓取多个站点的榜单数据
+    所有站点共享一个异步连接池，各站点按自身的async_concurrency和async_rate限流；
+    数据库写入都在事件循环所在的线程中完成
+    返回每个站点的耗时统计列表
+    """
+
+    async def run(adapter, client):
+        fetcher = http_client.AsyncSiteFetcher(
+            client, adapter.async_concurrency, adapter.async_rate
+        )
+        start = time.perf_counter()
+        try:
+            data = await adapter.fetch_data_async(fetcher)
+        except Exception as e:
+            logger.error(f"异步抓取 {adapter.site_name} 数据异常: {str(e)}")
+            logger.error(traceback.format_exc())
+            data = None
+        return _timed_save(adapter, data, time.perf_counter() - start)
+
+    async with http_client.create_async_client() as client:
+        return list(
+            await asyncio.gather(*(run(adapter, client) for adapter in adapters))
+        )
+
+
+def main(
+    concurrent=True,
+    max_workers=None,
+    use_async=False,
+    use_fetch_cache=True,
+    parquet_dir=columnar.PARQUET_DIR,
+):
     """主函数，抓取所有站点的榜单数据"""
     logger.info("开始抓取榜单数据...")
+    run_start = time.perf_counter()
 
-    # 初始化数据库
-    db = BooklistDatabase()
+    # 恢复之前运行累计的指标，本次运行结束后写回指标文件
+    metrics_path = metrics.crawl_metrics_path()
+    metrics.REGISTRY.restore_textfile(metrics_path)
+
+    # 初始化数据库，旧版本数据库需要先手动迁移
+    try:
+        db = BooklistDatabase()
+    except RuntimeError as e:
+        logger.error(str(e))
+        return
 
     try:
         # 获取所有启用的站点
         sites = db.get_active_sites()
         logger.info(f"找到 {len(sites)} 个启用的站点")
 
-        # 遍历站点并抓取数据
+        # 为每个站点创建适配器
+        adapters = []
         for site in sites:
-            site_id, site_name, site_url, site_code = site[0], site[1], site[2], site[3]
-            logger.info(f"开始抓取 {site_name} ({site_url}) 的榜单数据")
-
-            # 获取站点适配器
+            site_name, site_url = site[1], site[2]
             adapter = get_adapter_for_site(site, db)
             if not adapter:
                 logger.error(f"无法为站点 {site_name} 创建适配器")
                 continue
-
-            # 抓取和保存数据
-            success = adapter.fetch_and_save()
-            if success:
-                logger.info(f"成功抓取 {site_name} 榜单数据")
+            adapter.use_fetch_cache = use_fetch_cache
+            adapter.parquet_dir = parquet_dir
+            logger.info(f"开始抓取 {site_name} ({site_url}) 的榜单数据")
+            adapters.append(adapter)
+
+        # 抓取和保存数据
+        if use_async:
+            timings = asyncio.run(fetch_sites_async(adapters))
+        elif concurrent:
+            timings = fetch_sites_concurrently(adapters, max_workers)
+        else:
+            timings = fetch_sites_serially(adapters)
+
+        for timing in timings:
+            if timing["success"]:
+                logger.info(f"成功抓取 {timing['site_name']} 榜单数据")
             else:
-                logger.error(f"抓取 {site_name} 榜单数据失败")
+                logger.error(f"抓取 {timing['site_name']} 榜单数据失败")
+            logger.info(
+                f"{timing['site_name']} 耗时: 抓取 {timing['fetch_seconds']:.2f} 秒, "
+                f"写入时解析 {timing['parse_seconds']:.2f} 秒, "
+                f"保存 {timing['save_seconds']:.2f} 秒"
+            )
     except Exception as e:
         logger.error(f"程序运行异常: {str(e)}")
         logger.error(traceback.format_exc())
@@ -794,8 +2102,166 @@ def main():
         # 关闭数据库连接
         db.close()
 
-    logger.info("榜单数据抓取完成")
+    try:
+        metrics.REGISTRY.write_textfile(
+            metrics_path, prefix=metrics.CRAWL_METRICS_PREFIX
+        )
+    except OSError as e:
+        logger.error(f"写入指标文件失败: {str(e)}")
+
+    logger.info(f"榜单数据抓取完成，总耗时 {time.perf_counter() - run_start:.2f} 秒")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="抓取各站点榜单数据并保存到数据库")
+    parser.add_argument(
+        "--serial", action="store_true", help="逐个站点抓取，不使用并发模式"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="并发抓取的线程数，默认每个站点一个"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="使用异步抓取引擎(需要安装httpx)",
+    )
+    parser.add_argument(
+        "--no-fetch-cache",
+        dest="use_fetch_cache",
+        action="store_false",
+        help="忽略抓取缓存，强制重新解析和写入",
+    )
+    parser.add_argument(
+        "--parquet-dir",
+        default=columnar.PARQUET_DIR,
+        help="同时将榜单快照写入该目录下的Parquet文件(需要安装pyarrow)",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    compact_parser = subparsers.add_parser(
+        "compact", help="删除重复的榜单数据并创建唯一索引"
+    )
+    compact_parser.add_argument(
+        "--vacuum", action="store_true", help="压缩后执行VACUUM回收磁盘空间"
+    )
+    migrate_parser = subparsers.add_parser(
+        "migrate",
+        help="将旧版本数据库的书籍属性迁移到books和authors表(迁移前自动备份)，并升级表结构",
+    )
+    migrate_parser.add_argument(
+        "db_path", nargs="?", default="booklist.db", help="数据库文件路径"
+    )
+    migrate_parser.add_argument(
+        "--vacuum", action="store_true", help="迁移后执行VACUUM回收磁盘空间"
+    )
+    archive_parser = subparsers.add_parser(
+        "archive", help="将早于保留窗口的快照按月移动到归档文件"
+    )
+    archive_parser.add_argument(
+        "--keep-days",
+        type=int,
+        default=archive.ARCHIVE_KEEP_DAYS,
+        help="热数据库保留的天数，默认为%(default)s天",
+    )
+    archive_parser.add_argument(
+        "--vacuum", action="store_true", help="归档后执行VACUUM回收磁盘空间"
+    )
+    parquet_parser = subparsers.add_parser(
+        "parquet", help="将已有的榜单快照导出为Parquet文件(需要安装pyarrow)"
+    )
+    parquet_parser.add_argument(
+        "output_dir",
+        nargs="?",
+        default=columnar.PARQUET_DIR or "parquet",
+        help="Parquet文件根目录",
+    )
+    parquet_parser.add_argument("--start-date", help="起始日期(包含)，格式为YYYY-MM-DD")
+    parquet_parser.add_argument("--end-date", help="结束日期(包含)，格式为YYYY-MM-DD")
+    return parser.parse_args(argv)
+
+
+def compact(vacuum=False):
+    """压缩数据库中的重复榜单数据"""
+    db = BooklistDatabase()
+    try:
+        removed = db.compact_rankings(vacuum=vacuum)
+        print(f"已删除 {removed} 条重复榜单数据")
+    finally:
+        db.close()
+
+
+def migrate(db_path="booklist.db", vacuum=False):
+    """迁移旧版本数据库并升级表结构，迁移前先备份数据库文件"""
+    if not os.path.exists(db_path):
+        print(f"数据库文件不存在: {db_path}")
+        return
+    size_before = os.path.getsize(db_path)
+    db = BooklistDatabase(db_path, migrate=True)
+    try:
+        if not db.migrated_rows:
+            print("数据库已是新版本结构，无需迁移")
+        else:
+            print(
+                f"已迁移 {db.migrated_rows} 条榜单数据，迁移前的数据库已备份到 {db.backup_path}"
+            )
+        if vacuum:
+            db.conn.execute("VACUUM")
+            print(
+                f"数据库文件大小: {size_before / 1024:.0f}KB -> "
+                f"{os.path.getsize(db_path) / 1024:.0f}KB"
+            )
+    finally:
+        db.close()
+
+
+def archive_snapshots(keep_days=archive.ARCHIVE_KEEP_DAYS, vacuum=False):
+    """归档早于保留窗口的快照"""
+    db = BooklistDatabase()
+    try:
+        size_before = os.path.getsize(db.db_path)
+        archived = db.archive_old_snapshots(keep_days, vacuum=vacuum)
+        if not archived:
+            print(f"没有早于 {keep_days} 天的整月数据需要归档")
+        for month, rows in archived.items():
+            print(f"{month}: 已归档 {rows} 条榜单数据")
+        if archived and vacuum:
+            print(
+                f"数据库文件大小: {size_before / 1024:.0f}KB -> "
+                f"{os.path.getsize(db.db_path) / 1024:.0f}KB"
+            )
+    finally:
+        db.close()
+
+
+def export_parquet(parquet_dir, start_date=None, end_date=None):
+    """将已有的榜单快照导出为Parquet文件，开启写入Parquet之前的历史数据可以用此命令补齐"""
+    db = BooklistDatabase()
+    try:
+        files, rows = columnar.export_snapshots(
+            db.conn, parquet_dir, start_date, end_date
+        )
+        print(f"已导出 {files} 个Parquet文件，共 {rows} 条数据到 {parquet_dir}")
+    finally:
+        db.close()
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.command == "compact":
+        compact(vacuum=args.vacuum)
+    elif args.command == "migrate":
+        migrate(args.db_path, vacuum=args.vacuum)
+    elif args.command == "archive":
+        archive_snapshots(args.keep_days, vacuum=args.vacuum)
+    elif args.command == "parquet":
+        export_parquet(args.output_dir, args.start_date, args.end_date)
+    else:
+        main(
+            concurrent=not args.serial,
+            max_workers=args.workers,
+            use_async=args.use_async,
+            use_fetch_cache=args.use_fetch_cache,
+            parquet_dir=args.parquet_dir,
+        )
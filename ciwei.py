@@ -1,9 +1,10 @@
 # https://www.ciweimao.com/
-import requests
 import json
 from lxml import etree
 import re
 
+import http_client
+
 
 def get_webpage_content(url):
     """
@@ -13,7 +14,7 @@ def get_webpage_content(url):
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
     }
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http_client.get(url, headers=headers)
         response.encoding = "utf-8"  # 确保中文正确显示
         if response.status_code == 200:
             return response.text
@@ -25,174 +26,189 @@ def get_webpage_content(url):
         return None
 
 
-def parse_weekly_clicks(html_tree):
-    """
-    解析周点击榜数据
-    """
-    weekly_clicks_list = []
+def _first(values):
+    return values[0]
 
-    # 获取周点击榜的容器
-    try:
-        # 找到包含"周点击榜"的标题框
-        title_box = html_tree.xpath(
-            '//div[@class="title-box icon-book"]/h3[contains(text(), "周点击榜")]/parent::div'
-        )[0]
-        # 从title_box的父元素获取ul列表
-        weekly_clicks_ul = title_box.xpath("../ul")[0]
-
-        # 解析排名第一的数据
-        top1_item = weekly_clicks_ul.xpath('./li[@class="top1"]')[0]
-        top1_data = {
-            "rank": 1,
-            "title": top1_item.xpath(".//h3/a/text()")[0].strip(),
-            "url": top1_item.xpath(".//h3/a/@href")[0],
-            "author": top1_item.xpath('.//p[@class="author"]/a/text()')[0],
-            "author_url": top1_item.xpath('.//p[@class="author"]/a/@href')[0],
-            "clicks": top1_item.xpath('.//p[@class="num"]/span/text()')[0],
-            "cover_img": top1_item.xpath('.//a[@class="img"]/img/@data-original')[0],
-        }
-        weekly_clicks_list.append(top1_data)
-
-        # 解析排名2-10的数据
-        other_items = weekly_clicks_ul.xpath('./li[not(@class="top1")]')
-        for item in other_items:
-            rank_text = item.xpath('./a/i[@class="icon-top"]/text()')[0]
-            rank = int(rank_text)
-
-            # 提取分类，位于 [分类] 中
-            category_match = item.xpath("./a/b/text()")
-            category = category_match[0].strip("[]") if category_match else ""
-
-            # 提取标题
-            full_text = item.xpath("./a/text()")
-            title_parts = [t.strip() for t in full_text if t.strip()]
-            title = title_parts[-1] if title_parts else ""
-
-            # 提取点击数
-            clicks = item.xpath('./a/span[@class="num"]/text()')[0]
-
-            item_data = {
-                "rank": rank,
-                "title": title,
-                "url": item.xpath("./a/@href")[0],
-                "category": category,
-                "clicks": clicks,
-            }
-            weekly_clicks_list.append(item_data)
-    except Exception as e:
-        print(f"解析周点击榜数据异常: {e}")
-        import traceback
 
-        print(traceback.format_exc())
+def _strip_first(values):
+    return values[0].strip()
 
-    return weekly_clicks_list
 
+def _rank(values):
+    return int(values[0])
 
-def parse_monthly_votes(html_tree):
+
+def _category(values):
+    # 分类位于 [分类] 中
+    return values[0].strip("[]") if values else ""
+
+
+def _last_text(values):
+    # 标题位于分类标签之后
+    parts = [t.strip() for t in values if t.strip()]
+    return parts[-1] if parts else ""
+
+
+def _optional(values):
+    return values[0] if values else None
+
+
+# 定位所有榜单标题框，只扫描一次文档
+FIND_TITLE_HEADINGS = etree.XPath('//div[starts-with(@class, "title-box")]/h3')
+# 标题框之后的榜单列表
+FIND_LIST = etree.XPath("../ul")
+FIND_TOP1_ITEMS = etree.XPath('./li[@class="top1"]')
+FIND_OTHER_ITEMS = etree.XPath('./li[not(@class="top1")]')
+FIND_ALL_ITEMS = etree.XPath("./li")
+
+
+def top1_fields(count_field):
+    """排名第一的条目：带封面和作者的大卡片"""
+    return (
+        ("title", etree.XPath(".//h3/a/text()"), _strip_first),
+        ("url", etree.XPath(".//h3/a/@href"), _first),
+        ("author", etree.XPath('.//p[@class="author"]/a/text()'), _first),
+        ("author_url", etree.XPath('.//p[@class="author"]/a/@href'), _first),
+        (count_field, etree.XPath('.//p[@class="num"]/span/text()'), _first),
+        ("cover_img", etree.XPath('.//a[@class="img"]/img/@data-original'), _first),
+    )
+
+
+def row_fields(count_field):
+    """排名2-10的条目：排名、分类、标题和数量在同一行"""
+    return (
+        ("rank", etree.XPath('./a/i[@class="icon-top"]/text()'), _rank),
+        ("title", etree.XPath("./a/text()"), _last_text),
+        ("url", etree.XPath("./a/@href"), _first),
+        ("category", etree.XPath("./a/b/text()"), _category),
+        (count_field, etree.XPath('./a/span[@class="num"]/text()'), _first),
+    )
+
+
+NEW_BOOK_FIELDS = (
+    ("title", etree.XPath('.//h3[@class="tit"]/a/text()'), _strip_first),
+    ("url", etree.XPath('.//h3[@class="tit"]/a/@href'), _first),
+    ("author", etree.XPath('.//p[@class="author"]/a/text()'), _first),
+    ("author_url", etree.XPath('.//p[@class="author"]/a/@href'), _first),
+    ("latest_chapter", etree.XPath('.//p[@class="desc"]/text()'), _first),
+    ("cover_img", etree.XPath('.//a[@class="img"]/img/@data-original'), _first),
+    # 更新频率信息可能不存在于所有项目中
+    ("update_rate", etree.XPath('.//p[@class="tips"]/text()'), _optional),
+)
+
+# 榜单配置：标题框的class、标题文字，以及每类条目的选择器和字段
+# fields中没有rank时按条目顺序编号；字段提取结果为None时不输出该字段
+RANKING_BLOCKS = (
+    {
+        "key": "weekly_clicks",
+        "title": "周点击榜",
+        "box_class": "title-box icon-book",
+        "items": (
+            (FIND_TOP1_ITEMS, top1_fields("clicks")),
+            (FIND_OTHER_ITEMS, row_fields("clicks")),
+        ),
+    },
+    {
+        "key": "monthly_votes",
+        "title": "月票榜",
+        "box_class": "title-box icon-book",
+        "items": (
+            (FIND_TOP1_ITEMS, top1_fields("votes")),
+            (FIND_OTHER_ITEMS, row_fields("votes")),
+        ),
+    },
+    {
+        "key": "new_books",
+        "title": "新书榜",
+        "box_class": "title-box icon-cat",
+        "items": ((FIND_ALL_ITEMS, NEW_BOOK_FIELDS),),
+    },
+)
+
+RANKING_BLOCKS_BY_KEY = {block["key"]: block for block in RANKING_BLOCKS}
+
+
+def find_ranking_lists(html_tree, blocks=RANKING_BLOCKS):
     """
-    解析月票榜数据
+    一次遍历找到所有榜单的ul列表
+    返回 {榜单key: ul元素}，未找到的榜单不包含在结果中
+    """
+    lists = {}
+    for heading in FIND_TITLE_HEADINGS(html_tree):
+        title_box = heading.getparent()
+        box_class = title_box.get("class")
+        text = heading.text or ""
+        for block in blocks:
+            if block["key"] in lists:
+                continue
+            if block["box_class"] == box_class and block["title"] in text:
+                ul = FIND_LIST(title_box)
+                if ul:
+                    lists[block["key"]] = ul[0]
+                break
+    return lists
+
+
+def parse_ranking_items(ul, block):
+    """按榜单配置提取ul中的所有条目"""
+    items = []
+    for find_items, fields in block["items"]:
+        for li in find_items(ul):
+            item = {"rank": len(items) + 1}
+            for name, xpath, extract in fields:
+                value = extract(xpath(li))
+                if value is not None:
+                    item[name] = value
+            items.append(item)
+    return items
+
+
+def parse_rankings(html_tree, blocks=RANKING_BLOCKS):
+    """
+    解析页面中的所有榜单
+    返回 {榜单key: 条目列表}，未找到或解析失败的榜单为空列表
     """
-    monthly_votes_list = []
+    lists = find_ranking_lists(html_tree, blocks)
+    results = {}
+    for block in blocks:
+        ul = lists.get(block["key"])
+        if ul is None:
+            print(f"未找到{block['title']}")
+            results[block["key"]] = []
+            continue
+        try:
+            results[block["key"]] = parse_ranking_items(ul, block)
+        except Exception as e:
+            print(f"解析{block['title']}数据异常: {e}")
+            import traceback
+
+            print(traceback.format_exc())
+            results[block["key"]] = []
+    return results
 
-    # 获取月票榜的容器
-    try:
-        # 找到包含"月票榜"的标题框
-        title_box = html_tree.xpath(
-            '//div[@class="title-box icon-book"]/h3[contains(text(), "月票榜")]/parent::div'
-        )[0]
-        # 从title_box的父元素获取ul列表
-        monthly_votes_ul = title_box.xpath("../ul")[0]
-
-        # 解析排名第一的数据
-        top1_item = monthly_votes_ul.xpath('./li[@class="top1"]')[0]
-        top1_data = {
-            "rank": 1,
-            "title": top1_item.xpath(".//h3/a/text()")[0].strip(),
-            "url": top1_item.xpath(".//h3/a/@href")[0],
-            "author": top1_item.xpath('.//p[@class="author"]/a/text()')[0],
-            "author_url": top1_item.xpath('.//p[@class="author"]/a/@href')[0],
-            "votes": top1_item.xpath('.//p[@class="num"]/span/text()')[0],
-            "cover_img": top1_item.xpath('.//a[@class="img"]/img/@data-original')[0],
-        }
-        monthly_votes_list.append(top1_data)
-
-        # 解析排名2-10的数据
-        other_items = monthly_votes_ul.xpath('./li[not(@class="top1")]')
-        for item in other_items:
-            rank_text = item.xpath('./a/i[@class="icon-top"]/text()')[0]
-            rank = int(rank_text)
-
-            # 提取分类，位于 [分类] 中
-            category_match = item.xpath("./a/b/text()")
-            category = category_match[0].strip("[]") if category_match else ""
-
-            # 提取标题
-            full_text = item.xpath("./a/text()")
-            title_parts = [t.strip() for t in full_text if t.strip()]
-            title = title_parts[-1] if title_parts else ""
-
-            # 提取月票数
-            votes = item.xpath('./a/span[@class="num"]/text()')[0]
-
-            item_data = {
-                "rank": rank,
-                "title": title,
-                "url": item.xpath("./a/@href")[0],
-                "category": category,
-                "votes": votes,
-            }
-            monthly_votes_list.append(item_data)
-    except Exception as e:
-        print(f"解析月票榜数据异常: {e}")
-        import traceback
 
-        print(traceback.format_exc())
+def parse_weekly_clicks(html_tree):
+    """
+    解析周点击榜数据
+    """
+    block = RANKING_BLOCKS_BY_KEY["weekly_clicks"]
+    return parse_rankings(html_tree, (block,))["weekly_clicks"]
 
-    return monthly_votes_list
+
+def parse_monthly_votes(html_tree):
+    """
+    解析月票榜数据
+    """
+    block = RANKING_BLOCKS_BY_KEY["monthly_votes"]
+    return parse_rankings(html_tree, (block,))["monthly_votes"]
 
 
 def parse_new_books(html_tree):
     """
     解析新书榜数据
     """
-    new_books_list = []
-
-    # 获取新书榜的容器
-    try:
-        # 找到包含"新书榜"的标题框
-        title_box = html_tree.xpath(
-            '//div[@class="title-box icon-cat"]/h3[contains(text(), "新书榜")]/parent::div'
-        )[0]
-        # 从title_box的父元素获取ul列表
-        new_books_ul = title_box.xpath("../ul")[0]
-
-        # 新书榜的li元素
-        items = new_books_ul.xpath("./li")
-
-        for i, item in enumerate(items, 1):
-            book_data = {
-                "rank": i,
-                "title": item.xpath('.//h3[@class="tit"]/a/text()')[0].strip(),
-                "url": item.xpath('.//h3[@class="tit"]/a/@href')[0],
-                "author": item.xpath('.//p[@class="author"]/a/text()')[0],
-                "author_url": item.xpath('.//p[@class="author"]/a/@href')[0],
-                "latest_chapter": item.xpath('.//p[@class="desc"]/text()')[0],
-                "cover_img": item.xpath('.//a[@class="img"]/img/@data-original')[0],
-            }
-
-            # 更新频率信息可能不存在于所有项目中
-            update_rate = item.xpath('.//p[@class="tips"]/text()')
-            if update_rate:
-                book_data["update_rate"] = update_rate[0]
-
-            new_books_list.append(book_data)
-    except Exception as e:
-        print(f"解析新书榜数据异常: {e}")
-        import traceback
-
-        print(traceback.format_exc())
-
-    return new_books_list
+    block = RANKING_BLOCKS_BY_KEY["new_books"]
+    return parse_rankings(html_tree, (block,))["new_books"]
 
 
 def main():
@@ -207,27 +223,16 @@ def main():
     html_tree = etree.HTML(html_content)
 
     # 检查是否有榜单元素
-    weekly_clicks_elements = html_tree.xpath(
-        '//div[@class="title-box icon-book"]/h3[contains(text(), "周点击榜")]/parent::div'
-    )
-    monthly_votes_elements = html_tree.xpath(
-        '//div[@class="title-box icon-book"]/h3[contains(text(), "月票榜")]/parent::div'
-    )
-    new_books_elements = html_tree.xpath(
-        '//div[@class="title-box icon-cat"]/h3[contains(text(), "新书榜")]/parent::div'
-    )
-
-    print(f"找到周点击榜元素: {len(weekly_clicks_elements)} 个")
-    print(f"找到月票榜元素: {len(monthly_votes_elements)} 个")
-    print(f"找到新书榜元素: {len(new_books_elements)} 个")
+    lists = find_ranking_lists(html_tree)
+    for block in RANKING_BLOCKS:
+        found = 1 if block["key"] in lists else 0
+        print(f"找到{block['title']}元素: {found} 个")
 
-    # 解析三个榜单数据
-    weekly_clicks = parse_weekly_clicks(html_tree)
-    monthly_votes = parse_monthly_votes(html_tree)
-    new_books = parse_new_books(html_tree)
+    # 解析所有榜单数据
+    rankings = parse_rankings(html_tree)
 
     # 组装最终数据
-    results = {"周点击榜": weekly_clicks, "月票榜": monthly_votes, "新书榜": new_books}
+    results = {block["title"]: rankings[block["key"]] for block in RANKING_BLOCKS}
 
     # 保存为JSON文件
     with open("ciweimao_rankings.json", "w", encoding="utf-8") as f:
@@ -0,0 +1,311 @@
+import itertools
+import json
+import os
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 列式快照为可选功能，需要安装pyarrow
+    pa = None
+
+import archive
+
+# 列式快照的根目录，未设置时抓取程序不写入Parquet文件
+PARQUET_DIR = os.environ.get("BOOKLIST_PARQUET_DIR")
+PARQUET_COMPRESSION = "zstd"
+
+# 展开为单独列的extra_data字段，列名加extra_前缀，其余字段仍以JSON保存在extra_data列中
+EXTRA_FIELDS = (
+    "author_url",
+    "category_url",
+    "update_rate",
+    "special_mark",
+    "icon_mark",
+    "rank_score",
+    "rank_class",
+    "cover_alt",
+)
+
+# 目录按 site_code=.../ranking_type=.../month=YYYY-MM 分区(hive格式)，
+# 分区内每天一个part-YYYY-MM-DD.parquet文件，文件内按rank排序；
+# 抓取时只写入当天的文件，不需要读取和重写当月已有的数据，文件名的顺序即日期顺序
+PARTITION_FIELDS = ("site_code", "ranking_type", "month")
+# 旧版本每个分区只有一个整月的文件
+LEGACY_FILE_NAME = "part-0.parquet"
+
+# 一个榜单在日期范围 [start, end) 内的快照，书籍属性从books和authors表中取出，与导出接口一致
+SNAPSHOT_QUERY = """
+SELECT r.fetch_date, r.ranking_id, r.rank, r.book_ref, b.book_id, b.title,
+       COALESCE(a.author_name, '') AS author, b.book_url, b.category, b.cover_url,
+       b.latest_chapter, b.creation_status, r.indicator_value, r.indicator_num,
+       r.indicator_unit, r.created_at, r.extra_data
+FROM {rankings} r
+JOIN books b ON b.book_ref = r.book_ref
+LEFT JOIN authors a ON a.author_id = b.author_id
+WHERE r.ranking_type_id = ? AND r.fetch_date >= ? AND r.fetch_date < ?
+ORDER BY r.fetch_date, r.rank
+"""
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("列式快照需要安装pyarrow: pip install pyarrow")
+
+
+def snapshot_schema():
+    """Parquet文件中的列，分区字段保存在目录名中，不重复写入文件"""
+    require_pyarrow()
+    return pa.schema(
+        [
+            ("fetch_date", pa.string()),
+            ("ranking_id", pa.int64()),
+            ("rank", pa.int32()),
+            ("book_ref", pa.int64()),
+            ("book_id", pa.string()),
+            ("title", pa.string()),
+            ("author", pa.string()),
+            ("book_url", pa.string()),
+            ("category", pa.string()),
+            ("cover_url", pa.string()),
+            ("latest_chapter", pa.string()),
+            ("creation_status", pa.string()),
+            ("indicator_value", pa.string()),
+            ("indicator_num", pa.float64()),
+            ("indicator_unit", pa.string()),
+            ("created_at", pa.string()),
+        ]
+        + [(f"extra_{field}", pa.string()) for field in EXTRA_FIELDS]
+        + [("extra_data", pa.string())]
+    )
+
+
+def partition_schema():
+    require_pyarrow()
+    return pa.schema([(field, pa.string()) for field in PARTITION_FIELDS])
+
+
+def partition_path(root, site_code, ranking_type, month):
+    """快照所在的分区目录，榜单代码可能包含中文和符号，按URI编码"""
+    return os.path.join(
+        root,
+        f"site_code={quote(site_code, safe='')}",
+        f"ranking_type={quote(ranking_type, safe='')}",
+        f"month={month}",
+    )
+
+
+def day_file_name(fetch_date):
+    return f"part-{fetch_date}.parquet"
+
+
+def snapshot_table(rows):
+    """将SNAPSHOT_QUERY的查询结果转换为Arrow表，展开extra_data中的字段"""
+    schema = snapshot_schema()
+    base_fields = list(schema)[: -len(EXTRA_FIELDS) - 1]
+    # creation_status等列的类型亲和性为INTEGER，同一列中可能同时有整数和文本
+    text_columns = {field.name for field in base_fields if field.type == pa.string()}
+    columns = {name: [] for name in schema.names}
+    for row in rows:
+        for field, value in zip(base_fields, row):
+            if value is not None and field.name in text_columns:
+                value = str(value)
+            columns[field.name].append(value)
+        extra = json.loads(row[-1]) if row[-1] else {}
+        for field in EXTRA_FIELDS:
+            value = extra.pop(field, None)
+            columns[f"extra_{field}"].append(None if value is None else str(value))
+        columns["extra_data"].append(
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def write_table(path, table):
+    """先写入以.开头的临时文件再替换，读取时会忽略临时文件"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, "." + os.path.basename(path) + ".tmp")
+    pq.write_table(table, temp_path, compression=PARQUET_COMPRESSION)
+    os.replace(temp_path, path)
+
+
+def split_legacy_file(directory):
+    """将旧版本的整月文件拆分为每天一个文件，避免与新写入的当天文件重复"""
+    path = os.path.join(directory, LEGACY_FILE_NAME)
+    if not os.path.exists(path):
+        return
+    legacy = pq.read_table(path, schema=snapshot_schema())
+    for fetch_date in pc.unique(legacy["fetch_date"]).to_pylist():
+        day_path = os.path.join(directory, day_file_name(fetch_date))
+        if not os.path.exists(day_path):
+            write_table(day_path, legacy.filter(pc.field("fetch_date") == fetch_date))
+    os.remove(path)
+
+
+def write_snapshot(
+    conn, root, site_code, ranking_type, ranking_type_id, fetch_date, table="rankings"
+):
+    """
+    将一个榜单一天的快照写入当月分区中该日期的文件，返回写入的条数
+    同一天重新抓取时替换该日期的文件，当月其他日期的文件不受影响
+    """
+    require_pyarrow()
+    next_day = (
+        datetime.strptime(fetch_date, "%Y-%m-%d").date() + timedelta(days=1)
+    ).isoformat()
+    rows = conn.execute(
+        SNAPSHOT_QUERY.format(rankings=table), (ranking_type_id, fetch_date, next_day)
+    ).fetchall()
+    if not rows:
+        return 0
+    directory = partition_path(root, site_code, ranking_type, fetch_date[:7])
+    split_legacy_file(directory)
+    write_table(
+        os.path.join(directory, day_file_name(fetch_date)), snapshot_table(rows)
+    )
+    return len(rows)
+
+
+def write_month(directory, rows):
+    """
+    将一个榜单整月的快照按日期写入分区目录，返回写入的文件数
+    删除该月中已经没有数据的日期的文件和旧版本的整月文件
+    """
+    written = set()
+    for fetch_date, day_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        file_name = day_file_name(fetch_date)
+        write_table(os.path.join(directory, file_name), snapshot_table(day_rows))
+        written.add(file_name)
+    for file_name in os.listdir(directory):
+        if (
+            file_name.startswith("part-")
+            and file_name.endswith(".parquet")
+            and file_name not in written
+        ):
+            os.remove(os.path.join(directory, file_name))
+    return len(written)
+
+
+def export_snapshots(conn, root, start_date=None, end_date=None):
+    """
+    将数据库中已有的快照(包括归档文件中的快照)写入Parquet文件，每天一个文件，覆盖已有的月份分区
+    start_date和end_date所在的月份整月导出，返回 (文件数, 条数)
+    """
+    require_pyarrow()
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append("r.fetch_date >= ?")
+        params.append(archive.month_range(start_date[:7])[0])
+    if end_date:
+        conditions.append("r.fetch_date < ?")
+        params.append(archive.month_range(end_date[:7])[1])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    files = 0
+    total_rows = 0
+    for table in archive.iter_rankings_tables(conn, start_date, end_date):
+        keys = conn.execute(
+            f"""
+        SELECT DISTINCT s.site_code, rt.type_code, r.ranking_type_id,
+               substr(r.fetch_date, 1, 7) AS month
+        FROM {table} r
+        JOIN sites s ON r.site_id = s.site_id
+        JOIN ranking_types rt ON r.ranking_type_id = rt.ranking_type_id
+        {where}
+        """,
+            params,
+        ).fetchall()
+        for site_code, type_code, ranking_type_id, month in keys:
+            rows = conn.execute(
+                SNAPSHOT_QUERY.format(rankings=table),
+                (ranking_type_id, *archive.month_range(month)),
+            ).fetchall()
+            files += write_month(
+                partition_path(root, site_code, type_code, month), rows
+            )
+            total_rows += len(rows)
+    return files, total_rows
+
+
+def open_dataset(root=None):
+    """打开列式快照目录，只读取文件元数据，不读取数据"""
+    require_pyarrow()
+    schema = snapshot_schema()
+    for field in partition_schema():
+        schema = schema.append(field)
+    return ds.dataset(
+        root or PARQUET_DIR or "parquet",
+        format="parquet",
+        schema=schema,
+        partitioning=ds.partitioning(partition_schema(), flavor="hive"),
+    )
+
+
+def _match(name, value):
+    """单个值按相等比较，列表按包含比较"""
+    if isinstance(value, (list, tuple, set)):
+        return ds.field(name).isin(list(value))
+    return ds.field(name) == value
+
+
+def build_filter(
+    site_code=None, ranking_type=None, start_date=None, end_date=None, filter=None
+):
+    """
+    组合查询条件，分区字段的条件在读取前按目录裁剪，
+    其他列的条件(如 ds.field("indicator_num") > 10000)按Parquet行组统计信息跳过数据
+    """
+    expressions = []
+    if site_code:
+        expressions.append(_match("site_code", site_code))
+    if ranking_type:
+        expressions.append(_match("ranking_type", ranking_type))
+    # 日期条件同时作用于month分区和文件内的fetch_date列
+    if start_date:
+        expressions.append(ds.field("month") >= start_date[:7])
+        expressions.append(ds.field("fetch_date") >= start_date)
+    if end_date:
+        expressions.append(ds.field("month") <= end_date[:7])
+        expressions.append(ds.field("fetch_date") <= end_date)
+    if filter is not None:
+        expressions.append(filter)
+    if not expressions:
+        return None
+    expression = expressions[0]
+    for other in expressions[1:]:
+        expression = expression & other
+    return expression
+
+
+def read_snapshots(
+    root=None,
+    site_code=None,
+    ranking_type=None,
+    start_date=None,
+    end_date=None,
+    columns=None,
+    filter=None,
+):
+    """
+    读取列式快照为Arrow表
+
+    - site_code / ranking_type: 站点代码和榜单代码，可以是单个值或列表
+    - start_date / end_date: 日期范围(包含两端)，格式为YYYY-MM-DD
+    - columns: 只读取的列，默认读取全部列
+    - filter: 额外的pyarrow.dataset表达式
+    """
+    dataset = open_dataset(root)
+    return dataset.to_table(
+        columns=columns,
+        filter=build_filter(site_code, ranking_type, start_date, end_date, filter),
+    )
+
+
+def read_snapshots_pandas(*args, **kwargs):
+    """读取列式快照为pandas DataFrame，参数与read_snapshots相同，需要安装pandas"""
+    return read_snapshots(*args, **kwargs).to_pandas()
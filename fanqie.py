@@ -1,10 +1,11 @@
-import requests
 import json
 import re
 from lxml import etree
 from bs4 import BeautifulSoup
 from datetime import datetime
 
+import http_client
+
 
 # https://fanqienovel.com/api/author/misc/top_book_list/v1/?limit=200&offset=0
 # {
@@ -19,7 +20,7 @@ from datetime import datetime
 
 
 def getJson():
-    result = requests.get(
+    result = http_client.get(
         "https://fanqienovel.com/api/author/misc/top_book_list/v1/?limit=200&offset=0"
     ).json()
     return result
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # 异步抓取为可选功能，需要安装httpx
+    httpx = None
+
+logger = logging.getLogger("booklist")
+
+# 默认请求配置
+DEFAULT_TIMEOUT = 10  # 秒
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 1  # 重试间隔依次为 1、2、4 秒
+POOL_CONNECTIONS = 10  # 缓存连接池的主机数
+POOL_MAXSIZE = 4  # 每个主机的最大连接数
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
+
+# 对这些状态码进行重试
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """请求未指定超时时使用默认超时的HTTPAdapter"""
+
+    def __init__(self, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session(
+    timeout=DEFAULT_TIMEOUT,
+    retries=DEFAULT_RETRIES,
+    backoff_factor=DEFAULT_BACKOFF_FACTOR,
+    pool_connections=POOL_CONNECTIONS,
+    pool_maxsize=POOL_MAXSIZE,
+):
+    """
+    创建带连接池的Session
+    同一主机的连接保持复用，每个主机最多pool_maxsize个连接，
+    连接失败或服务端错误时按指数退避重试
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        timeout=timeout,
+        max_retries=retry,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=True,
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # ACCEPT_ENCODING包含urllib3能解码的所有压缩格式(安装brotli后包含br)
+    session.headers.update(
+        {"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING}
+    )
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """获取所有抓取模块共享的Session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def get(url, headers=None, timeout=None, **kwargs):
+    """使用共享Session发送GET请求"""
+    return get_session().get(url, headers=headers, timeout=timeout, **kwargs)
+
+
+def retry_count(response):
+    """返回得到该响应前重试的次数，支持requests和AsyncSiteFetcher返回的响应"""
+    count = getattr(response, "retry_count", None)
+    if count is not None:
+        return count
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    return len(retries.history) if retries is not None else 0
+
+
+class FetchCache:
+    """
+    保存在磁盘上的抓取缓存
+    按URL等键记录ETag、Last-Modified、内容哈希以及最近一次保存到数据库的日期
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        """获取缓存条目，不存在时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+
+    def update(self, entries):
+        """写入多个缓存条目并保存到磁盘"""
+        with self._lock:
+            self._entries.update(entries)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+_fetch_cache = None
+
+
+def get_fetch_cache():
+    """获取抓取缓存，文件路径可通过环境变量BOOKLIST_FETCH_CACHE配置"""
+    global _fetch_cache
+    if _fetch_cache is None:
+        with _session_lock:
+            if _fetch_cache is None:
+                _fetch_cache = FetchCache(
+                    os.environ.get("BOOKLIST_FETCH_CACHE", "fetch_cache.json")
+                )
+    return _fetch_cache
+
+
+def create_async_client(timeout=DEFAULT_TIMEOUT, max_connections=100):
+    """
+    创建异步抓取使用的httpx.AsyncClient，所有站点共享连接池
+    需要安装httpx: pip install httpx
+    """
+    if httpx is None:
+        raise RuntimeError("异步抓取需要安装httpx: pip install httpx")
+    return httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT},
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+        follow_redirects=True,
+    )
+
+
+class AsyncRateLimiter:
+    """限制请求速率，相邻两次请求的开始时间间隔不小于1/rate秒"""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncSiteFetcher:
+    """
+    单个站点的异步抓取器
+    在共享的AsyncClient上限制该站点的并发数和请求速率，失败时按指数退避重试
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency=4,
+        rate=None,
+        retries=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+    ):
+        self.client = client
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiter = AsyncRateLimiter(rate)
+
+    async def get(self, url, headers=None, **kwargs):
+        """发送GET请求，返回httpx.Response"""
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                await self._limiter.wait()
+                try:
+                    response = await self.client.get(url, headers=headers, **kwargs)
+                    if (
+                        response.status_code not in RETRY_STATUS_CODES
+                        or attempt == self.retries
+                    ):
+                        response.retry_count = attempt
+                        return response
+                    logger.warning(
+                        f"请求 {url} 返回状态码 {response.status_code}，正在重试 ({attempt + 1}/{self.retries})"
+                    )
+                except httpx.TransportError as e:
+                    if attempt == self.retries:
+                        raise
+                    logger.warning(
+                        f"请求 {url} 失败，正在重试 ({attempt + 1}/{self.retries}): {str(e)}"
+                    )
+                await asyncio.sleep(self.backoff_factor * (2**attempt))
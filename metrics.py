@@ -0,0 +1,421 @@
+import bisect
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# 默认的耗时分桶(秒)
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+SAMPLE_PATTERN = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$")
+LABEL_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+VERB_PATTERN = re.compile(r"^\s*([A-Za-z]+)")
+# 语句操作的第一张表，忽略库名(main.、archive_YYYY_MM.)
+TABLE_PATTERN = re.compile(
+    r"\b(?:FROM|INTO|UPDATE|JOIN|TABLE|ON|PRAGMA)\s+"
+    r"(?:IF\s+(?:NOT\s+)?EXISTS\s+)?(?:\w+\.)?([A-Za-z_]\w*)",
+    re.IGNORECASE,
+)
+# statement标签的取值格式，恢复指标文件时丢弃旧版本以SQL文本为标签的序列
+STATEMENT_NAME_PATTERN = re.compile(r"^[A-Z]+( \w+)?$")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _unescape(value):
+    return value.replace("\\n", "\n").replace('\\"', '"').replace("\\\\", "\\")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    type = "counter"
+
+    label_patterns = {}
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def sample_names(self):
+        return (self.name,)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def restore(self, name, labels, value):
+        key = tuple(labels.get(label, "") for label in self.labelnames)
+        self._values[key] = value
+
+
+def _valid_labels(metric, labels):
+    """标签取值符合metric.label_patterns时返回True"""
+    return all(
+        pattern.match(labels.get(label, ""))
+        for label, pattern in metric.label_patterns.items()
+    )
+
+
+class Histogram:
+    """分桶统计观测值的直方图"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        buckets=DEFAULT_BUCKETS,
+        label_patterns=None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 恢复指标文件时只接受符合格式的标签值
+        self.label_patterns = label_patterns or {}
+        self._values = {}  # 标签值 -> [各桶计数, 总和, 总数]
+        self._lock = threading.Lock()
+
+    def sample_names(self):
+        return (f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count")
+
+    def _series(self, key):
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        return series
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series(key)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """上下文管理器，记录代码块的耗时"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, key, ("le", _format_value(bound))
+                )
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            yield f"{self.name}_bucket", labels, count
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), count
+
+    def restore(self, name, labels, value):
+        key = tuple(labels.get(label, "") for label in self.labelnames)
+        series = self._series(key)
+        if name == f"{self.name}_sum":
+            series[1] = value
+        elif name == f"{self.name}_count":
+            series[2] = int(value)
+        elif name == f"{self.name}_bucket" and labels.get("le") != "+Inf":
+            # 文本格式中的桶计数是累计值，还原为各桶自身的计数
+            bound = float(labels["le"])
+            if bound in self.buckets:
+                index = self.buckets.index(bound)
+                below = sum(series[0][:index])
+                series[0][index] = int(value) - below
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """指标注册表，输出Prometheus文本格式"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        buckets=DEFAULT_BUCKETS,
+        label_patterns=None,
+    ):
+        return self._register(
+            Histogram(name, documentation, labelnames, buckets, label_patterns)
+        )
+
+    def render(self, prefix="", exclude_prefix=None):
+        """输出名称以prefix开头、且不以exclude_prefix开头的指标"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            if not metric.name.startswith(prefix):
+                continue
+            if exclude_prefix and metric.name.startswith(exclude_prefix):
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write_textfile(self, path, prefix=""):
+        """将指标写入文本文件，供API的/metrics接口合并输出"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render(prefix))
+        os.replace(tmp_path, path)
+
+    def restore_textfile(self, path):
+        """
+        从write_textfile写入的文件中恢复指标的值
+        抓取程序每次运行都是新进程，恢复后计数器可以跨运行累计
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        with self._lock:
+            owners = {
+                name: metric
+                for metric in self._metrics.values()
+                for name in metric.sample_names()
+            }
+        for line in lines:
+            match = SAMPLE_PATTERN.match(line)
+            if not match:
+                continue
+            name, label_text, value = match.groups()
+            labels = {
+                key: _unescape(val)
+                for key, val in LABEL_PATTERN.findall(label_text or "")
+            }
+            metric = owners.get(name)
+            if metric is not None and _valid_labels(metric, labels):
+                with metric._lock:
+                    metric.restore(name, labels, float(value))
+
+
+REGISTRY = Registry()
+
+# API接口延迟
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "booklist_http_request_duration_seconds",
+    "API请求处理耗时(秒)",
+    ("method", "route", "status"),
+)
+
+# SQLite语句耗时，statement为statement_label给出的语句名，execute为执行语句，fetch为读取结果
+SQLITE_QUERY_SECONDS = REGISTRY.histogram(
+    "booklist_sqlite_query_duration_seconds",
+    "API进程中SQLite语句耗时(秒)",
+    ("statement", "op"),
+)
+CRAWL_SQLITE_QUERY_SECONDS = REGISTRY.histogram(
+    "booklist_crawl_sqlite_query_duration_seconds",
+    "抓取进程中SQLite语句耗时(秒)",
+    ("statement", "op"),
+    label_patterns={"statement": STATEMENT_NAME_PATTERN},
+)
+
+# 抓取各阶段的指标
+CRAWL_PHASE_SECONDS = REGISTRY.histogram(
+    "booklist_crawl_phase_duration_seconds",
+    "抓取各阶段耗时(秒)，phase为fetch/parse/save/parquet",
+    ("site", "phase"),
+)
+CRAWL_BYTES = REGISTRY.counter(
+    "booklist_crawl_downloaded_bytes_total", "抓取下载的字节数", ("site",)
+)
+CRAWL_ROWS_INSERTED = REGISTRY.counter(
+    "booklist_crawl_rows_inserted_total", "写入的榜单记录数", ("site", "ranking_type")
+)
+CRAWL_ROWS_REJECTED = REGISTRY.counter(
+    "booklist_crawl_rows_rejected_total",
+    "数据不合法被拒绝的榜单记录数",
+    ("site", "ranking_type"),
+)
+CRAWL_RUNS = REGISTRY.counter(
+    "booklist_crawl_runs_total", "抓取次数，status为success/failure", ("site", "status")
+)
+
+# 抓取进程写入、API读取的指标文件
+CRAWL_METRICS_PREFIX = "booklist_crawl_"
+
+
+def crawl_metrics_path():
+    return os.environ.get("BOOKLIST_METRICS_FILE", "booklist_metrics.prom")
+
+
+def statement_label(sql):
+    """
+    将SQL语句归为固定的语句名作为指标标签，如 "SELECT rankings"、"PRAGMA query_only"
+    标签只由语句类型和表名组成，不随归档月份、IN列表长度等变化，标签数量有上限
+    """
+    verb = VERB_PATTERN.match(sql)
+    if not verb:
+        return "OTHER"
+    name = verb.group(1).upper()
+    table = TABLE_PATTERN.search(sql)
+    if table:
+        name += " " + table.group(1).lower()
+    return name
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """记录每条语句执行和读取结果耗时的游标"""
+
+    _statement = ""
+
+    def _observe(self, op, start):
+        self.connection.histogram.observe(
+            time.perf_counter() - start, statement=self._statement, op=op
+        )
+
+    def execute(self, sql, parameters=()):
+        self._statement = statement_label(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._observe("execute", start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._statement = statement_label(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._observe("execute", start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._observe("fetch", start)
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            self._observe("fetch", start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._observe("fetch", start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    记录语句耗时的SQLite连接，作为sqlite3.connect的factory参数使用
+    游标的迭代(for row in cursor)不计入读取耗时
+    """
+
+    histogram = SQLITE_QUERY_SECONDS
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class CrawlConnection(InstrumentedConnection):
+    """抓取进程使用的连接，语句耗时记录到booklist_crawl_前缀的指标中"""
+
+    histogram = CRAWL_SQLITE_QUERY_SECONDS
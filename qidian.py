@@ -1,23 +1,35 @@
 import json
-import requests
+import os
 from lxml import etree
 
+import http_client
+
+# cookie.json位于项目目录下，从其他目录运行(如benchmarks/)时也能找到
+COOKIE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cookie.json")
+
 
 def get_cookies():
     """从cookie.json读取cookie信息"""
-    with open("cookie.json", "r", encoding="utf-8") as f:
+    with open(COOKIE_PATH, "r", encoding="utf-8") as f:
         cookie_data = json.load(f)
     return cookie_data.get("cookie", "")
 
 
-def fetch_qidian():
-    """发送请求到起点网站获取数据"""
+QIDIAN_URL = "https://www.qidian.com/"
+
+
+def get_headers():
+    """构造请求起点网站的请求头"""
     cookies = get_cookies()
-    headers = {
+    return {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/93.0.4577.63 Safari/537.36",
         "Cookie": cookies,
     }
-    response = requests.get("https://www.qidian.com/", headers=headers)
+
+
+def fetch_qidian():
+    """发送请求到起点网站获取数据"""
+    response = http_client.get(QIDIAN_URL, headers=get_headers())
     response.encoding = "utf-8"
     return response.text
 
@@ -101,64 +113,130 @@ def parse_book_info(li_element):
     return book_info
 
 
-def parse_ranking_list(html_content):
-    """解析所有榜单数据"""
-    tree = etree.HTML(html_content)
-    rankings = {}
-
-    # 使用不同的选择器，确保能捕获所有榜单
-    # 这里使用//div[@id="rank-list-row"]//div[contains(@class,"rank-list")]
-    rank_divs = tree.xpath(
-        '//div[@id="rank-list-row"]//div[contains(@class,"rank-list")]'
+def parse_rank_div(rank_div):
+    """
+    解析单个榜单div
+    返回 (榜单名称, 榜单信息)，缺少榜单ID或名称时返回None
+    """
+    # 获取榜单ID
+    rank_id = rank_div.get("data-l2", "")
+
+    if not rank_id:
+        return None  # 跳过没有data-l2属性的div
+
+    # 获取榜单名称和链接
+    title_element = rank_div.xpath('.//h3[@class="wrap-title lang"]/a[1]')
+    if title_element and len(title_element) > 0:
+        # 获取包括嵌套文本在内的所有文本
+        text_parts = []
+        for txt in title_element[0].xpath(".//text()"):
+            text_parts.append(txt.strip())
+        rank_name = "".join(text_parts).strip()
+        rank_url = title_element[0].get("href", "").strip()
+    else:
+        return None  # 如果找不到榜单名称，跳过这个榜单
+
+    # 获取"更多"链接
+    more_element = rank_div.xpath('.//a[@class="more"]')
+    more_url = (
+        more_element[0].get("href", "").strip()
+        if more_element and len(more_element) > 0
+        else ""
     )
 
-    print(f"找到 {len(rank_divs)} 个榜单")
-
-    for rank_div in rank_divs:
-        # 获取榜单ID
-        rank_id = rank_div.get("data-l2", "")
-
-        if not rank_id:
-            continue  # 跳过没有data-l2属性的div
-
-        # 获取榜单名称和链接
-        title_element = rank_div.xpath('.//h3[@class="wrap-title lang"]/a[1]')
-        if title_element and len(title_element) > 0:
-            # 获取包括嵌套文本在内的所有文本
-            text_parts = []
-            for txt in title_element[0].xpath(".//text()"):
-                text_parts.append(txt.strip())
-            rank_name = "".join(text_parts).strip()
-            rank_url = title_element[0].get("href", "").strip()
-        else:
-            continue  # 如果找不到榜单名称，跳过这个榜单
-
-        # 获取"更多"链接
-        more_element = rank_div.xpath('.//a[@class="more"]')
-        more_url = (
-            more_element[0].get("href", "").strip()
-            if more_element and len(more_element) > 0
-            else ""
-        )
-
-        # 解析书籍列表
-        book_elements = rank_div.xpath('.//div[@class="book-list"]//li')
-        books = []
-        for book_element in book_elements:
-            book_info = parse_book_info(book_element)
-            if book_info:  # 只添加非空的书籍信息
-                books.append(book_info)
-
-        print(f"榜单: {rank_name}, ID: {rank_id}, 书籍数量: {len(books)}")
-
-        # 添加榜单信息
-        rankings[rank_name] = {
-            "id": rank_id,
-            "url": rank_url,
-            "more_url": more_url,
-            "books": books,
-        }
+    # 解析书籍列表
+    book_elements = rank_div.xpath('.//div[@class="book-list"]//li')
+    books = []
+    for book_element in book_elements:
+        book_info = parse_book_info(book_element)
+        if book_info:  # 只添加非空的书籍信息
+            books.append(book_info)
+
+    print(f"榜单: {rank_name}, ID: {rank_id}, 书籍数量: {len(books)}")
+
+    # 榜单信息
+    return rank_name, {
+        "id": rank_id,
+        "url": rank_url,
+        "more_url": more_url,
+        "books": books,
+    }
+
+
+class RankListTarget:
+    """
+    lxml解析目标，只为#rank-list-row中的榜单div构建子树
+    页面其余部分只计数不建树，每个榜单div解析完成后放入blocks等待取出
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.row_depth = None  # rank-list-row所在深度，不在其中时为None
+        self.block_depth = None  # 正在构建的榜单div所在深度
+        self.builder = None
+        self.blocks = []
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if self.builder is not None:
+            self.builder.start(tag, attrib)
+        elif self.row_depth is None:
+            if tag == "div" and attrib.get("id") == "rank-list-row":
+                self.row_depth = self.depth
+        elif (
+            tag == "div"
+            and "rank-list" in attrib.get("class", "")
+            and attrib.get("data-l2")
+        ):
+            self.builder = etree.TreeBuilder()
+            self.block_depth = self.depth
+            self.builder.start(tag, attrib)
+
+    def end(self, tag):
+        if self.builder is not None:
+            self.builder.end(tag)
+            if self.depth == self.block_depth:
+                self.blocks.append(self.builder.close())
+                self.builder = None
+        elif self.depth == self.row_depth:
+            self.row_depth = None
+        self.depth -= 1
+
+    def data(self, data):
+        if self.builder is not None:
+            self.builder.data(data)
+
+    def close(self):
+        return None
+
+
+def iter_ranking_lists(html_content, chunk_size=65536):
+    """
+    流式解析榜单数据，逐个生成 (榜单名称, 榜单信息)
+    分块送入解析器，只构建榜单div的子树，内存占用不超过一个榜单
+    """
+    target = RankListTarget()
+    parser = etree.HTMLParser(target=target)
+
+    for offset in range(0, len(html_content), chunk_size):
+        parser.feed(html_content[offset : offset + chunk_size])
+        yield from _drain_blocks(target)
+    parser.close()
+    yield from _drain_blocks(target)
+
+
+def _drain_blocks(target):
+    """解析并取出已构建完成的榜单div"""
+    while target.blocks:
+        ranking = parse_rank_div(target.blocks.pop(0))
+        if ranking:
+            yield ranking
+
 
+def parse_ranking_list(html_content):
+    """解析所有榜单数据"""
+    rankings = dict(iter_ranking_lists(html_content))
+    print(f"找到 {len(rankings)} 个榜单")
     return rankings
 
 
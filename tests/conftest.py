@@ -0,0 +1,154 @@
+"""
+测试共用的夹具：在临时目录中创建数据库，不读写项目目录下的booklist.db
+"""
+
+import os
+import sys
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(ROOT_DIR, "benchmarks", "fixtures")
+
+sys.path.insert(0, ROOT_DIR)
+
+import api  # noqa: E402
+import booklist_db  # noqa: E402
+import http_client  # noqa: E402
+
+
+def load_fixture(name):
+    """读取基准测试的页面样本"""
+    with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def make_books(count, prefix="book", start=1):
+    """生成count条榜单数据，排名从start开始"""
+    return [
+        {
+            "rank": rank,
+            "book_id": f"{prefix}{rank}",
+            "title": f"{prefix}书名{rank}",
+            "author": f"{prefix}作者{rank}",
+            "url": f"https://example.com/{prefix}/{rank}",
+            "category": "玄幻",
+            "votes": f"{1000 - rank}",
+            "special_mark": "签约" if rank % 2 else "",
+            "update_rate": "日更",
+            "rank_score": rank / 10,
+        }
+        for rank in range(start, start + count)
+    ]
+
+
+def add_ranking_type(db, site_code, type_code):
+    """添加榜单类型，返回 (site_id, ranking_type_id)"""
+    site_id = db.conn.execute(
+        "SELECT site_id FROM sites WHERE site_code = ?", (site_code,)
+    ).fetchone()[0]
+    db.add_or_update_ranking_type(site_id, type_code, type_code)
+    return site_id, db.get_ranking_type_id(site_id, type_code)
+
+
+def generation(db):
+    return db.conn.execute(
+        "SELECT value FROM meta WHERE key = 'generation'"
+    ).fetchone()[0]
+
+
+class StubAdapter(booklist_db.SiteAdapter):
+    """
+    返回预设数据的站点适配器，不访问网络
+    rankings为 {榜单代码: 书籍列表}，process_data逐个生成榜单，书籍以迭代器形式交给写入
+    """
+
+    def __init__(self, db, site_code, rankings):
+        site = db.conn.execute(
+            """
+        SELECT site_id, site_code, site_name, site_url, fetch_type, api_url
+        FROM sites WHERE site_code = ?
+        """,
+            (site_code,),
+        ).fetchone()
+        super().__init__(*site, db)
+        self.rankings = rankings
+
+    def fetch_data(self):
+        return self.rankings
+
+    def process_data(self, data):
+        return ((code, iter(books)) for code, books in data.items())
+
+
+@pytest.fixture(autouse=True)
+def fetch_cache(tmp_path, monkeypatch):
+    """每个测试使用临时目录中的抓取缓存"""
+    cache = http_client.FetchCache(str(tmp_path / "fetch_cache.json"))
+    monkeypatch.setattr(http_client, "_fetch_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """临时目录中的新数据库，归档文件也写入该目录"""
+    monkeypatch.setenv("BOOKLIST_ARCHIVE_DIR", str(tmp_path / "archive"))
+    database = booklist_db.BooklistDatabase(str(tmp_path / "booklist.db"))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def api_client(db, tmp_path, monkeypatch):
+    """读取临时数据库的API测试客户端，连接池和各响应缓存都是新的"""
+    monkeypatch.setenv("BOOKLIST_METRICS_FILE", str(tmp_path / "booklist_metrics.prom"))
+    monkeypatch.setattr(api, "DB_PATH", db.db_path)
+    monkeypatch.setattr(api, "db_pool", api.ConnectionPool(db.db_path, size=2))
+    monkeypatch.setitem(api._generation_state, "checked_at", 0.0)
+    for cache in (api.response_cache, api.fetch_date_cache, api.movers_cache):
+        cache.clear()
+    with TestClient(api.app) as client:
+        yield client
+    api.db_pool.close()
+
+
+def make_response(status_code, body=b"", headers=None):
+    """构造requests的响应，用于替换网络请求"""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeServer:
+    """替换http_client.get，记录请求头并返回预设的响应"""
+
+    def __init__(self, monkeypatch):
+        self.requests = []
+        self.responses = []
+        monkeypatch.setattr(http_client, "get", self.get)
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """替换网络请求的FakeServer，测试中设置server.responses"""
+    return FakeServer(monkeypatch)
+
+
+@pytest.fixture
+def ciweimao(db):
+    """返回创建刺猬猫适配器的函数，每次抓取使用新的适配器"""
+    site = db.conn.execute(
+        """
+        SELECT site_id, site_code, site_name, site_url, fetch_type, api_url
+        FROM sites WHERE site_code = 'ciweimao'
+        """
+    ).fetchone()
+    return lambda: booklist_db.CiweimaoAdapter(*site, db)
@@ -0,0 +1,245 @@
+"""
+快照分布在归档文件和热数据库中时，导出和排名变化接口的结果
+"""
+
+import csv
+import io
+import json
+from datetime import date
+
+import pytest
+
+from conftest import add_ranking_type, make_books
+
+
+def reorder(books, order, extra=()):
+    """按order中的book_id重新排列并编号，extra中的书籍接在后面"""
+    by_id = {book["book_id"]: book for book in books}
+    ranked = [dict(by_id[book_id]) for book_id in order] + [
+        dict(book) for book in extra
+    ]
+    for rank, book in enumerate(ranked, start=1):
+        book["rank"] = rank
+    return ranked
+
+
+@pytest.fixture
+def client(db, api_client):
+    """
+    2025-01的快照已归档，2025-02和2025-03的快照在热数据库中
+    2025-03-01相对2025-01-02：book3上升，book1和book2下降，book4跌出，new1新上榜
+    """
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    fanqie_id, fanqie_type = add_ranking_type(db, "fanqie", "hot")
+    books = make_books(5)
+    snapshots = {
+        "2025-01-01": books,
+        "2025-01-02": books,
+        "2025-02-10": reorder(books, ["book2", "book1", "book3", "book4", "book5"]),
+        "2025-03-01": reorder(
+            books,
+            ["book3", "book1", "book2"],
+            make_books(1, "new") + reorder(books, ["book5"]),
+        ),
+    }
+    for fetch_date, ranked in snapshots.items():
+        db.save_ranking_batch(site_id, type_id, fetch_date, ranked)
+        db.save_ranking_batch(fanqie_id, fanqie_type, fetch_date, make_books(2, "fq"))
+    assert db.archive_old_snapshots(keep_days=10, today=date(2025, 3, 1)) == {
+        "2025-01": 14
+    }
+
+    return api_client
+
+
+def export_lines(client, **params):
+    response = client.get("/api/export", params=params)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_export_spans_archive_and_hot_database(client):
+    rows = export_lines(client, site_code="qidian")
+    assert [(row["fetch_date"], row["rank"], row["book_id"]) for row in rows] == [
+        ("2025-01-01", 1, "book1"),
+        ("2025-01-01", 2, "book2"),
+        ("2025-01-01", 3, "book3"),
+        ("2025-01-01", 4, "book4"),
+        ("2025-01-01", 5, "book5"),
+        ("2025-01-02", 1, "book1"),
+        ("2025-01-02", 2, "book2"),
+        ("2025-01-02", 3, "book3"),
+        ("2025-01-02", 4, "book4"),
+        ("2025-01-02", 5, "book5"),
+        ("2025-02-10", 1, "book2"),
+        ("2025-02-10", 2, "book1"),
+        ("2025-02-10", 3, "book3"),
+        ("2025-02-10", 4, "book4"),
+        ("2025-02-10", 5, "book5"),
+        ("2025-03-01", 1, "book3"),
+        ("2025-03-01", 2, "book1"),
+        ("2025-03-01", 3, "book2"),
+        ("2025-03-01", 4, "new1"),
+        ("2025-03-01", 5, "book5"),
+    ]
+    # 归档的快照仍通过热数据库的books表取得书籍属性
+    assert rows[0]["title"] == "book书名1"
+    assert rows[0]["indicator_num"] == 999
+    assert {row["site_code"] for row in rows} == {"qidian"}
+
+
+def test_export_date_range_across_partitions(client):
+    rows = export_lines(client, start_date="2025-01-02", end_date="2025-02-10")
+    assert sorted({row["fetch_date"] for row in rows}) == ["2025-01-02", "2025-02-10"]
+    assert len(rows) == 14
+
+    rows = export_lines(client, start_date="2025-02-01", ranking_type="hot")
+    assert {row["fetch_date"] for row in rows} == {"2025-02-10", "2025-03-01"}
+    assert len(rows) == 14
+
+    response = client.get(
+        "/api/export",
+        params={"site_code": "fanqie", "end_date": "2025-01-31", "format": "csv"},
+    )
+    assert response.status_code == 200
+    records = list(csv.DictReader(io.StringIO(response.text.lstrip("\ufeff"))))
+    assert [(row["fetch_date"], row["book_id"]) for row in records] == [
+        ("2025-01-01", "fq1"),
+        ("2025-01-01", "fq2"),
+        ("2025-01-02", "fq1"),
+        ("2025-01-02", "fq2"),
+    ]
+
+
+def test_export_with_extra_filter_in_archive(client):
+    rows = export_lines(client, site_code="qidian", special_mark="签约")
+    assert {row["book_id"] for row in rows if row["fetch_date"] == "2025-01-01"} == {
+        "book1",
+        "book3",
+        "book5",
+    }
+    assert all(row["extra_data"]["special_mark"] == "签约" for row in rows)
+
+
+def test_movers_between_archive_and_hot_snapshot(client):
+    response = client.get(
+        "/api/rankings/qidian/hot/movers",
+        params={"date": "2025-03-01", "previous_date": "2025-01-02"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["previous_date"] == "2025-01-02"
+    assert [book["book_id"] for book in data["new_entries"]] == ["new1"]
+    assert [(book["book_id"], book["previous_rank"]) for book in data["dropouts"]] == [
+        ("book4", 4)
+    ]
+    assert [(book["book_id"], book["change"]) for book in data["risers"]] == [
+        ("book3", 2)
+    ]
+    assert [(book["book_id"], book["change"]) for book in data["fallers"]] == [
+        ("book1", -1),
+        ("book2", -1),
+    ]
+    assert data["unchanged"] == 1
+
+
+def test_movers_default_previous_date_from_archive(client):
+    response = client.get(
+        "/api/rankings/qidian/hot/movers", params={"date": "2025-02-10"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["previous_date"] == "2025-01-02"
+    assert [(book["book_id"], book["change"]) for book in data["risers"]] == [
+        ("book2", 1)
+    ]
+    assert [(book["book_id"], book["change"]) for book in data["fallers"]] == [
+        ("book1", -1)
+    ]
+    assert data["new_entries"] == [] and data["dropouts"] == []
+
+    # 两个归档的快照之间对比
+    response = client.get(
+        "/api/rankings/qidian/hot/movers",
+        params={"date": "2025-01-02", "previous_date": "2025-01-01"},
+    )
+    assert response.status_code == 200
+    assert response.json()["unchanged"] == 5
+
+
+def test_movers_missing_snapshot_returns_404(client):
+    response = client.get(
+        "/api/rankings/qidian/hot/movers",
+        params={"date": "2025-03-01", "previous_date": "2025-01-15"},
+    )
+    assert response.status_code == 404
+    assert "2025-01-15" in response.json()["detail"]
+
+    # 对比的日期本身没有快照
+    response = client.get(
+        "/api/rankings/qidian/hot/movers",
+        params={"date": "2025-02-20", "previous_date": "2025-02-10"},
+    )
+    assert response.status_code == 404
+    assert "2025-02-20" in response.json()["detail"]
+
+    # 最早的快照之前没有可对比的数据
+    response = client.get(
+        "/api/rankings/qidian/hot/movers", params={"date": "2025-01-01"}
+    )
+    assert response.status_code == 404
+
+
+@pytest.fixture
+def missing_archive(client, tmp_path):
+    """删除已登记的2025-01归档文件"""
+    path = tmp_path / "archive" / "rankings-2025-01.db"
+    assert path.exists()
+    path.unlink()
+    return client
+
+
+@pytest.mark.parametrize(
+    "url, params",
+    [
+        ("/api/rankings", {"date": "2025-01-02"}),
+        ("/api/rankings/qidian", {"date": "2025-01-02"}),
+        ("/api/rankings/qidian/hot", {"date": "2025-01-02"}),
+        ("/api/rankings/qidian/hot/movers", {"date": "2025-02-10"}),
+        ("/api/export", {"site_code": "qidian"}),
+        ("/api/export", {"end_date": "2025-01-31", "format": "csv"}),
+        ("/api/books/book1/history", {"site_code": "qidian"}),
+    ],
+)
+def test_missing_archive_returns_503(missing_archive, url, params):
+    response = missing_archive.get(url, params=params)
+    assert response.status_code == 503
+    assert "rankings-2025-01.db" in response.json()["detail"]
+
+
+def test_missing_archive_does_not_affect_hot_dates(missing_archive):
+    response = missing_archive.get("/api/export", params={"start_date": "2025-02-01"})
+    assert response.status_code == 200
+    response = missing_archive.get(
+        "/api/rankings/qidian/hot/movers",
+        params={"date": "2025-03-01", "previous_date": "2025-02-10"},
+    )
+    assert response.status_code == 200
+
+
+def test_archived_month_rejects_writes(client, db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    with pytest.raises(ValueError, match="2025-01"):
+        db.save_ranking_batch(site_id, type_id, "2025-01-03", make_books(3))
+    assert not db.save_ranking_data(site_id, type_id, "2025-01-03", make_books(1)[0])
+    assert (
+        db.conn.execute(
+            "SELECT COUNT(*) FROM rankings WHERE fetch_date LIKE '2025-01-%'"
+        ).fetchone()[0]
+        == 0
+    )
+    # 未归档的月份照常写入
+    assert db.save_ranking_batch(site_id, type_id, "2025-02-11", make_books(3)) == (
+        3,
+        0,
+    )
@@ -0,0 +1,114 @@
+"""
+异步抓取引擎：站点并发抓取，数据库在事件循环所在的线程中写入；单站点并发数限制和重试
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+import booklist_db  # noqa: E402
+import http_client  # noqa: E402
+from conftest import StubAdapter, make_books  # noqa: E402
+
+SITES = ("ciweimao", "qidian", "fanqie")
+
+
+class AsyncStubAdapter(StubAdapter):
+    """异步抓取时等待其他站点也开始抓取，记录写入所在的线程"""
+
+    def __init__(self, db, site_code, rankings, started, fail=False):
+        super().__init__(db, site_code, rankings)
+        self.started = started
+        self.fail = fail
+        self.save_thread = None
+
+    async def fetch_data_async(self, fetcher):
+        assert isinstance(fetcher, http_client.AsyncSiteFetcher)
+        self.started.add(self.site_code)
+        # 所有站点都开始抓取后才返回，逐个抓取时超时
+        for _ in range(500):
+            if len(self.started) == len(SITES):
+                break
+            await asyncio.sleep(0.01)
+        else:
+            raise TimeoutError("其他站点没有同时开始抓取")
+        if self.fail:
+            raise httpx.ConnectError("模拟网络错误")
+        return self.fetch_data()
+
+    def process_data(self, data):
+        self.save_thread = threading.get_ident()
+        return super().process_data(data)
+
+
+def test_async_sites_overlap_and_write_in_loop_thread(db):
+    started = set()
+    adapters = [
+        AsyncStubAdapter(
+            db,
+            site_code,
+            {"hot": make_books(2, site_code)},
+            started,
+            fail=site_code == "fanqie",
+        )
+        for site_code in SITES
+    ]
+    timings = asyncio.run(booklist_db.fetch_sites_async(adapters))
+
+    success = {timing["site_code"]: timing["success"] for timing in timings}
+    assert success == {"ciweimao": True, "qidian": True, "fanqie": False}
+    assert {adapter.save_thread for adapter in adapters[:2]} == {threading.get_ident()}
+    rows = db.conn.execute(
+        "SELECT COUNT(*) FROM rankings GROUP BY site_id ORDER BY site_id"
+    ).fetchall()
+    assert [row[0] for row in rows] == [2, 2]
+
+
+def run_fetcher(handler, requests, **fetcher_options):
+    """用MockTransport回放响应，并发发送requests个请求，返回各响应"""
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            fetcher = http_client.AsyncSiteFetcher(client, **fetcher_options)
+            return await asyncio.gather(
+                *(fetcher.get(f"https://example.com/{i}") for i in range(requests))
+            )
+
+    return asyncio.run(run())
+
+
+def test_fetcher_limits_concurrency():
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return httpx.Response(200, text="ok")
+
+    responses = run_fetcher(handler, 10, concurrency=3)
+    assert [response.status_code for response in responses] == [200] * 10
+    assert state["peak"] == 3
+
+
+def test_fetcher_retries_retryable_status():
+    attempts = {}
+
+    def handler(request):
+        count = attempts[request.url.path] = attempts.get(request.url.path, 0) + 1
+        return httpx.Response(503 if count < 3 else 200)
+
+    responses = run_fetcher(handler, 2, retries=3, backoff_factor=0)
+    assert [response.status_code for response in responses] == [200, 200]
+    assert [response.retry_count for response in responses] == [2, 2]
+
+    responses = run_fetcher(
+        lambda request: httpx.Response(503), 1, retries=1, backoff_factor=0
+    )
+    assert responses[0].status_code == 503
+    assert responses[0].retry_count == 1
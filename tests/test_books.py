@@ -0,0 +1,86 @@
+"""
+books和authors表的写入：每批书籍一次查询读取已有书籍，属性没有变化时不写入
+"""
+
+import booklist_db
+from conftest import add_ranking_type, make_books
+
+
+def trace_statements(db):
+    """记录连接执行的语句，返回保存语句的列表"""
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    return statements
+
+
+def book_statements(statements, keyword):
+    return [
+        sql
+        for sql in statements
+        if keyword in sql and ("books" in sql or "authors" in sql)
+    ]
+
+
+def reopen(db):
+    """模拟下一次运行的抓取程序：新的进程没有书籍缓存"""
+    db.close()
+    return booklist_db.BooklistDatabase(db.db_path)
+
+
+def test_new_process_reads_existing_books_once_per_batch(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(120))
+
+    db = reopen(db)
+    try:
+        statements = trace_statements(db)
+        assert db.save_ranking_batch(
+            site_id, type_id, "2025-03-02", make_books(120)
+        ) == (120, 0)
+        # 一次读取作者，一次读取书籍，没有逐条的写入和查询
+        assert len(book_statements(statements, "SELECT")) == 2
+        assert book_statements(statements, "INSERT") == []
+    finally:
+        db.close()
+
+
+def test_new_books_cost_one_statement_each(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(10))
+
+    statements = trace_statements(db)
+    books = make_books(10) + make_books(5, "new", start=11)
+    assert db.save_ranking_batch(site_id, type_id, "2025-03-02", books) == (15, 0)
+    # 未缓存的5本新书一次查询，新书和新作者各一条upsert，已缓存的书籍不执行任何语句
+    assert len(book_statements(statements, "SELECT")) == 2
+    assert len(book_statements(statements, "INSERT INTO books")) == 5
+    assert len(book_statements(statements, "INSERT INTO authors")) == 5
+
+
+def test_changed_attributes_are_updated_and_empty_values_kept(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    books = make_books(3)
+    for book in books:
+        book["latest_chapter"] = "第1章"
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", books)
+
+    db = reopen(db)
+    try:
+        statements = trace_statements(db)
+        books = make_books(3)
+        books[0]["latest_chapter"] = "第2章"  # 属性有变化
+        books[1]["latest_chapter"] = ""  # 空值不覆盖已有的值
+        books[2]["latest_chapter"] = "第1章"
+        db.save_ranking_batch(site_id, type_id, "2025-03-02", books)
+        assert len(book_statements(statements, "INSERT INTO books")) == 1
+
+        rows = db.conn.execute(
+            "SELECT book_id, latest_chapter FROM books ORDER BY book_id"
+        ).fetchall()
+        assert rows == [("book1", "第2章"), ("book2", "第1章"), ("book3", "第1章")]
+        # 两天的快照引用同一本书
+        assert db.conn.execute(
+            "SELECT COUNT(DISTINCT book_ref), COUNT(*) FROM rankings"
+        ).fetchone() == (3, 6)
+    finally:
+        db.close()
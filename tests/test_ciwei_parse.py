@@ -0,0 +1,107 @@
+"""
+刺猬猫榜单解析：一次遍历的解析结果与重构前的实现(benchmarks/ciwei_legacy.py)一致
+"""
+
+import os
+import sys
+
+import pytest
+from lxml import etree
+
+from conftest import ROOT_DIR, load_fixture
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+import ciwei  # noqa: E402
+import ciwei_legacy  # noqa: E402
+import fixtures  # noqa: E402
+
+
+def parse_both(html_content):
+    html_tree = etree.HTML(html_content)
+    legacy = {
+        "weekly_clicks": ciwei_legacy.parse_weekly_clicks(html_tree),
+        "monthly_votes": ciwei_legacy.parse_monthly_votes(html_tree),
+        "new_books": ciwei_legacy.parse_new_books(html_tree),
+    }
+    return legacy, ciwei.parse_rankings(html_tree)
+
+
+def page(*blocks, filler=3):
+    body = "".join(fixtures._filler_blocks("n", filler) + list(blocks))
+    return f"<html><body>{body}</body></html>"
+
+
+def weekly_block(rows=None):
+    rows = rows or [fixtures._ciweimao_row("w", rank, f"{rank}万") for rank in (2, 3)]
+    return fixtures._ciweimao_block(
+        "title-box icon-book",
+        "周点击榜",
+        [fixtures._ciweimao_top1("w", "12.3万")] + rows,
+    )
+
+
+def monthly_block():
+    return fixtures._ciweimao_block(
+        "title-box icon-book",
+        "月票榜",
+        [fixtures._ciweimao_top1("m", "8888")]
+        + [fixtures._ciweimao_row("m", rank, str(1000 - rank)) for rank in (2, 3)],
+    )
+
+
+def new_books_block():
+    return fixtures._ciweimao_block(
+        "title-box icon-cat",
+        "新书榜",
+        [fixtures._ciweimao_new_book(rank) for rank in (1, 2, 3)],
+    )
+
+
+def test_parity_on_recorded_fixture():
+    legacy, current = parse_both(load_fixture("ciweimao.html"))
+    assert current == legacy
+    assert all(current.values())
+
+
+@pytest.mark.parametrize("filler", [0, 50])
+def test_parity_on_generated_page(filler):
+    legacy, current = parse_both(fixtures.build_ciweimao_page(filler))
+    assert current == legacy
+    assert [len(items) for items in current.values()] == [10, 10, 10]
+
+
+@pytest.mark.parametrize(
+    "html_content",
+    [
+        # 榜单顺序不同
+        page(new_books_block(), monthly_block(), weekly_block()),
+        # 缺少月票榜
+        page(weekly_block(), new_books_block()),
+        # 点击榜条目没有分类
+        page(
+            weekly_block(
+                [
+                    '<li><a href="https://www.ciweimao.com/book/2w">'
+                    '<i class="icon-top">2</i> 无分类书籍 <span class="num">2万</span></a></li>'
+                ]
+            ),
+            monthly_block(),
+            new_books_block(),
+        ),
+        # 没有任何榜单
+        page(filler=5),
+    ],
+    ids=["reordered", "missing-block", "no-category", "empty"],
+)
+def test_parity_on_page_variants(html_content, capsys):
+    legacy, current = parse_both(html_content)
+    assert current == legacy
+
+
+def test_single_ranking_helpers_match_parse_rankings():
+    html_tree = etree.HTML(load_fixture("ciweimao.html"))
+    rankings = ciwei.parse_rankings(html_tree)
+    assert ciwei.parse_weekly_clicks(html_tree) == rankings["weekly_clicks"]
+    assert ciwei.parse_monthly_votes(html_tree) == rankings["monthly_votes"]
+    assert ciwei.parse_new_books(html_tree) == rankings["new_books"]
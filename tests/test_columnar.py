@@ -0,0 +1,142 @@
+"""
+Parquet列式快照：每天一个文件，写入后读取的结果与数据库一致
+"""
+
+import os
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow.dataset as ds  # noqa: E402
+
+import columnar  # noqa: E402
+from conftest import add_ranking_type, make_books  # noqa: E402
+
+
+@pytest.fixture
+def snapshots(db):
+    """qidian的hot榜单在2025-01-01和2025-01-02各有一个快照"""
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    for fetch_date in ("2025-01-01", "2025-01-02"):
+        db.save_ranking_batch(site_id, type_id, fetch_date, make_books(3))
+    return site_id, type_id
+
+
+def write_day(db, root, type_id, fetch_date):
+    return columnar.write_snapshot(db.conn, root, "qidian", "hot", type_id, fetch_date)
+
+
+def month_dir(root, month="2025-01"):
+    return columnar.partition_path(root, "qidian", "hot", month)
+
+
+def test_write_snapshot_one_file_per_day(db, snapshots, tmp_path):
+    root = str(tmp_path / "parquet")
+    _, type_id = snapshots
+    assert write_day(db, root, type_id, "2025-01-01") == 3
+    assert write_day(db, root, type_id, "2025-01-02") == 3
+    assert sorted(os.listdir(month_dir(root))) == [
+        "part-2025-01-01.parquet",
+        "part-2025-01-02.parquet",
+    ]
+
+    table = columnar.read_snapshots(root)
+    assert table.num_rows == 6
+    rows = table.to_pylist()
+    assert [(row["fetch_date"], row["rank"]) for row in rows] == [
+        ("2025-01-01", 1),
+        ("2025-01-01", 2),
+        ("2025-01-01", 3),
+        ("2025-01-02", 1),
+        ("2025-01-02", 2),
+        ("2025-01-02", 3),
+    ]
+    first = rows[0]
+    assert first["site_code"] == "qidian"
+    assert first["ranking_type"] == "hot"
+    assert first["month"] == "2025-01"
+    assert first["book_id"] == "book1"
+    assert first["title"] == "book书名1"
+    assert first["author"] == "book作者1"
+    assert first["indicator_num"] == 999
+    assert first["extra_special_mark"] == "签约"
+    assert first["extra_rank_score"] == "0.1"
+
+    table = columnar.read_snapshots(
+        root,
+        start_date="2025-01-02",
+        columns=["fetch_date", "book_id"],
+        filter=ds.field("rank") <= 2,
+    )
+    assert table.to_pylist() == [
+        {"fetch_date": "2025-01-02", "book_id": "book1"},
+        {"fetch_date": "2025-01-02", "book_id": "book2"},
+    ]
+
+
+def test_refetch_replaces_only_that_day(db, snapshots, tmp_path):
+    root = str(tmp_path / "parquet")
+    site_id, type_id = snapshots
+    write_day(db, root, type_id, "2025-01-01")
+    write_day(db, root, type_id, "2025-01-02")
+    first_day = os.path.join(month_dir(root), "part-2025-01-01.parquet")
+    modified = os.stat(first_day).st_mtime_ns
+
+    db.save_ranking_batch(site_id, type_id, "2025-01-02", make_books(2, "new"))
+    assert write_day(db, root, type_id, "2025-01-02") == 2
+
+    assert os.stat(first_day).st_mtime_ns == modified
+    table = columnar.read_snapshots(root, columns=["fetch_date", "book_id"])
+    assert table.to_pylist()[3:] == [
+        {"fetch_date": "2025-01-02", "book_id": "new1"},
+        {"fetch_date": "2025-01-02", "book_id": "new2"},
+    ]
+
+
+def test_legacy_month_file_is_split(db, snapshots, tmp_path):
+    root = str(tmp_path / "parquet")
+    _, type_id = snapshots
+    rows = db.conn.execute(
+        columnar.SNAPSHOT_QUERY.format(rankings="rankings"),
+        (type_id, "2025-01-01", "2025-02-01"),
+    ).fetchall()
+    columnar.write_table(
+        os.path.join(month_dir(root), columnar.LEGACY_FILE_NAME),
+        columnar.snapshot_table(rows),
+    )
+
+    write_day(db, root, type_id, "2025-01-02")
+    assert sorted(os.listdir(month_dir(root))) == [
+        "part-2025-01-01.parquet",
+        "part-2025-01-02.parquet",
+    ]
+    assert columnar.read_snapshots(root).num_rows == 6
+
+
+def test_export_snapshots_round_trip_with_archive(db, snapshots, tmp_path):
+    root = str(tmp_path / "parquet")
+    site_id, type_id = snapshots
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(4))
+    db.archive_old_snapshots(keep_days=10, today=date(2025, 3, 1))
+    # 已导出的月份中多余的文件在重新导出时删除
+    os.makedirs(month_dir(root))
+    stale = os.path.join(month_dir(root), "part-2025-01-15.parquet")
+    open(stale, "w").close()
+
+    assert columnar.export_snapshots(db.conn, root) == (3, 10)
+    assert not os.path.exists(stale)
+    assert os.listdir(month_dir(root, "2025-03")) == ["part-2025-03-01.parquet"]
+
+    table = columnar.read_snapshots(root, columns=["fetch_date", "rank", "book_id"])
+    expected = [
+        {"fetch_date": fetch_date, "rank": rank, "book_id": f"book{rank}"}
+        for fetch_date, count in (
+            ("2025-01-01", 3),
+            ("2025-01-02", 3),
+            ("2025-03-01", 4),
+        )
+        for rank in range(1, count + 1)
+    ]
+    assert table.to_pylist() == expected
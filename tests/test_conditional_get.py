@@ -0,0 +1,102 @@
+"""
+榜单接口的条件请求：ETag / Last-Modified，数据未变化时返回304
+"""
+
+from email.utils import formatdate
+
+import pytest
+
+import api
+from conftest import add_ranking_type, make_books
+
+URL = "/api/rankings/qidian/hot"
+
+
+def publish(db, site_id, type_id, fetch_date, books):
+    with db.transaction():
+        db.save_ranking_batch(site_id, type_id, fetch_date, books)
+        db.bump_generation()
+
+
+@pytest.fixture
+def client(db, api_client, monkeypatch):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    publish(db, site_id, type_id, "2025-01-01", make_books(3))
+    monkeypatch.setattr(api, "GENERATION_CHECK_INTERVAL", 0)
+    api_client.ranking = (site_id, type_id)
+    return api_client
+
+
+def generation_time(db):
+    return db.conn.execute(
+        "SELECT value FROM meta WHERE key = 'generation_time'"
+    ).fetchone()[0]
+
+
+def test_response_has_validators(client, db):
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.headers["last-modified"] == formatdate(
+        generation_time(db), usegmt=True
+    )
+
+
+@pytest.mark.parametrize(
+    "if_none_match",
+    ["{etag}", "W/{etag}", '"other", {etag}', "*"],
+)
+def test_matching_etag_returns_304(client, if_none_match):
+    etag = client.get(URL).headers["etag"]
+    response = client.get(
+        URL, headers={"If-None-Match": if_none_match.format(etag=etag)}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_different_etag_returns_body(client):
+    response = client.get(URL, headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert len(response.json()["books"]) == 3
+
+
+def test_if_modified_since(client, db):
+    updated_at = generation_time(db)
+    response = client.get(
+        URL, headers={"If-Modified-Since": formatdate(updated_at, usegmt=True)}
+    )
+    assert response.status_code == 304
+    response = client.get(
+        URL, headers={"If-Modified-Since": formatdate(updated_at - 60, usegmt=True)}
+    )
+    assert response.status_code == 200
+    # If-None-Match不匹配时不再看If-Modified-Since
+    response = client.get(
+        URL,
+        headers={
+            "If-None-Match": '"other"',
+            "If-Modified-Since": formatdate(updated_at, usegmt=True),
+        },
+    )
+    assert response.status_code == 200
+
+
+def test_etag_changes_after_generation_bump(client, db):
+    etag = client.get(URL).headers["etag"]
+    site_id, type_id = client.ranking
+    publish(db, site_id, type_id, "2025-01-01", make_books(2, "new"))
+
+    response = client.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert [book["book_id"] for book in response.json()["books"]] == ["new1", "new2"]
+
+
+def test_etag_depends_on_resolved_date_and_options(client):
+    etag = client.get(URL).headers["etag"]
+    assert client.get(URL, params={"date": "2025-01-01"}).headers["etag"] == etag
+    assert client.get(URL, params={"include_extra": "false"}).headers["etag"] != etag
+    assert client.get("/api/rankings/qidian").headers["etag"] != etag
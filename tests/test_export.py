@@ -0,0 +1,145 @@
+"""
+导出查询的执行计划：各种筛选条件下都由索引给出输出顺序，不使用临时B树排序
+"""
+
+import itertools
+import sqlite3
+from datetime import date
+
+import pytest
+
+import api
+import archive
+from conftest import add_ranking_type, make_books
+
+
+@pytest.fixture
+def export_conn(db):
+    """两个站点有同名榜单，2025-01的数据已归档，返回附加了归档文件的只读连接"""
+    qidian_id, qidian_type = add_ranking_type(db, "qidian", "hot")
+    fanqie_id, fanqie_type = add_ranking_type(db, "fanqie", "hot")
+    for fetch_date in ("2025-01-01", "2025-01-02", "2025-03-01"):
+        db.save_ranking_batch(qidian_id, qidian_type, fetch_date, make_books(5))
+        db.save_ranking_batch(fanqie_id, fanqie_type, fetch_date, make_books(5, "fq"))
+    db.archive_old_snapshots(keep_days=10, today=date(2025, 3, 1))
+
+    conn = sqlite3.connect(db.db_path)
+    conn.row_factory = sqlite3.Row
+    tables = list(archive.iter_rankings_tables(conn))
+    assert len(tables) == 2
+    yield conn, tables
+    conn.close()
+
+
+FILTER_CASES = list(
+    itertools.product(
+        (None, "qidian"),
+        (None, "hot"),
+        ((None, None), ("2025-01-01", None), ("2025-01-01", "2025-03-31")),
+        (
+            None,
+            {"special_mark": "签约"},
+            {"update_rate": "日更"},
+            {"min_rank_score": 0.2},
+        ),
+    )
+)
+
+
+def page_plans(conn, table, query, params, key_columns):
+    """第一页和后续页(带键集分页条件)的执行计划"""
+    last_key = {
+        "r.fetch_date": "2025-01-01",
+        "r.ranking_type_id": 1,
+        "r.rank": 3,
+    }
+    for after in (None, [last_key[column] for column in key_columns]):
+        page_query, page_params = api.export_page_query(query, key_columns, after)
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN " + page_query.format(rankings=table),
+            params + page_params,
+        ).fetchall()
+        yield after, [row["detail"] for row in plan]
+
+
+@pytest.mark.parametrize("site_code, ranking_type, dates, filters", FILTER_CASES)
+def test_export_query_has_no_temp_sort(
+    export_conn, site_code, ranking_type, dates, filters
+):
+    conn, tables = export_conn
+    query, params, key_columns = api.build_export_query(
+        conn, site_code, ranking_type, dates[0], dates[1], True, filters
+    )
+    for table in tables:
+        for after, details in page_plans(conn, table, query, params, key_columns):
+            assert not any("TEMP B-TREE" in detail for detail in details), details
+            if after is not None:
+                # 后续页由索引直接定位到上一页之后，不需要从头扫描
+                assert any(
+                    detail.startswith("SEARCH r") and ">" in detail
+                    for detail in details
+                ), details
+
+
+def export_rows(conn, tables, query, params, key_columns):
+    """模拟iter_export_batches逐页读取，返回所有行和读取的页数"""
+    rows, pages = [], 0
+    for table in tables:
+        after = None
+        while True:
+            page_query, page_params = api.export_page_query(query, key_columns, after)
+            page = conn.execute(
+                page_query.format(rankings=table), params + page_params
+            ).fetchall()
+            pages += 1
+            rows += [tuple(row)[: len(api.EXPORT_COLUMNS)] for row in page]
+            if len(page) < api.EXPORT_BATCH_SIZE:
+                break
+            after = tuple(page[-1])[len(api.EXPORT_COLUMNS) :]
+    return rows, pages
+
+
+def test_export_query_orders_by_date_type_rank(export_conn):
+    conn, tables = export_conn
+    rows, _ = export_rows(conn, tables, *api.build_export_query(conn))
+    rows = [row[:4] for row in rows]
+    assert len(rows) == 30
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+    for fetch_date, group in itertools.groupby(rows, key=lambda row: row[0]):
+        assert [row[3] for row in group] == list(range(1, 6)) * 2, fetch_date
+
+
+@pytest.mark.parametrize("site_code, ranking_type", [(None, None), ("qidian", "hot")])
+def test_export_pages_match_single_query(
+    export_conn, monkeypatch, site_code, ranking_type
+):
+    conn, tables = export_conn
+    expected, _ = export_rows(
+        conn, tables, *api.build_export_query(conn, site_code, ranking_type)
+    )
+    monkeypatch.setattr(api, "EXPORT_BATCH_SIZE", 4)
+    rows, pages = export_rows(
+        conn, tables, *api.build_export_query(conn, site_code, ranking_type)
+    )
+    assert rows == expected
+    assert pages > len(tables)
+
+
+def test_export_releases_connection_between_pages(export_conn, db, monkeypatch):
+    """导出过程中连接在每页读取完后归还连接池"""
+    pool = api.ConnectionPool(db.db_path, size=1, timeout=0.1)
+    monkeypatch.setattr(api, "db_pool", pool)
+    monkeypatch.setattr(api, "EXPORT_BATCH_SIZE", 4)
+    try:
+        with api.get_db_connection() as conn:
+            query, params, key_columns = api.build_export_query(conn)
+        batches = api.iter_export_batches(query, params, key_columns)
+        rows = list(next(batches))
+        # 唯一的连接已归还，其他请求可以在导出的两页之间使用
+        with api.get_db_connection() as conn:
+            assert not conn.in_transaction
+        for batch in batches:
+            rows += batch
+        assert len(rows) == 30
+    finally:
+        pool.close()
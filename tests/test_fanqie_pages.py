@@ -0,0 +1,97 @@
+"""
+番茄小说分页抓取：不足一页时结束，中途有一页失败时放弃本次抓取
+"""
+
+import asyncio
+
+import pytest
+
+import booklist_db
+
+
+def api_books(start, count):
+    return [
+        {"book_id": f"fq{n}", "book_name": f"番茄{n}", "author": "作者"}
+        for n in range(start, start + count)
+    ]
+
+
+@pytest.fixture
+def adapter(db):
+    site = db.conn.execute(
+        """
+    SELECT site_id, site_code, site_name, site_url, fetch_type, api_url
+    FROM sites WHERE site_code = 'fanqie'
+    """
+    ).fetchone()
+    adapter = booklist_db.FanqieAdapter(*site, db)
+    adapter.api_url = "https://example.com/top_book_list?limit=3&offset=0"
+    return adapter
+
+
+def serve_pages(adapter, pages):
+    """以 {offset: 书籍列表或None} 代替网络请求，None表示该页请求失败"""
+    adapter.fetch_page = lambda offset: pages.get(offset, [])
+
+    async def fetch_page_async(fetcher, offset):
+        return pages.get(offset, [])
+
+    adapter.fetch_page_async = fetch_page_async
+
+
+def hot_list(db):
+    return db.conn.execute(
+        """
+    SELECT r.rank, b.book_id FROM rankings r
+    JOIN ranking_types rt ON rt.ranking_type_id = r.ranking_type_id
+    JOIN books b ON b.book_ref = r.book_ref
+    WHERE rt.type_code = 'hot_list' ORDER BY r.rank
+    """
+    ).fetchall()
+
+
+def test_pages_are_merged_until_a_short_page(db, adapter):
+    # 翻页期间榜单变动，fq3同时出现在第1、2页，只保留第一次出现的位置
+    serve_pages(
+        adapter,
+        {
+            0: api_books(1, 3),
+            3: api_books(3, 3),
+            6: api_books(6, 3),
+            9: api_books(9, 1),
+        },
+    )
+    assert adapter.fetch_and_save()
+    assert hot_list(db) == [(rank, f"fq{rank}") for rank in range(1, 10)]
+
+
+def test_failed_page_keeps_existing_snapshot(db, adapter, caplog):
+    serve_pages(adapter, {0: api_books(1, 3), 3: api_books(4, 2)})
+    assert adapter.fetch_and_save()
+
+    serve_pages(adapter, {0: api_books(11, 3), 3: None, 6: api_books(17, 1)})
+    assert adapter.fetch_data() is None
+    assert "第 2 页请求失败" in caplog.text
+    assert not adapter.fetch_and_save()
+    assert hot_list(db) == [(rank, f"fq{rank}") for rank in range(1, 6)]
+
+
+def test_failed_first_page_fails_the_run(db, adapter):
+    serve_pages(adapter, {0: None})
+    assert adapter.fetch_data() is None
+    assert asyncio.run(adapter.fetch_data_async(None)) is None
+    assert not adapter.fetch_and_save()
+    assert db.conn.execute(
+        "SELECT status FROM fetch_logs ORDER BY log_id DESC LIMIT 1"
+    ).fetchone() == ("失败",)
+
+
+def test_async_pages(db, adapter):
+    serve_pages(adapter, {0: api_books(1, 3), 3: None})
+    assert asyncio.run(adapter.fetch_data_async(None)) is None
+
+    serve_pages(adapter, {0: api_books(1, 3), 3: api_books(4, 3)})
+    pages = asyncio.run(adapter.fetch_data_async(None))
+    assert [len(page) for page in pages] == [3, 3, 0]
+    assert adapter.save_fetched_data(pages)
+    assert len(hot_list(db)) == 6
@@ -0,0 +1,104 @@
+"""
+抓取缓存：页面返回304或内容哈希相同、或榜单数据与今天已保存的相同时，跳过解析和写入
+"""
+
+from conftest import StubAdapter, generation, load_fixture, make_books, make_response
+
+
+def fetch_statuses(db):
+    return [
+        row[0]
+        for row in db.conn.execute("SELECT status FROM fetch_logs ORDER BY log_id")
+    ]
+
+
+def ranking_count(db):
+    return db.conn.execute("SELECT COUNT(*) FROM rankings").fetchone()[0]
+
+
+def test_not_modified_page_skips_parse_and_write(db, ciweimao, server):
+    page = load_fixture("ciweimao.html").encode("utf-8")
+    server.responses = [
+        make_response(200, page, {"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025"}),
+        make_response(304),
+        make_response(200, page),
+    ]
+
+    assert ciweimao().fetch_and_save()
+    rows = ranking_count(db)
+    assert rows > 0
+    assert server.requests[0] == {}
+    version = generation(db)
+
+    # 第二次抓取带上验证信息，服务器返回304
+    assert ciweimao().fetch_and_save()
+    assert server.requests[1] == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Wed, 01 Jan 2025",
+    }
+
+    # 服务器不支持条件请求时，按内容哈希判断
+    assert ciweimao().fetch_and_save()
+    assert fetch_statuses(db) == ["成功", "未变化", "未变化"]
+    assert ranking_count(db) == rows
+    assert generation(db) == version
+
+
+def test_cache_from_earlier_day_is_ignored(db, ciweimao, server, fetch_cache):
+    page = load_fixture("ciweimao.html").encode("utf-8")
+    fetch_cache.update(
+        {
+            "https://www.ciweimao.com/": {
+                "etag": '"v1"',
+                "content_hash": "stale",
+                "saved_date": "2000-01-01",
+            }
+        }
+    )
+    adapter = ciweimao()
+    server.responses = [make_response(200, page)]
+    assert adapter.fetch_and_save()
+    assert server.requests[0] == {}
+    assert fetch_statuses(db) == ["成功"]
+
+
+def test_failed_page_is_not_cached(db, ciweimao, server, fetch_cache):
+    server.responses = [make_response(500, b"error", {"ETag": '"v1"'})]
+    assert not ciweimao().fetch_and_save()
+    assert fetch_cache.get("https://www.ciweimao.com/") is None
+
+
+def test_unchanged_data_is_rolled_back(db):
+    rankings = {"hot": make_books(3), "new": make_books(2, "new")}
+    assert StubAdapter(db, "qidian", rankings).fetch_and_save()
+    version = generation(db)
+
+    # 页面变化但榜单数据相同，写入回滚，数据版本号不变
+    assert StubAdapter(db, "qidian", rankings).fetch_and_save()
+    assert fetch_statuses(db) == ["成功", "未变化"]
+    assert generation(db) == version
+    assert ranking_count(db) == 5
+
+    changed = dict(rankings, new=make_books(2, "other"))
+    assert StubAdapter(db, "qidian", changed).fetch_and_save()
+    assert fetch_statuses(db) == ["成功", "未变化", "成功"]
+    assert generation(db) == version + 1
+    book_ids = [
+        row[0]
+        for row in db.conn.execute(
+            """
+            SELECT b.book_id FROM rankings r JOIN books b ON b.book_ref = r.book_ref
+            JOIN ranking_types rt ON rt.ranking_type_id = r.ranking_type_id
+            WHERE rt.type_code = 'new' ORDER BY r.rank
+            """
+        )
+    ]
+    assert book_ids == ["other1", "other2"]
+
+
+def test_cache_disabled_always_writes(db, monkeypatch):
+    monkeypatch.setattr(StubAdapter, "use_fetch_cache", False)
+    rankings = {"hot": make_books(3)}
+    for _ in range(2):
+        assert StubAdapter(db, "qidian", rankings).fetch_and_save()
+    assert fetch_statuses(db) == ["成功", "成功"]
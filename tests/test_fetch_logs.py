@@ -0,0 +1,149 @@
+"""
+fetch_logs中的各阶段耗时和数据量统计，以及/api/fetch-logs的汇总
+"""
+
+import json
+import time
+
+import pytest
+
+from conftest import StubAdapter, load_fixture, make_books, make_response
+
+
+def latest_log(db):
+    columns = [
+        row[1] for row in db.conn.execute("PRAGMA table_info(fetch_logs)").fetchall()
+    ]
+    row = db.conn.execute(
+        "SELECT * FROM fetch_logs ORDER BY log_id DESC LIMIT 1"
+    ).fetchone()
+    return dict(zip(columns, row))
+
+
+def test_crawl_records_phase_stats(db, ciweimao, server):
+    page = load_fixture("ciweimao.html").encode("utf-8")
+    response = make_response(200, page)
+    response.retry_count = 2
+    server.responses = [response]
+
+    assert ciweimao().fetch_and_save()
+    log = latest_log(db)
+    assert log["status"] == "成功"
+    assert log["bytes_downloaded"] == len(page)
+    assert log["retry_count"] == 2
+    assert log["rows_rejected"] == 0
+    assert log["fetch_seconds"] > 0
+    assert log["parse_seconds"] > 0
+    assert log["save_seconds"] > 0
+    row_counts = json.loads(log["row_counts"])
+    assert set(row_counts) == {"weekly_clicks", "monthly_votes", "new_books"}
+    assert sum(row_counts.values()) == log["items_fetched"]
+
+
+class SlowParseAdapter(StubAdapter):
+    """榜单数据在写入时才逐条解析，每条耗时delay秒"""
+
+    delay = 0.02
+
+    def slow_books(self, books):
+        for book in books:
+            time.sleep(self.delay)
+            yield book
+
+    def process_data(self, data):
+        return (
+            (code, self.timed_parse(self.slow_books(books)))
+            for code, books in data.items()
+        )
+
+
+def test_lazy_parse_time_is_not_counted_as_save(db):
+    books = make_books(5) + [{"rank": 6, "title": ""}]
+    assert SlowParseAdapter(db, "qidian", {"hot": books}).fetch_and_save()
+    log = latest_log(db)
+    assert log["parse_seconds"] >= 6 * SlowParseAdapter.delay
+    assert log["save_seconds"] < log["parse_seconds"]
+    assert log["rows_rejected"] == 1
+    assert json.loads(log["row_counts"]) == {"hot": 5}
+
+
+def test_failed_run_is_logged(db, ciweimao, server):
+    server.responses = [make_response(503, b"busy")]
+    assert not ciweimao().fetch_and_save()
+    log = latest_log(db)
+    assert log["status"] == "失败"
+    assert log["bytes_downloaded"] == 4
+    assert log["row_counts"] == "{}"
+
+
+def add_runs(db, site_code, runs):
+    site_id = db.conn.execute(
+        "SELECT site_id FROM sites WHERE site_code = ?", (site_code,)
+    ).fetchone()[0]
+    for status, fetch_seconds, hot in runs:
+        db.log_fetch_activity(
+            site_id,
+            status,
+            items_fetched=hot,
+            fetch_seconds=fetch_seconds,
+            parse_seconds=0.1,
+            save_seconds=0.2,
+            bytes_downloaded=1000,
+            retry_count=0,
+            rows_rejected=0,
+            row_counts={"hot": hot},
+        )
+
+
+@pytest.fixture
+def logs_client(db, api_client):
+    add_runs(
+        db,
+        "qidian",
+        [
+            ("成功", 1.0, 10),
+            ("成功", 1.0, 10),
+            ("失败", 9.0, 0),
+            ("未变化", 0.5, 0),
+            ("成功", 2.0, 20),
+            ("成功", 2.0, 20),
+        ],
+    )
+    add_runs(db, "fanqie", [("成功", 3.0, 30)])
+    return api_client
+
+
+def test_fetch_logs_summary(logs_client):
+    response = logs_client.get("/api/fetch-logs", params={"site_code": "qidian"})
+    assert response.status_code == 200
+    (site,) = response.json()["sites"]
+    assert site["site_code"] == "qidian"
+    assert site["runs"] == 6
+    assert site["status_counts"] == {"成功": 4, "失败": 1, "未变化": 1}
+    assert site["success_rate"] == round(4 / 6, 4)
+    # 耗时只统计成功的抓取
+    assert site["stats"]["fetch_seconds"] == {
+        "p50": 2.0,
+        "p95": 2.0,
+        "max": 2.0,
+        "mean": 1.5,
+    }
+    # 较新的两次成功抓取耗时是较旧两次的2倍
+    assert site["trend"]["fetch_seconds"] == 2.0
+    assert site["trend"]["save_seconds"] == 1.0
+    assert site["row_counts"]["hot"]["max"] == 20
+    assert site["latest"]["status"] == "成功"
+    assert site["latest"]["row_counts"] == {"hot": 20}
+
+
+def test_fetch_logs_limit_and_sites(logs_client):
+    data = logs_client.get("/api/fetch-logs", params={"limit": 2}).json()
+    assert data["limit"] == 2
+    sites = {site["site_code"]: site for site in data["sites"]}
+    assert set(sites) == {"qidian", "fanqie"}
+    assert sites["qidian"]["runs"] == 2
+    assert sites["qidian"]["status_counts"] == {"成功": 2}
+    assert sites["fanqie"]["trend"] == {}
+
+    response = logs_client.get("/api/fetch-logs", params={"site_code": "unknown"})
+    assert response.status_code == 404
@@ -0,0 +1,132 @@
+"""
+指标文本解析为数值和规范单位，写入indicator_num / indicator_unit，以及跨站点的指标排行
+"""
+
+import pytest
+
+from booklist_db import indicator_fields, parse_indicator
+from conftest import add_ranking_type
+
+
+@pytest.mark.parametrize(
+    "text, unit, expected",
+    [
+        ("74.0万", "", (740000, "")),
+        ("1.2", "万月票", (12000, "月票")),
+        ("12.5万点击", "", (125000, "点击")),
+        ("3亿", "", (300000000, "")),
+        ("1,234", "", (1234, "")),
+        ("  8888 ", "月票", (8888, "月票")),
+        ("+100", "推荐", (100, "推荐")),
+        ("0.5", "", (0.5, "")),
+        ("abc", "月票", (None, "月票")),
+        ("", "", (None, "")),
+        (None, "", (None, "")),
+    ],
+)
+def test_parse_indicator(text, unit, expected):
+    assert parse_indicator(text, unit) == expected
+
+
+def test_parse_indicator_types():
+    assert isinstance(parse_indicator("74.0万")[0], int)
+    assert isinstance(parse_indicator("1.25")[0], float)
+
+
+@pytest.mark.parametrize(
+    "book, default_unit, expected",
+    [
+        (
+            {"indicator_value": "1.2", "indicator_unit": "万月票"},
+            "",
+            ("1.2", 12000, "月票"),
+        ),
+        # 刺猬猫的clicks/votes字段按字段名确定单位
+        ({"clicks": "12.3万"}, "", ("12.3万", 123000, "点击")),
+        ({"votes": "888"}, "", ("888", 888, "月票")),
+        # 没有单位时沿用同一榜单中前面书籍的单位
+        ({"indicator_value": "500"}, "月票", ("500", 500, "月票")),
+        # 无法解析时不使用默认单位
+        ({"indicator_value": "暂无"}, "月票", ("暂无", None, "")),
+        ({}, "", ("", None, "")),
+    ],
+)
+def test_indicator_fields(book, default_unit, expected):
+    assert indicator_fields(book, default_unit) == expected
+
+
+def stored_indicators(db, fetch_date):
+    return db.conn.execute(
+        """
+        SELECT rank, indicator_value, indicator_num, indicator_unit FROM rankings
+        WHERE fetch_date = ? ORDER BY ranking_type_id, rank
+        """,
+        (fetch_date,),
+    ).fetchall()
+
+
+def test_batch_stores_parsed_indicators(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "monthly")
+    books = [
+        {
+            "rank": 1,
+            "title": "甲",
+            "indicator_value": "1.2",
+            "indicator_unit": "万月票",
+        },
+        {"rank": 2, "title": "乙", "indicator_value": "9800"},
+        {"rank": 3, "title": "丙", "indicator_value": "未知"},
+    ]
+    assert db.save_ranking_batch(site_id, type_id, "2025-01-01", books) == (3, 0)
+    assert [tuple(row) for row in stored_indicators(db, "2025-01-01")] == [
+        (1, "1.2", 12000, "月票"),
+        (2, "9800", 9800, "月票"),
+        (3, "未知", None, ""),
+    ]
+
+
+def test_top_indicators_across_sites(db, api_client):
+    qidian_id, qidian_type = add_ranking_type(db, "qidian", "monthly")
+    ciwei_id, ciwei_type = add_ranking_type(db, "ciweimao", "monthly_votes")
+    db.save_ranking_batch(
+        qidian_id,
+        qidian_type,
+        "2025-01-01",
+        [
+            {
+                "rank": 1,
+                "book_id": "q1",
+                "title": "起点一",
+                "indicator_value": "1.2",
+                "indicator_unit": "万月票",
+            },
+            {"rank": 2, "book_id": "q2", "title": "起点二", "indicator_value": "3000"},
+        ],
+    )
+    db.save_ranking_batch(
+        ciwei_id,
+        ciwei_type,
+        "2025-01-01",
+        [
+            {"rank": 1, "book_id": "c1", "title": "刺猬一", "votes": "8888"},
+            {"rank": 2, "book_id": "c2", "title": "刺猬二", "clicks": "99万"},
+        ],
+    )
+
+    response = api_client.get("/api/indicators/top", params={"unit": "月票"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["fetch_date"] == "2025-01-01"
+    assert [(book["book_id"], book["indicator_num"]) for book in data["books"]] == [
+        ("q1", 12000),
+        ("c1", 8888),
+        ("q2", 3000),
+    ]
+
+    response = api_client.get(
+        "/api/indicators/top", params={"unit": "月票", "site_code": "ciweimao"}
+    )
+    assert [book["book_id"] for book in response.json()["books"]] == ["c1"]
+
+    response = api_client.get("/api/indicators/top", params={"unit": "推荐"})
+    assert response.status_code == 404
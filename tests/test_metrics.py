@@ -0,0 +1,134 @@
+"""
+/metrics接口的输出和SQLite语句标签
+"""
+
+import re
+from datetime import date
+
+import pytest
+
+import metrics
+from conftest import add_ranking_type, make_books
+
+
+@pytest.mark.parametrize(
+    "sql, label",
+    [
+        ("SELECT * FROM archive_2025_01.rankings r JOIN books b", "SELECT rankings"),
+        ("SELECT * FROM archive_2026_07.rankings r JOIN books b", "SELECT rankings"),
+        ("\n  SELECT book_ref FROM books WHERE book_key IN (?, ?, ?)", "SELECT books"),
+        (
+            "INSERT INTO rankings (a) VALUES (?) ON CONFLICT DO NOTHING",
+            "INSERT rankings",
+        ),
+        ("UPDATE books SET title = ?", "UPDATE books"),
+        ("DELETE FROM rankings WHERE fetch_date = ?", "DELETE rankings"),
+        ("PRAGMA query_only = ON", "PRAGMA query_only"),
+        ("PRAGMA archive_2025_01.index_info(idx)", "PRAGMA index_info"),
+        ("ATTACH DATABASE ? AS archive_2025_01", "ATTACH"),
+        ("CREATE INDEX IF NOT EXISTS main.idx ON rankings (a)", "CREATE rankings"),
+        ("SAVEPOINT booklist_1", "SAVEPOINT"),
+        ("", "OTHER"),
+    ],
+)
+def test_statement_label_is_fixed_name(sql, label):
+    assert metrics.statement_label(sql) == label
+    assert metrics.STATEMENT_NAME_PATTERN.match(label)
+
+
+def parse_samples(text):
+    """解析Prometheus文本格式，返回 [(名称, 标签字典, 值)]"""
+    samples = []
+    for line in text.splitlines():
+        match = metrics.SAMPLE_PATTERN.match(line)
+        if match and not line.startswith("#"):
+            name, label_text, value = match.groups()
+            labels = dict(metrics.LABEL_PATTERN.findall(label_text or ""))
+            samples.append((name, labels, float(value)))
+    return samples
+
+
+@pytest.fixture
+def archived_client(db, api_client):
+    """2025-01的快照已归档，2025-03的快照在热数据库中"""
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    for fetch_date in ("2025-01-01", "2025-03-01"):
+        db.save_ranking_batch(site_id, type_id, fetch_date, make_books(3))
+    db.archive_old_snapshots(keep_days=10, today=date(2025, 3, 1))
+    return api_client
+
+
+def test_metrics_endpoint_output(archived_client):
+    for fetch_date in ("2025-01-01", "2025-03-01"):
+        response = archived_client.get(
+            "/api/rankings/qidian/hot", params={"date": fetch_date}
+        )
+        assert response.status_code == 200
+
+    response = archived_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "# TYPE booklist_http_request_duration_seconds histogram" in text
+    samples = parse_samples(text)
+
+    # 请求按路由模板而不是实际路径分组
+    routes = {
+        labels["route"]
+        for name, labels, _ in samples
+        if name == "booklist_http_request_duration_seconds_count"
+    }
+    assert "/api/rankings/{site_code}/{ranking_type}" in routes
+    assert not any("qidian" in route for route in routes)
+
+    # 语句标签是固定的语句名，不包含归档库名或SQL文本
+    statements = {
+        labels["statement"]
+        for name, labels, _ in samples
+        if name == "booklist_sqlite_query_duration_seconds_count"
+    }
+    assert "SELECT rankings" in statements
+    assert all(metrics.STATEMENT_NAME_PATTERN.match(label) for label in statements)
+    assert not any(re.search(r"archive_\d{4}", label) for label in statements)
+
+
+def test_metrics_endpoint_includes_crawl_metrics_file(api_client, tmp_path):
+    registry = metrics.Registry()
+    runs = registry.counter("booklist_crawl_runs_total", "抓取次数", ("site", "status"))
+    runs.inc(site="qidian", status="success")
+    registry.write_textfile(metrics.crawl_metrics_path(), prefix="booklist_crawl_")
+
+    samples = parse_samples(api_client.get("/metrics").text)
+    assert (
+        "booklist_crawl_runs_total",
+        {"site": "qidian", "status": "success"},
+        1.0,
+    ) in samples
+
+
+def test_restore_drops_sql_text_statement_labels(tmp_path):
+    path = str(tmp_path / "metrics.prom")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "booklist_crawl_sqlite_query_duration_seconds_count"
+            '{statement="SELECT r.fetch_date FROM archive_2025_01.rankings r ...",'
+            'op="execute"} 5\n'
+            "booklist_crawl_sqlite_query_duration_seconds_count"
+            '{statement="SELECT rankings",op="execute"} 3\n'
+        )
+    registry = metrics.Registry()
+    histogram = registry.histogram(
+        "booklist_crawl_sqlite_query_duration_seconds",
+        "抓取进程中SQLite语句耗时(秒)",
+        ("statement", "op"),
+        label_patterns={"statement": metrics.STATEMENT_NAME_PATTERN},
+    )
+    registry.restore_textfile(path)
+    histogram.observe(0.001, statement="SELECT rankings", op="execute")
+
+    counts = {
+        labels["statement"]: value
+        for name, labels, value in parse_samples(registry.render())
+        if name.endswith("_count")
+    }
+    assert counts == {"SELECT rankings": 4}
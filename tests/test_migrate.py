@@ -0,0 +1,199 @@
+"""
+旧版本数据库(rankings表每行保存书名等文本)的迁移
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+import booklist_db
+
+# 旧版本程序创建的表结构
+LEGACY_SCHEMA = """
+CREATE TABLE sites (
+    site_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site_name TEXT NOT NULL,
+    site_url TEXT NOT NULL,
+    site_code TEXT NOT NULL UNIQUE,
+    fetch_type TEXT NOT NULL,
+    api_url TEXT,
+    description TEXT,
+    active INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE ranking_types (
+    ranking_type_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site_id INTEGER NOT NULL,
+    type_name TEXT NOT NULL,
+    type_code TEXT NOT NULL,
+    type_url TEXT,
+    description TEXT,
+    active INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (site_id) REFERENCES sites (site_id),
+    UNIQUE (site_id, type_code)
+);
+CREATE TABLE rankings (
+    ranking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site_id INTEGER NOT NULL,
+    ranking_type_id INTEGER NOT NULL,
+    fetch_date DATE NOT NULL,
+    book_id TEXT,
+    rank INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    author TEXT,
+    book_url TEXT,
+    category TEXT,
+    indicator_value TEXT,
+    indicator_unit TEXT,
+    cover_url TEXT,
+    latest_chapter TEXT,
+    creation_status INTEGER,
+    extra_data TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (site_id) REFERENCES sites (site_id),
+    FOREIGN KEY (ranking_type_id) REFERENCES ranking_types (ranking_type_id)
+);
+CREATE TABLE fetch_logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site_id INTEGER NOT NULL,
+    fetch_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status TEXT NOT NULL,
+    message TEXT,
+    items_fetched INTEGER DEFAULT 0,
+    FOREIGN KEY (site_id) REFERENCES sites (site_id)
+);
+CREATE INDEX idx_rankings_site_date ON rankings (site_id, fetch_date);
+CREATE INDEX idx_rankings_type_date ON rankings (ranking_type_id, fetch_date);
+CREATE INDEX idx_rankings_book ON rankings (book_id);
+INSERT INTO sites (site_name, site_url, site_code, fetch_type)
+VALUES ('起点中文网', 'https://www.qidian.com', 'qidian', 'html');
+INSERT INTO ranking_types (site_id, type_name, type_code) VALUES (1, '月票榜', 'month_ticket');
+"""
+
+# (日期, 排名, book_id, 书名, 作者, 指标文本, 指标单位, 最新章节, extra_data)
+LEGACY_ROWS = [
+    ("2025-01-01", 1, "1001", "书一", "作者甲", "74.0万", "月票", "第1章", None),
+    ("2025-01-01", 2, "1002", "书二", "作者乙", "1.2", "万月票", "第5章", None),
+    (
+        "2025-01-01",
+        3,
+        "1003",
+        "书三",
+        "作者甲",
+        "暂无",
+        "",
+        "",
+        '{"special_mark": "签约"}',
+    ),
+    ("2025-01-02", 1, "1002", "书二", "作者乙", "1,500", "月票", "第6章", None),
+    ("2025-01-02", 2, "1001", "书一", "作者甲", "73万", "", "第2章", None),
+    ("2025-01-02", 3, "1004", "书四", "", "88", "", "", None),
+]
+
+# 迁移后每行的 (ranking_id, 日期, 排名, book_id, indicator_num, indicator_unit)
+# 没有单位的数值沿用同一快照中其他书籍的单位
+EXPECTED_ROWS = [
+    (1, "2025-01-01", 1, "1001", 740000, "月票"),
+    (2, "2025-01-01", 2, "1002", 12000, "月票"),
+    (3, "2025-01-01", 3, "1003", None, ""),
+    (4, "2025-01-02", 1, "1002", 1500, "月票"),
+    (5, "2025-01-02", 2, "1001", 730000, "月票"),
+    (6, "2025-01-02", 3, "1004", 88, "月票"),
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("BOOKLIST_ARCHIVE_DIR", str(tmp_path / "archive"))
+    path = str(tmp_path / "booklist.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany(
+        """
+    INSERT INTO rankings
+    (site_id, ranking_type_id, fetch_date, rank, book_id, title, author,
+    indicator_value, indicator_unit, latest_chapter, extra_data)
+    VALUES (1, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+        LEGACY_ROWS,
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def legacy_row_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(rankings)")}
+        return (
+            "title" in columns,
+            conn.execute("SELECT COUNT(*) FROM rankings").fetchone()[0],
+        )
+    finally:
+        conn.close()
+
+
+def test_legacy_database_is_not_migrated_implicitly(legacy_db):
+    with pytest.raises(RuntimeError, match="migrate"):
+        booklist_db.BooklistDatabase(legacy_db)
+    assert legacy_row_count(legacy_db) == (True, len(LEGACY_ROWS))
+    assert not [
+        name for name in os.listdir(os.path.dirname(legacy_db)) if ".bak" in name
+    ]
+
+
+def test_migrate_legacy_database(legacy_db):
+    db = booklist_db.BooklistDatabase(legacy_db, migrate=True)
+    try:
+        assert db.migrated_rows == len(LEGACY_ROWS)
+        assert not db.has_legacy_rankings()
+
+        rows = db.conn.execute(
+            """
+        SELECT r.ranking_id, r.fetch_date, r.rank, b.book_id, r.indicator_num, r.indicator_unit
+        FROM rankings r JOIN books b ON b.book_ref = r.book_ref
+        ORDER BY r.ranking_id
+        """
+        ).fetchall()
+        assert rows == EXPECTED_ROWS
+
+        # 每本书只保存一份属性，取最近一次非空的值
+        books = db.conn.execute(
+            """
+        SELECT b.book_id, b.title, a.author_name, b.latest_chapter
+        FROM books b LEFT JOIN authors a ON a.author_id = b.author_id
+        ORDER BY b.book_id
+        """
+        ).fetchall()
+        assert books == [
+            ("1001", "书一", "作者甲", "第2章"),
+            ("1002", "书二", "作者乙", "第6章"),
+            ("1003", "书三", "作者甲", ""),
+            ("1004", "书四", None, ""),
+        ]
+        assert db.conn.execute(
+            "SELECT special_mark FROM rankings WHERE ranking_id = 3"
+        ).fetchone() == ("签约",)
+        assert db.conn.execute(
+            "SELECT fetch_date, row_count FROM latest_snapshot"
+        ).fetchall() == [("2025-01-02", 3)]
+    finally:
+        db.close()
+
+    # 迁移前的备份保留旧版本结构和全部数据
+    assert legacy_row_count(db.backup_path) == (True, len(LEGACY_ROWS))
+    # 迁移可重复执行，已迁移的数据库不再备份
+    db = booklist_db.BooklistDatabase(legacy_db, migrate=True)
+    try:
+        assert db.migrated_rows == 0
+        assert db.backup_path is None
+        assert db.conn.execute("SELECT COUNT(*) FROM rankings").fetchone() == (
+            len(LEGACY_ROWS),
+        )
+    finally:
+        db.close()
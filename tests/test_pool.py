@@ -0,0 +1,90 @@
+"""
+API的只读连接池：连接复用、数量上限、query_only和WAL模式下的并发读写
+"""
+
+import sqlite3
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+import api
+from conftest import add_ranking_type, make_books
+
+
+@pytest.fixture
+def pool(db):
+    connection_pool = api.ConnectionPool(db.db_path, size=2, timeout=0.1)
+    yield connection_pool
+    connection_pool.close()
+
+
+def test_connections_are_reused(pool):
+    with pool.connection() as conn:
+        first = conn
+    with pool.connection() as conn:
+        assert conn is first
+    assert pool._created == 1
+
+
+def test_pool_size_limit(pool):
+    with pool.connection() as first, pool.connection() as second:
+        assert first is not second
+        with pytest.raises(HTTPException) as error:
+            with pool.connection():
+                pass
+        assert error.value.status_code == 503
+    assert pool._created == 2
+
+
+def test_waiting_request_gets_released_connection(db):
+    pool = api.ConnectionPool(db.db_path, size=1, timeout=5)
+    try:
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with pool.connection():
+                acquired.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        acquired.wait(5)
+        threading.Timer(0.05, release.set).start()
+        with pool.connection() as conn:
+            assert conn.execute("SELECT 1").fetchone()[0] == 1
+        thread.join()
+    finally:
+        pool.close()
+
+
+def test_connections_are_read_only(pool):
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("DELETE FROM sites")
+
+
+def test_released_connection_ends_read_transaction(pool):
+    with pool.connection() as conn:
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM sites").fetchone()
+        assert conn.in_transaction
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+
+
+def test_reads_not_blocked_by_open_write_transaction(db, pool):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-01-01", make_books(3))
+
+    # 抓取程序的写事务尚未提交时，读取不等待，看到的是已提交的数据
+    db.conn.execute("BEGIN IMMEDIATE")
+    db.conn.execute("DELETE FROM rankings")
+    try:
+        with pool.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM rankings").fetchone()[0] == 3
+    finally:
+        db.conn.rollback()
@@ -0,0 +1,113 @@
+"""
+榜单接口的响应缓存：命中时不查询数据库，抓取程序递增数据版本号后失效
+"""
+
+import pytest
+
+import api
+from cache import ResponseCache
+from conftest import add_ranking_type, make_books
+
+URL = "/api/rankings/qidian/hot"
+
+
+def publish(db, site_id, type_id, fetch_date, books):
+    """像抓取程序一样写入快照并递增数据版本号"""
+    with db.transaction():
+        db.save_ranking_batch(site_id, type_id, fetch_date, books)
+        db.bump_generation()
+
+
+@pytest.fixture
+def client(db, api_client, monkeypatch):
+    """qidian的hot榜单在2025-01-01有3本书，统计build_specific_ranking的调用次数"""
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    publish(db, site_id, type_id, "2025-01-01", make_books(3))
+    # 每个请求都检查数据版本号
+    monkeypatch.setattr(api, "GENERATION_CHECK_INTERVAL", 0)
+
+    calls = []
+    build = api.build_specific_ranking
+
+    def counting_build(*args, **kwargs):
+        calls.append(args)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(api, "build_specific_ranking", counting_build)
+    api_client.calls = calls
+    api_client.ranking = (site_id, type_id)
+    return api_client
+
+
+def book_ids(response):
+    assert response.status_code == 200
+    return [book["book_id"] for book in response.json()["books"]]
+
+
+def test_cache_hit_skips_query(client):
+    hits = api.response_cache.stats()["hits"]
+    first = client.get(URL, params={"date": "2025-01-01"})
+    second = client.get(URL, params={"date": "2025-01-01"})
+    assert first.content == second.content
+    assert len(client.calls) == 1
+    assert api.response_cache.stats()["hits"] == hits + 1
+
+    # 影响响应内容的参数不同时分别缓存
+    client.get(URL, params={"date": "2025-01-01", "include_extra": "false"})
+    assert len(client.calls) == 2
+
+
+def test_request_without_date_shares_cache_with_resolved_date(client):
+    assert book_ids(client.get(URL)) == ["book1", "book2", "book3"]
+    assert book_ids(client.get(URL, params={"date": "2025-01-01"})) == [
+        "book1",
+        "book2",
+        "book3",
+    ]
+    assert len(client.calls) == 1
+
+
+def test_generation_bump_invalidates(client, db):
+    assert book_ids(client.get(URL)) == ["book1", "book2", "book3"]
+
+    site_id, type_id = client.ranking
+    publish(db, site_id, type_id, "2025-01-02", make_books(2, "new"))
+    # 不带日期的请求解析到新的最近日期
+    assert book_ids(client.get(URL)) == ["new1", "new2"]
+
+    # 同一天重新抓取后，该日期的缓存也失效
+    publish(db, site_id, type_id, "2025-01-01", make_books(1, "again"))
+    assert book_ids(client.get(URL, params={"date": "2025-01-01"})) == ["again1"]
+    assert len(client.calls) == 3
+
+
+def test_generation_checked_at_interval(client, db, monkeypatch):
+    """版本号检查间隔内不查询meta表，写入在间隔结束后才可见"""
+    monkeypatch.setattr(api, "GENERATION_CHECK_INTERVAL", 3600)
+    assert book_ids(client.get(URL)) == ["book1", "book2", "book3"]
+
+    site_id, type_id = client.ranking
+    publish(db, site_id, type_id, "2025-01-01", make_books(1, "again"))
+    assert book_ids(client.get(URL)) == ["book1", "book2", "book3"]
+
+    monkeypatch.setitem(api._generation_state, "checked_at", 0.0)
+    monkeypatch.setattr(api, "GENERATION_CHECK_INTERVAL", 0)
+    assert book_ids(client.get(URL)) == ["again1"]
+
+
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    # b最久未使用，被淘汰
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (2, 3, 1)
+
+    expired = ResponseCache(ttl=0)
+    expired.set("a", 1)
+    assert expired.get("a") is None
+    assert expired.stats()["size"] == 0
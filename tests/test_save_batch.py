@@ -0,0 +1,153 @@
+"""
+save_ranking_batch的批量写入
+"""
+
+from conftest import add_ranking_type, make_books
+
+
+def snapshot(db, ranking_type_id, fetch_date):
+    """返回榜单快照的 [(排名, book_id, 书名)]"""
+    return db.conn.execute(
+        """
+    SELECT r.rank, b.book_id, b.title FROM rankings r
+    JOIN books b ON b.book_ref = r.book_ref
+    WHERE r.ranking_type_id = ? AND r.fetch_date = ?
+    ORDER BY r.rank
+    """,
+        (ranking_type_id, fetch_date),
+    ).fetchall()
+
+
+def test_batch_writes_all_rows(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    assert db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(50)) == (
+        50,
+        0,
+    )
+    rows = snapshot(db, type_id, "2025-03-01")
+    assert [(row[0], row[1]) for row in rows] == [
+        (rank, f"book{rank}") for rank in range(1, 51)
+    ]
+    assert not db.conn.in_transaction
+
+
+def test_generator_input(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    books = (book for book in make_books(5))
+    assert db.save_ranking_batch(site_id, type_id, "2025-03-01", books) == (5, 0)
+    assert len(snapshot(db, type_id, "2025-03-01")) == 5
+
+
+def test_invalid_rows_are_rejected_and_empty_batch_keeps_snapshot(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(5))
+
+    books = make_books(3, "new")
+    books[1]["rank"] = "第二"
+    books[2]["title"] = ""
+    assert db.save_ranking_batch(site_id, type_id, "2025-03-01", books) == (1, 2)
+    assert [row[1] for row in snapshot(db, type_id, "2025-03-01")] == ["new1"]
+
+    # 没有任何有效数据时不删除已有快照
+    invalid = [{"rank": 1, "title": ""}, {"rank": "x", "title": "书名"}]
+    assert db.save_ranking_batch(site_id, type_id, "2025-03-01", invalid) == (0, 2)
+    assert [row[1] for row in snapshot(db, type_id, "2025-03-01")] == ["new1"]
+
+
+def test_failed_batch_is_rolled_back(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(5))
+
+    # 第3条写入时出错，整个榜单回滚，保留已有快照
+    db.conn.execute(
+        """
+    CREATE TEMP TRIGGER fail_rank_3 BEFORE INSERT ON rankings WHEN NEW.rank = 3
+    BEGIN SELECT RAISE(ABORT, 'boom'); END
+    """
+    )
+    inserted, _ = db.save_ranking_batch(
+        site_id, type_id, "2025-03-01", make_books(5, "new")
+    )
+    assert inserted == 0
+    assert [row[1] for row in snapshot(db, type_id, "2025-03-01")] == [
+        f"book{rank}" for rank in range(1, 6)
+    ]
+
+
+def latest_row_count(db, ranking_type_id):
+    return db.conn.execute(
+        "SELECT fetch_date, row_count FROM latest_snapshot WHERE ranking_type_id = ?",
+        (ranking_type_id,),
+    ).fetchone()
+
+
+def test_full_list_replaces_snapshot(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(10))
+
+    # 重新抓取到的榜单变短，当天的旧快照整体替换，不残留第9、10名
+    books = make_books(8, "new")
+    assert db.save_ranking_batch(site_id, type_id, "2025-03-01", books) == (8, 0)
+    rows = snapshot(db, type_id, "2025-03-01")
+    assert [(row[0], row[1]) for row in rows] == [
+        (rank, f"new{rank}") for rank in range(1, 9)
+    ]
+    assert latest_row_count(db, type_id) == ("2025-03-01", 8)
+
+
+def test_repeated_save_is_idempotent(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    for _ in range(3):
+        db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(10))
+    assert db.conn.execute("SELECT COUNT(*) FROM rankings").fetchone() == (10,)
+    assert latest_row_count(db, type_id) == ("2025-03-01", 10)
+
+
+def test_partial_list_without_replace_keeps_other_ranks(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(10))
+
+    # 只有前3名的部分榜单按排名覆盖，其余排名保留
+    books = make_books(3, "new")
+    assert db.save_ranking_batch(
+        site_id, type_id, "2025-03-01", books, replace_snapshot=False
+    ) == (3, 0)
+    rows = snapshot(db, type_id, "2025-03-01")
+    assert [row[1] for row in rows] == [f"new{rank}" for rank in range(1, 4)] + [
+        f"book{rank}" for rank in range(4, 11)
+    ]
+    assert latest_row_count(db, type_id) == ("2025-03-01", 10)
+
+
+def test_partial_list_with_replace_only_touches_its_date(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(10))
+    db.save_ranking_batch(site_id, type_id, "2025-03-02", make_books(10))
+
+    db.save_ranking_batch(site_id, type_id, "2025-03-02", make_books(3, "new"))
+    assert len(snapshot(db, type_id, "2025-03-01")) == 10
+    assert [row[1] for row in snapshot(db, type_id, "2025-03-02")] == [
+        "new1",
+        "new2",
+        "new3",
+    ]
+
+
+def test_compact_removes_duplicates_and_creates_unique_index(db):
+    site_id, type_id = add_ranking_type(db, "qidian", "hot")
+    db.save_ranking_batch(site_id, type_id, "2025-03-01", make_books(3))
+    # 模拟旧版本数据库：没有唯一索引，重复抓取产生重复数据
+    db.conn.execute("DROP INDEX uq_rankings_type_date_rank")
+    db.conn.execute(
+        """
+    INSERT INTO rankings (site_id, ranking_type_id, fetch_date, rank, book_ref)
+    SELECT site_id, ranking_type_id, fetch_date, rank, book_ref FROM rankings
+    """
+    )
+    db.conn.commit()
+
+    assert db.compact_rankings() == 3
+    assert db.has_unique_rank_index
+    assert db.conn.execute("SELECT COUNT(*) FROM rankings").fetchone() == (3,)
+    # 保留的是最后写入的一条
+    assert db.conn.execute("SELECT MIN(ranking_id) FROM rankings").fetchone() == (4,)
@@ -0,0 +1,96 @@
+"""
+多站点并发抓取：各站点在工作线程中同时抓取，数据库只在调用线程中写入
+"""
+
+import threading
+
+import booklist_db
+from conftest import StubAdapter, make_books
+
+SITES = ("ciweimao", "qidian", "fanqie")
+
+
+class ThreadRecordingAdapter(StubAdapter):
+    """记录抓取和写入所在的线程，抓取时在barrier处等待其他站点"""
+
+    def __init__(self, db, site_code, rankings, barrier=None, fail=False):
+        super().__init__(db, site_code, rankings)
+        self.barrier = barrier
+        self.fail = fail
+        self.fetch_thread = None
+        self.save_thread = None
+
+    def fetch_data(self):
+        self.fetch_thread = threading.get_ident()
+        if self.barrier is not None:
+            # 所有站点都在抓取时才能通过，逐个抓取时超时
+            self.barrier.wait()
+        if self.fail:
+            raise ConnectionError("模拟网络错误")
+        return super().fetch_data()
+
+    def process_data(self, data):
+        self.save_thread = threading.get_ident()
+        return super().process_data(data)
+
+
+def make_adapters(db, barrier=None, fail=()):
+    return [
+        ThreadRecordingAdapter(
+            db,
+            site_code,
+            {"hot": make_books(3, site_code)},
+            barrier,
+            fail=site_code in fail,
+        )
+        for site_code in SITES
+    ]
+
+
+def saved_rows(db):
+    return dict(
+        db.conn.execute(
+            """
+        SELECT s.site_code, COUNT(*) FROM rankings r
+        JOIN sites s ON s.site_id = r.site_id GROUP BY s.site_code
+        """
+        ).fetchall()
+    )
+
+
+def test_sites_fetched_concurrently_and_written_by_one_thread(db):
+    adapters = make_adapters(db, threading.Barrier(len(SITES), timeout=5))
+    timings = booklist_db.fetch_sites_concurrently(adapters)
+
+    assert sorted(timing["site_code"] for timing in timings) == sorted(SITES)
+    assert all(timing["success"] for timing in timings)
+    fetch_threads = {adapter.fetch_thread for adapter in adapters}
+    assert len(fetch_threads) == len(SITES)
+    assert threading.get_ident() not in fetch_threads
+    # 共享的数据库连接只在调用线程中使用
+    assert {adapter.save_thread for adapter in adapters} == {threading.get_ident()}
+    assert saved_rows(db) == {site_code: 3 for site_code in SITES}
+
+
+def test_failed_site_does_not_stop_others(db):
+    adapters = make_adapters(db, fail=("qidian",))
+    timings = booklist_db.fetch_sites_concurrently(adapters, max_workers=2)
+
+    success = {timing["site_code"]: timing["success"] for timing in timings}
+    assert success == {"ciweimao": True, "qidian": False, "fanqie": True}
+    assert saved_rows(db) == {"ciweimao": 3, "fanqie": 3}
+    statuses = dict(
+        db.conn.execute(
+            """
+        SELECT s.site_code, l.status FROM fetch_logs l
+        JOIN sites s ON s.site_id = l.site_id
+        """
+        ).fetchall()
+    )
+    assert statuses == {"ciweimao": "成功", "qidian": "失败", "fanqie": "成功"}
+
+
+def test_serial_fetch_matches_concurrent(db):
+    timings = booklist_db.fetch_sites_serially(make_adapters(db))
+    assert [timing["site_code"] for timing in timings] == list(SITES)
+    assert saved_rows(db) == {site_code: 3 for site_code in SITES}
@@ -0,0 +1,98 @@
+"""
+流式解析的榜单边解析边写入，所有榜单在一个事务中提交
+"""
+
+import booklist_db
+import qidian
+from conftest import StubAdapter, generation, load_fixture, make_books
+
+
+def ranking_counts(db):
+    return dict(
+        db.conn.execute(
+            """
+        SELECT rt.type_code, COUNT(*) FROM rankings r
+        JOIN ranking_types rt ON rt.ranking_type_id = r.ranking_type_id
+        GROUP BY rt.type_code
+        """
+        ).fetchall()
+    )
+
+
+def last_fetch_log(db):
+    return db.conn.execute(
+        "SELECT status, items_fetched FROM fetch_logs ORDER BY log_id DESC LIMIT 1"
+    ).fetchone()
+
+
+class StreamingAdapter(StubAdapter):
+    """逐个生成榜单，生成下一个榜单时检查上一个榜单是否已经写入，fail_at处模拟解析出错"""
+
+    fail_at = None
+
+    def process_data(self, data):
+        self.written_before = []
+        for index, (code, books) in enumerate(data.items()):
+            self.written_before.append(sum(ranking_counts(self.db).values()))
+            if index == self.fail_at:
+                raise ValueError("解析出错")
+            yield code, iter(books)
+
+
+def test_rankings_are_written_while_parsing(db):
+    adapter = StreamingAdapter(
+        db, "qidian", {"a": make_books(3), "b": make_books(4), "c": make_books(5)}
+    )
+    before = generation(db)
+    assert adapter.fetch_and_save()
+    # 生成每个榜单时，之前的榜单已经写入(尚未提交)
+    assert adapter.written_before == [0, 3, 7]
+    assert ranking_counts(db) == {"a": 3, "b": 4, "c": 5}
+    assert generation(db) == before + 1
+    assert last_fetch_log(db) == ("成功", 12)
+    assert not db.conn.in_transaction
+
+
+def test_parse_error_rolls_back_all_rankings(db):
+    adapter = StreamingAdapter(
+        db, "qidian", {"a": make_books(3), "b": make_books(4), "c": make_books(5)}
+    )
+    adapter.fail_at = 2
+    before = generation(db)
+    assert not adapter.fetch_and_save()
+    assert ranking_counts(db) == {}
+    assert generation(db) == before
+    assert last_fetch_log(db) == ("失败", 0)
+    assert not db.conn.in_transaction
+    # 回滚后仍可以正常写入，书籍缓存不会引用已回滚的书籍
+    adapter.fail_at = None
+    assert adapter.fetch_and_save()
+    assert ranking_counts(db) == {"a": 3, "b": 4, "c": 5}
+
+
+def test_parse_error_keeps_existing_snapshot(db):
+    adapter = StreamingAdapter(db, "qidian", {"a": make_books(3), "b": make_books(4)})
+    assert adapter.fetch_and_save()
+    adapter.rankings = {"a": make_books(1, "new"), "b": make_books(1, "new")}
+    adapter.fail_at = 1
+    assert not adapter.fetch_and_save()
+    assert ranking_counts(db) == {"a": 3, "b": 4}
+
+
+def test_qidian_page_is_streamed_into_batches(db):
+    html = load_fixture("qidian.html")
+    expected = {
+        name.strip().replace(" ", "_").lower(): len(data["books"])
+        for name, data in qidian.iter_ranking_lists(html)
+    }
+    site = db.conn.execute(
+        """
+    SELECT site_id, site_code, site_name, site_url, fetch_type, api_url
+    FROM sites WHERE site_code = 'qidian'
+    """
+    ).fetchone()
+    adapter = booklist_db.QidianAdapter(*site, db)
+    data = adapter.timed_parse(qidian.iter_ranking_lists(html))
+    assert adapter.save_fetched_data(data)
+    assert ranking_counts(db) == expected
+    assert adapter.lazy_parse_seconds > 0